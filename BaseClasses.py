@@ -2,9 +2,11 @@ from __future__ import annotations
 
 import collections
 import functools
+import itertools
 import logging
 import random
 import secrets
+import types
 import warnings
 from argparse import Namespace
 from collections import Counter, deque, defaultdict
@@ -19,6 +21,7 @@ from typing_extensions import NotRequired, TypedDict
 import NetUtils
 import Options
 import Utils
+from rule_builder import Has, Rule, to_access_rule
 
 if TYPE_CHECKING:
     from entrance_rando import ERPlacementState
@@ -350,8 +353,7 @@ class MultiWorld():
                 if count:
                     loc = Location(group_id, f"Item Link: {item.name} -> {self.player_name[item.player]} {count}",
                         None, region)
-                    loc.access_rule = lambda state, item_name = item.name, group_id_ = group_id, count_ = count: \
-                        state.has(item_name, group_id_, count_)
+                    loc.access_rule = Has(item.name, group_id, count).compile()
 
                     locations.append(loc)
                     loc.place_locked_item(item)
@@ -590,23 +592,26 @@ class MultiWorld():
         unreachable locations.
         """
         state = CollectionState(self)
-        locations = set(self.get_filled_locations())
+        # locations are only tested again once something they depend on was collected
+        wait_list = LocationWaitList(state)
+        locations: List[Location] = self.get_filled_locations()
 
         while locations:
-            sphere: Set[Location] = set()
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
+            sphere = set(wait_list.test(locations))
             yield sphere
             if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
                 break
 
+            changed_players: Set[int] = set()
             for location in sphere:
-                state.collect(location.item, True, location)
-            locations -= sphere
+                if state.collect(location.item, True, location):
+                    changed_players.add(location.item.player)
+            locations = wait_list.wake(changed_players)
+            if not locations and wait_list.waiting:
+                yield set()
+
+        if wait_list.waiting:
+            yield wait_list.waiting  # unreachable locations
 
     def get_sendable_spheres(self) -> Iterator[Set[Location]]:
         """
@@ -718,6 +723,483 @@ class MultiWorld():
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+class _CopyOnAccessDict(dict):
+    """
+    Per-player mapping handed out by CollectionState.copy.
+
+    Values are shared with a frozen source mapping and are only cloned the first time each player is looked up, so a
+    copy never duplicates the data of players that are not touched afterward. As `__missing__` is only consulted for
+    absent keys, lookups of players that were already cloned run at plain dict speed.
+    """
+    __slots__ = ("_source", "_copier")
+
+    _source: Dict[int, Any]
+    _copier: Callable[[Any], Any]
+
+    def __init__(self, source: Dict[int, Any], copier: Callable[[Any], Any]) -> None:
+        super().__init__()
+        self._source = source
+        self._copier = copier
+
+    def __missing__(self, player: int) -> Any:
+        # popping releases the shared value as soon as every state that shares it has cloned its own
+        value = self._copier(self._source.pop(player))
+        dict.__setitem__(self, player, value)
+        return value
+
+    def freeze(self) -> Dict[int, Any]:
+        """Returns a plain dict of the current values, which must not be mutated anymore by the caller."""
+        frozen = self._source.copy()
+        frozen.update(dict.items(self))
+        return frozen
+
+    def materialize(self) -> None:
+        """Clones every player that has not been looked up yet."""
+        for player in self._source.keys() - dict.keys(self):
+            self.__missing__(player)
+        self._source = {}
+
+    def get(self, player: int, default: Any = None) -> Any:
+        if player in self:
+            return self[player]
+        return default
+
+    def __contains__(self, player: object) -> bool:
+        return dict.__contains__(self, player) or player in self._source
+
+    def __iter__(self) -> Iterator[int]:
+        self.materialize()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self.materialize()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def copy(self) -> Dict[int, Any]:
+        self.materialize()
+        return dict(dict.items(self))
+
+    def __eq__(self, other: object) -> bool:
+        self.materialize()
+        if isinstance(other, _CopyOnAccessDict):
+            other.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        self.materialize()
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+
+class _EntranceDependencies(NamedTuple):
+    """What an Entrance access rule looked up the last time it failed, along with the values it saw."""
+    access_rule: Callable[[CollectionState], bool]
+    parent_region: Optional[Region]
+    items: Dict[Tuple[int, str], int]
+    unreached_regions: Set[Region]
+    locations: Dict[Location, Optional[Item]]
+
+    def still_blocks(self, connection: Entrance, state: CollectionState) -> bool:
+        """
+        Returns True if `connection` still has the same access rule and parent region, none of the item counts changed,
+        as logic is monotone, none of the unreachable regions became reachable and the same items are placed at the
+        locations that were looked at.
+        Item counts that went down are treated as changed too, as some worlds keep cached values in `prog_items`.
+        """
+        if self.access_rule is not connection.access_rule or self.parent_region is not connection.parent_region:
+            return False
+        prog_items = state.prog_items
+        for (player, item), count in self.items.items():
+            if prog_items[player].get(item, 0) != count:
+                return False
+        for location, item in self.locations.items():
+            if location.item is not item:
+                return False
+        for region in self.unreached_regions:
+            if region.can_reach(state):
+                return False
+        return True
+
+
+class _RecordingItems(dict):
+    """Stand-in for `CollectionState.prog_items`, handing out a recording counter per player."""
+    __slots__ = ("_recorder",)
+
+    def __init__(self, recorder: _DependencyRecorder) -> None:
+        super().__init__()
+        self._recorder = recorder
+
+    def __missing__(self, player: int) -> _RecordingCounter:
+        counter = _RecordingCounter(self._recorder, player)
+        dict.__setitem__(self, player, counter)
+        return counter
+
+
+class _RecordingCounter:
+    """A single player's items, recording the count of every item looked up."""
+    __slots__ = ("_recorder", "_player", "_counter")
+
+    def __init__(self, recorder: _DependencyRecorder, player: int) -> None:
+        self._recorder = recorder
+        self._player = player
+        self._counter = recorder.state.prog_items[player]
+
+    def get(self, item: str, default: Any = None) -> Any:
+        count = self._counter.get(item, None)
+        self._recorder.items_read[self._player, item] = count or 0
+        return default if count is None else count
+
+    def __getitem__(self, item: str) -> int:
+        count = self._counter.get(item, 0)
+        self._recorder.items_read[self._player, item] = count
+        return count
+
+    def __contains__(self, item: str) -> bool:
+        count = self._counter.get(item, None)
+        self._recorder.items_read[self._player, item] = count or 0
+        return count is not None
+
+    def __setitem__(self, item: str, count: int) -> None:
+        self._recorder.opaque = True
+        self._counter[item] = count
+
+    def __delitem__(self, item: str) -> None:
+        self._recorder.opaque = True
+        del self._counter[item]
+
+    def __iter__(self) -> Iterator[str]:
+        self._recorder.opaque = True
+        return iter(self._counter)
+
+    def __len__(self) -> int:
+        self._recorder.opaque = True
+        return len(self._counter)
+
+    def __getattr__(self, name: str) -> Any:
+        self._recorder.opaque = True
+        return getattr(self._counter, name)
+
+
+class _RecordingRegions(dict):
+    """Stand-in for `CollectionState.reachable_regions`, handing out a recording set per player."""
+    __slots__ = ("_recorder",)
+
+    def __init__(self, recorder: _DependencyRecorder) -> None:
+        super().__init__()
+        self._recorder = recorder
+
+    def __missing__(self, player: int) -> _RecordingRegionSet:
+        regions = _RecordingRegionSet(self._recorder, player)
+        dict.__setitem__(self, player, regions)
+        return regions
+
+
+class _RecordingRegionSet:
+    """A single player's reachable regions, recording every region looked up that is not reachable."""
+    __slots__ = ("_recorder", "_regions")
+
+    def __init__(self, recorder: _DependencyRecorder, player: int) -> None:
+        self._recorder = recorder
+        self._regions = recorder.state.reachable_regions[player]
+
+    def __contains__(self, region: Region) -> bool:
+        if region in self._regions:
+            return True
+        self._recorder.unreached_regions.add(region)
+        return False
+
+    def __iter__(self) -> Iterator[Region]:
+        self._recorder.opaque = True
+        return iter(self._regions)
+
+    def __len__(self) -> int:
+        self._recorder.opaque = True
+        return len(self._regions)
+
+    def __getattr__(self, name: str) -> Any:
+        self._recorder.opaque = True
+        return getattr(self._regions, name)
+
+
+class _RecordingMultiWorld:
+    """
+    Stand-in for the MultiWorld of a recorded state. Looking up worlds, regions and entrances is not recorded, looking
+    up a location records the item placed there, as that can change during generation, and anything else makes the
+    evaluation opaque.
+    """
+    unrecorded_attributes: ClassVar[Set[str]] = {
+        "worlds", "player_ids", "player_name", "get_player_name", "get_region", "get_entrance", "groups",
+    }
+
+    def __init__(self, recorder: _DependencyRecorder, multiworld: MultiWorld) -> None:
+        self._recorder = recorder
+        self._multiworld = multiworld
+
+    def get_location(self, location_name: str, player: int) -> Location:
+        location = self._multiworld.get_location(location_name, player)
+        self._recorder.locations_read[location] = location.item
+        return location
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._multiworld, name)
+        if name in self.unrecorded_attributes:
+            self.__dict__[name] = value
+        else:
+            self._recorder.opaque = True
+        return value
+
+
+class _DependencyRecorder:
+    """
+    Stand-in for a CollectionState while access rules are evaluated, recording what each rule looked up.
+
+    Methods of the state, including those of LogicMixins, run bound to the recorder, so `has`, `can_reach_region` and
+    friends end up in recorded lookups of item counts, unreachable regions and the items placed at locations. Anything
+    the recorder can not account for, such as custom state attributes or mutations, marks the evaluation as opaque, so
+    it could depend on anything. Rules that check the type of the state can't be accounted for, so the recorder is only
+    used for worlds that opt in with `World.record_rule_dependencies`.
+    """
+    passthrough_attributes: ClassVar[Tuple[str, ...]] = ("stale", "path")
+    unrecorded_methods: ClassVar[Set[str]] = {"update_reachable_regions"}
+    """Methods that run on the real state without affecting what is recorded."""
+    mutating_methods: ClassVar[Set[str]] = {
+        "copy", "checkpoint", "rollback", "collect", "remove", "add_item", "remove_item", "set_item",
+        "sweep_for_advancements", "sweep_for_events",
+    }
+    """Methods that run on the real state and make the evaluation opaque."""
+    _method_cache: ClassVar[Dict[Tuple[type, str], Optional[Callable[..., Any]]]] = {}
+
+    state: CollectionState
+    items_read: Dict[Tuple[int, str], int]
+    unreached_regions: Set[Region]
+    locations_read: Dict[Location, Optional[Item]]
+    opaque: bool
+
+    def __init__(self, state: CollectionState) -> None:
+        self.state = state
+        self.multiworld = _RecordingMultiWorld(self, state.multiworld)
+        self.items_read = {}
+        self.unreached_regions = set()
+        self.locations_read = {}
+        self.opaque = False
+
+    def refresh(self) -> None:
+        """Picks up the current data of the state, which may have been replaced since the recorder was last used."""
+        state = self.state
+        for name in self.passthrough_attributes:
+            setattr(self, name, getattr(state, name))
+        self.prog_items = _RecordingItems(self)
+        self.reachable_regions = _RecordingRegions(self)
+
+    def evaluate(self, spot: Union[Location, Entrance, Region]) -> bool:
+        """Checks if `spot` can be reached, recording what is looked up until the next evaluation."""
+        self.items_read.clear()
+        self.unreached_regions.clear()
+        self.locations_read.clear()
+        self.opaque = False
+        return spot.can_reach(self)
+
+    def take_dependencies(self) -> Optional[Tuple[Dict[Tuple[int, str], int], Set[Region],
+                                                  Dict[Location, Optional[Item]]]]:
+        """
+        Hands over the item counts, unreachable regions and placed items looked up by the last evaluation, or returns
+        None if it was opaque.
+        """
+        if self.opaque:
+            return None
+        dependencies = self.items_read, self.unreached_regions, self.locations_read
+        self.items_read = {}
+        self.unreached_regions = set()
+        self.locations_read = {}
+        return dependencies
+
+    def __getattr__(self, name: str) -> Any:
+        key = (type(self.state), name)
+        try:
+            function = self._method_cache[key]
+        except KeyError:
+            function = self._method_cache[key] = self._find_method(type(self.state), name)
+        if function is None:
+            if name not in self.unrecorded_methods:
+                self.opaque = True
+            return getattr(self.state, name)
+        method = types.MethodType(function, self)
+        # cache on the instance, so later lookups do not go through __getattr__ again
+        self.__dict__[name] = method
+        return method
+
+    @classmethod
+    def _find_method(cls, state_type: type, name: str) -> Optional[Callable[..., Any]]:
+        """Returns the plain function `name` resolves to on `state_type` if it may be run bound to a recorder."""
+        if name in cls.unrecorded_methods or name in cls.mutating_methods:
+            return None
+        for base in state_type.__mro__:
+            if name in base.__dict__:
+                attribute = base.__dict__[name]
+                return attribute if isinstance(attribute, types.FunctionType) else None
+        return None
+
+
+class LocationWaitList:
+    """
+    Locations whose access rules failed while finding spheres, each waiting on the item counts and regions its rule
+    looked up, so that it is only tested again once one of those changed instead of after every collected item.
+    Items placed at locations are not expected to change while finding spheres.
+
+    Only the rules of worlds that opt in with `World.record_rule_dependencies` are recorded. Locations whose rules are
+    not recorded, or could not be recorded, are tested without the recorder from then on, which carries over to the
+    wait lists of copies of the state, as they would have to find out again every time. They are woken by any
+    collected item, so that every location is woken as soon as it could be reachable, as spheres need.
+    """
+    state: CollectionState
+    multiworld: MultiWorld
+    recorder: _DependencyRecorder
+    order: Dict[Location, int]
+    waiting: Set[Location]
+    waiting_on_items: Dict[int, Dict[str, Dict[int, List[Location]]]]
+    """Per player, item and the count it had, the locations waiting for that count to change."""
+    waiting_on_regions: Dict[int, Dict[Region, List[Location]]]
+    waiting_on_anything: List[Location]
+    opaque: Set[Location]
+    seen_items: Dict[int, Dict[str, int]]
+    unsettled_items: Dict[int, Set[str]]
+    """Items that were waited on with a different count than seen, as access rules can write to `prog_items`."""
+    seen_regions: Dict[int, Set[Region]]
+
+    def __init__(self, state: CollectionState) -> None:
+        self.state = state
+        self.multiworld = state.multiworld
+        self.recorder = _DependencyRecorder(state)
+        self.order = {}
+        self.waiting = set()
+        self.waiting_on_items = {}
+        self.waiting_on_regions = {}
+        self.waiting_on_anything = []
+        self.opaque = state._opaque_locations
+        self.seen_items = {}
+        self.unsettled_items = {}
+        self.seen_regions = {}
+
+    def test(self, locations: Iterable[Location]) -> List[Location]:
+        """Returns the reachable ones of `locations`, putting the others on the wait list."""
+        state = self.state
+        recorder = self.recorder
+        recorder.refresh()
+        order = self.order
+        opaque = self.opaque
+        reachable: List[Location] = []
+        for location in locations:
+            if location not in order:
+                order[location] = len(order)
+                if type(location).can_reach is not Location.can_reach or \
+                        not self.multiworld.worlds[location.player].record_rule_dependencies:
+                    # may look at more than the state
+                    opaque.add(location)
+            if location in opaque:
+                if location.can_reach(state):
+                    reachable.append(location)
+                else:
+                    self._wait(location, None)
+            elif recorder.evaluate(location):
+                reachable.append(location)
+            else:
+                dependencies = recorder.take_dependencies()
+                if dependencies is None:
+                    opaque.add(location)
+                self._wait(location, dependencies)
+        return reachable
+
+    def _wait(self, location: Location, dependencies: Optional[Tuple[Dict[Tuple[int, str], int], Set[Region],
+                                                                     Dict[Location, Optional[Item]]]]) -> None:
+        self.waiting.add(location)
+        if dependencies is None:
+            self.waiting_on_anything.append(location)
+            return
+        items, unreached_regions, _ = dependencies
+        for (player, item), count in items.items():
+            if player not in self.waiting_on_items:
+                self.waiting_on_items[player] = {}
+                self.seen_items[player] = dict(self.state.prog_items[player])
+                self.unsettled_items[player] = set()
+            self.waiting_on_items[player].setdefault(item, {}).setdefault(count, []).append(location)
+            if self.seen_items[player].get(item, 0) != count:
+                self.unsettled_items[player].add(item)
+        for region in unreached_regions:
+            player = region.player
+            if player not in self.seen_regions:
+                self.seen_regions[player] = self.state.reachable_regions[player].copy()
+                self.waiting_on_regions[player] = {}
+            self.waiting_on_regions[player].setdefault(region, []).append(location)
+
+    def _wake_on_items(self, player: int, unsettled_items: Set[str]) -> List[Location]:
+        counts = self.state.prog_items[player]
+        seen = self.seen_items[player]
+        try:
+            changed_items = {item for item, _ in counts.items() ^ seen.items()}
+        except TypeError:
+            # unhashable values written by access rules
+            changed_items = {item for item in counts.keys() | seen.keys() if counts.get(item, 0) != seen.get(item, 0)}
+        changed_items |= unsettled_items
+        unsettled_items.clear()
+        self.seen_items[player] = dict(counts)
+        waiting_on_items = self.waiting_on_items[player]
+        woken: List[Location] = []
+        for item in changed_items:
+            waiting_on_counts = waiting_on_items.get(item, None)
+            if waiting_on_counts:
+                count = counts.get(item, 0)
+                for changed_count in [seen_count for seen_count in waiting_on_counts if seen_count != count]:
+                    woken.extend(waiting_on_counts.pop(changed_count))
+        return woken
+
+    def wake(self, changed_players: Collection[int]) -> List[Location]:
+        """
+        Takes the locations off the wait list that could have become reachable after items of `changed_players` were
+        collected, in the order they were first tested.
+        """
+        state = self.state
+        woken: List[Location] = []
+        for player, unsettled_items in self.unsettled_items.items():
+            if unsettled_items or player in changed_players:
+                woken.extend(self._wake_on_items(player, unsettled_items))
+        if changed_players:
+            woken.extend(self.waiting_on_anything)
+            self.waiting_on_anything.clear()
+            # access rules may depend on other players, so the regions of every player are checked, not only of those
+            # whose items were collected
+            for player, seen_regions in self.seen_regions.items():
+                if state.stale[player]:
+                    state.update_reachable_regions(player)
+                reachable_regions = state.reachable_regions[player]
+                if len(reachable_regions) != len(seen_regions):
+                    waiting_on_regions = self.waiting_on_regions[player]
+                    for region in reachable_regions - seen_regions:
+                        if region in waiting_on_regions:
+                            woken.extend(waiting_on_regions.pop(region))
+                    seen_regions |= reachable_regions
+        # a location can be waiting on multiple things, and once woken, the other entries are stale
+        woken_locations = self.waiting.intersection(woken)
+        self.waiting -= woken_locations
+        return sorted(woken_locations, key=self.order.__getitem__)
+
+
 class CollectionState():
     prog_items: Dict[int, Counter[str]]
     multiworld: MultiWorld
@@ -730,6 +1212,20 @@ class CollectionState():
     allow_partial_entrances: bool
     additional_init_functions: List[Callable[[CollectionState, MultiWorld], None]] = []
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
+    additional_lazy_copy_attributes: Dict[str, Callable[[Any], Any]] = {}
+    """Per-player dict attributes registered by LogicMixins, mapped to the function cloning a single player's value."""
+
+    per_player_attributes: ClassVar[Dict[str, Callable[[Any], Any]]] = {
+        "prog_items": Counter.copy,
+        "reachable_regions": set.copy,
+        "blocked_connections": set.copy,
+    }
+    _entrance_dependencies: Dict[Entrance, _EntranceDependencies]
+    """What blocked entrances of worlds recording rule dependencies instead of explicit indirect conditions depend on,
+    shared between copies."""
+    _opaque_locations: Set[Location]
+    """Locations whose access rules could not be recorded by a wait list for spheres, shared between copies."""
+    _dependency_recorder: Optional[_DependencyRecorder] = None
 
     def __init__(self, parent: MultiWorld, allow_partial_entrances: bool = False):
         assert parent.worlds, "CollectionState created without worlds initialized in parent"
@@ -742,6 +1238,8 @@ class CollectionState():
         self.locations_checked = set()
         self.stale = {player: True for player in parent.get_all_ids()}
         self.allow_partial_entrances = allow_partial_entrances
+        self._entrance_dependencies = {}
+        self._opaque_locations = set()
         for function in self.additional_init_functions:
             function(self, parent)
         for items in parent.precollected_items.values():
@@ -763,6 +1261,8 @@ class CollectionState():
 
         if world.explicit_indirect_conditions:
             self._update_reachable_regions_explicit_indirect_conditions(player, queue)
+        elif world.record_rule_dependencies:
+            self._update_reachable_regions_recorded_indirect_conditions(player, queue)
         else:
             self._update_reachable_regions_auto_indirect_conditions(player, queue)
 
@@ -815,21 +1315,138 @@ class CollectionState():
             # sweep for indirect connections, mostly Entrance.can_reach(unrelated_Region)
             queue.extend(blocked_connections)
 
+    def _update_reachable_regions_recorded_indirect_conditions(self, player: int, queue: deque):
+        # the recorder is taken for the duration of this update, so updates of other players triggered by access rules
+        # do not record into it
+        recorder = self._dependency_recorder or _DependencyRecorder(self)
+        self._dependency_recorder = None
+        try:
+            recorder.refresh()
+            self._search_with_entrance_dependencies(player, queue, recorder)
+        finally:
+            self._dependency_recorder = recorder
+
+    def _search_with_entrance_dependencies(self, player: int, queue: deque, recorder: _DependencyRecorder) -> None:
+        reachable_regions = self.reachable_regions[player]
+        blocked_connections = self.blocked_connections[player]
+        entrance_dependencies = self._entrance_dependencies
+        # run BFS on all connections, and keep track of those blocked by missing items
+        while True:
+            new_regions: Set[Region] = set()
+            while queue:
+                connection = queue.popleft()
+                new_region = connection.connected_region
+                if new_region in reachable_regions:
+                    blocked_connections.remove(connection)
+                    continue
+                recorded = entrance_dependencies.get(connection, None)
+                if recorded is not None and recorded.still_blocks(connection, self):
+                    continue
+                if recorder.evaluate(connection):
+                    if self.allow_partial_entrances and not new_region:
+                        # stays blocked without depending on anything in particular
+                        entrance_dependencies.pop(connection, None)
+                        continue
+                    assert new_region, f"tried to search through an Entrance \"{connection}\" with no connected Region"
+                    reachable_regions.add(new_region)
+                    blocked_connections.remove(connection)
+                    blocked_connections.update(new_region.exits)
+                    queue.extend(new_region.exits)
+                    self.path[new_region] = (new_region.name, self.path.get(connection, None))
+                    new_regions.add(new_region)
+                    continue
+                dependencies = recorder.take_dependencies()
+                if dependencies is None or type(connection).can_reach is not Entrance.can_reach:
+                    entrance_dependencies.pop(connection, None)
+                else:
+                    entrance_dependencies[connection] = _EntranceDependencies(connection.access_rule,
+                                                                              connection.parent_region, *dependencies)
+            if not new_regions:
+                break
+            # sweep for indirect connections, mostly Entrance.can_reach(unrelated_Region),
+            # only retrying those that looked up a region which became reachable in this pass
+            for connection in blocked_connections:
+                recorded = entrance_dependencies.get(connection, None)
+                if recorded is None or not new_regions.isdisjoint(recorded.unreached_regions):
+                    queue.append(connection)
+
+    def _share(self) -> Dict[str, Dict[int, Any]]:
+        """
+        Freezes the per-player data of this state into sources that may be shared with other states.
+        Afterward, this state clones each player's data again the first time it is accessed, so that neither this state
+        nor any state sharing the sources can mutate them.
+        """
+        per_player: Dict[str, Dict[int, Any]] = {}
+        for name, copier in itertools.chain(self.per_player_attributes.items(),
+                                            self.additional_lazy_copy_attributes.items()):
+            current = getattr(self, name)
+            frozen = current.freeze() if isinstance(current, _CopyOnAccessDict) else current
+            per_player[name] = frozen
+            setattr(self, name, _CopyOnAccessDict(frozen.copy(), copier))
+        return per_player
+
+    def _adopt(self, per_player: Dict[str, Dict[int, Any]], other: CollectionState) -> None:
+        """Points this state at per-player sources produced by `_share` and copies the rest of `other`."""
+        for name, copier in itertools.chain(self.per_player_attributes.items(),
+                                            self.additional_lazy_copy_attributes.items()):
+            setattr(self, name, _CopyOnAccessDict(per_player[name].copy(), copier))
+        self.advancements = other.advancements.copy()
+        self.path = other.path.copy()
+        self.locations_checked = other.locations_checked.copy()
+        self.allow_partial_entrances = other.allow_partial_entrances
+
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
-        ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
-        ret.reachable_regions = {player: region_set.copy() for player, region_set in
-                                 self.reachable_regions.items()}
-        ret.blocked_connections = {player: entrance_set.copy() for player, entrance_set in
-                                   self.blocked_connections.items()}
-        ret.advancements = self.advancements.copy()
-        ret.path = self.path.copy()
-        ret.locations_checked = self.locations_checked.copy()
-        ret.allow_partial_entrances = self.allow_partial_entrances
+        """
+        Creates a copy of this state.
+        The copy is copy-on-write: each player's data is only cloned once it is accessed by either state.
+        """
+        ret = self.__class__.__new__(self.__class__)
+        ret.multiworld = self.multiworld
+        ret.stale = {player: True for player in self.stale}
+        ret._entrance_dependencies = self._entrance_dependencies
+        ret._opaque_locations = self._opaque_locations
+        per_player = self._share()
+        ret._adopt(per_player, self)
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
+        # init functions reset mixin attributes, so lazily copied ones are pointed at the shared data afterward
+        for name, copier in self.additional_lazy_copy_attributes.items():
+            setattr(ret, name, _CopyOnAccessDict(per_player[name].copy(), copier))
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
 
+    def checkpoint(self) -> CollectionState:
+        """
+        Takes a snapshot of this state that `rollback` can later restore, allowing items to be collected or removed
+        speculatively. Taking a checkpoint does not clone any per-player data.
+
+        :return: An opaque token that should only be passed to `rollback`.
+        """
+        checkpoint = self.copy()
+        checkpoint.stale = self.stale.copy()
+        return checkpoint
+
+    def rollback(self, checkpoint: CollectionState) -> None:
+        """
+        Restores this state to exactly what it was when `checkpoint` was taken, including its reachable regions, so
+        undoing a speculative `remove` does not require searching the regions again.
+        The same checkpoint may be rolled back to multiple times.
+
+        :param checkpoint: A token previously returned by `checkpoint` on this state.
+        """
+        assert checkpoint.multiworld is self.multiworld, "tried to roll back to a checkpoint of a different multiworld"
+        per_player = checkpoint._share()
+        self._adopt(per_player, checkpoint)
+        self.stale = checkpoint.stale.copy()
+        # as in copy, init functions reset mixin attributes that are not copied, such as caches of their own
+        for function in self.additional_init_functions:
+            function(self, self.multiworld)
+        for name, copier in self.additional_lazy_copy_attributes.items():
+            setattr(self, name, _CopyOnAccessDict(per_player[name].copy(), copier))
+        for function in self.additional_copy_functions:
+            function(checkpoint, self)
+
     def can_reach(self,
                   spot: Union[Location, Entrance, Region, str],
                   resolution_hint: Optional[str] = None,
@@ -1362,7 +1979,7 @@ class Region:
         self,
         location_name: str,
         item_name: str | None = None,
-        rule: Callable[[CollectionState], bool] | None = None,
+        rule: Callable[[CollectionState], bool] | Rule | None = None,
         location_type: type[Location] | None = None,
         item_type: type[Item] | None = None,
         show_in_spoiler: bool = True,
@@ -1390,7 +2007,7 @@ class Region:
         event_location = location_type(self.player, location_name, None, self)
         event_location.show_in_spoiler = show_in_spoiler
         if rule is not None:
-            event_location.access_rule = rule
+            event_location.access_rule = to_access_rule(rule)
 
         event_item = item_type(item_name, ItemClassification.progression, None, self.player)
 
@@ -1401,7 +2018,7 @@ class Region:
         return event_item
 
     def connect(self, connecting_region: Region, name: Optional[str] = None,
-                rule: Optional[Callable[[CollectionState], bool]] = None) -> Entrance:
+                rule: Optional[Callable[[CollectionState], bool] | Rule] = None) -> Entrance:
         """
         Connects this Region to another Region, placing the provided rule on the connection.
 
@@ -1410,7 +2027,7 @@ class Region:
         :param rule: callable to determine access of this connection to go from self to the exiting_region"""
         exit_ = self.create_exit(name if name else f"{self.name} -> {connecting_region.name}")
         if rule:
-            exit_.access_rule = rule
+            exit_.access_rule = to_access_rule(rule)
         exit_.connect(connecting_region)
         return exit_
 
@@ -1692,24 +2309,37 @@ class Spoiler:
     def create_playthrough(self, create_paths: bool = True) -> None:
         """Destructive to the multiworld while it is run, damage gets repaired afterwards."""
         from itertools import chain
-        # get locations containing progress items
         multiworld = self.multiworld
+
+        def collect_spheres(sphere_state: CollectionState, locations: Iterable[Location]) -> Iterator[Set[Location]]:
+            """
+            Yields the spheres of `locations` reachable from `sphere_state`, after collecting each into it, until all
+            locations are collected or an empty sphere was yielded.
+            """
+            # locations are only tested again once something they depend on was collected
+            wait_list = LocationWaitList(sphere_state)
+            locations = list(locations)
+            while locations or wait_list.waiting:
+                sphere = set(wait_list.test(locations))
+                changed_players: Set[int] = set()
+                for location in sphere:
+                    if sphere_state.collect(location.item, True, location):
+                        changed_players.add(location.item.player)
+                yield sphere
+                if not sphere:
+                    return
+                locations = wait_list.wake(changed_players)
+
+        # get locations containing progress items
         prog_locations = {location for location in multiworld.get_filled_locations() if location.item.advancement}
         state_cache: List[Optional[CollectionState]] = [None]
         collection_spheres: List[Set[Location]] = []
         state = CollectionState(multiworld)
         sphere_candidates = set(prog_locations)
         logging.debug('Building up collection spheres.')
-        while sphere_candidates:
-
-            # build up spheres of collection radius.
-            # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-
-            sphere = {location for location in sphere_candidates if state.can_reach(location)}
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-
+        # build up spheres of collection radius.
+        # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
+        for sphere in collect_spheres(state, prog_locations):
             sphere_candidates -= sphere
             collection_spheres.append(sphere)
             state_cache.append(state.copy())
@@ -1758,10 +2388,13 @@ class Spoiler:
                     continue
                 logging.debug('Checking if %s (Player %d) is required to beat the game.', item.name, item.player)
                 precollected_items.remove(item)
+                checkpoint = multiworld.state.checkpoint()
                 multiworld.state.remove(item)
                 if not multiworld.can_beat_game(multiworld.state, required_locations):
-                    # Add the item back into `precollected_items` and collect it into `multiworld.state`.
-                    multiworld.push_precollected(item)
+                    # Add the item back into `precollected_items` and restore `multiworld.state` from before the
+                    # removal, which keeps its reachable regions instead of having to find them again.
+                    precollected_items.append(item)
+                    multiworld.state.rollback(checkpoint)
                 else:
                     removed_precollected.append(item)
 
@@ -1774,12 +2407,7 @@ class Spoiler:
         required_locations = {item for sphere in collection_spheres for item in sphere}
         state = CollectionState(multiworld)
         collection_spheres = []
-        while required_locations:
-            sphere = set(filter(state.can_reach, required_locations))
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-
+        for sphere in collect_spheres(state, required_locations.copy()):
             collection_spheres.append(sphere)
 
             logging.debug('Calculated final sphere %i, containing %i of %i progress items.', len(collection_spheres),
@@ -1823,16 +2451,24 @@ class Spoiler:
 
         self.paths = {}
         topology_worlds = (player for player in multiworld.player_ids if multiworld.worlds[player].topology_present)
+        locations_per_player: Dict[int, List[Location]] = defaultdict(list)
+        for sphere in collection_spheres:
+            for location in sphere:
+                locations_per_player[location.player].append(location)
+        lttp_players = multiworld.get_game_players("A Link to the Past")
+        # whether any path so far passes Pyramid Fairy, so the paths do not have to be searched again for every player
+        passes_pyramid_fairy = False
         for player in topology_worlds:
-            self.paths.update(
-                {str(location): get_path(state, location.parent_region)
-                 for sphere in collection_spheres for location in sphere
-                 if location.player == player})
-            if player in multiworld.get_game_players("A Link to the Past"):
+            player_paths = {str(location): get_path(state, location.parent_region)
+                            for location in locations_per_player[player]}
+            self.paths.update(player_paths)
+            passes_pyramid_fairy = passes_pyramid_fairy or any(exit_path == 'Pyramid Fairy'
+                                                               for path in player_paths.values()
+                                                               for (_, exit_path) in path)
+            if player in lttp_players:
                 # If Pyramid Fairy Entrance needs to be reached, also path to Big Bomb Shop
                 # Maybe move the big bomb over to the Event system instead?
-                if any(exit_path == 'Pyramid Fairy' for path in self.paths.values()
-                       for (_, exit_path) in path):
+                if passes_pyramid_fairy:
                     if multiworld.worlds[player].options.mode != 'inverted':
                         self.paths[str(multiworld.get_region('Big Bomb Shop', player))] = \
                             get_path(state, multiworld.get_region('Big Bomb Shop', player))
@@ -1851,6 +2487,37 @@ class Spoiler:
                 display_name = getattr(option_obj, "display_name", option_key)
                 outfile.write(f"{display_name + ':':33}{res.current_option_name}\n")
 
+        def write_lines(lines: Iterable[str]) -> None:
+            """Writes `lines` separated by newlines as they are produced, instead of joining whole sections first."""
+            separator = ""
+            for line in lines:
+                outfile.write(separator)
+                outfile.write(line)
+                separator = "\n"
+
+        def playthrough_lines() -> Iterator[str]:
+            for sphere_nr, sphere in self.playthrough.items():
+                yield f"{sphere_nr}: {{"
+                if not sphere:
+                    yield ""
+                elif isinstance(sphere, dict):
+                    for location, item in sphere.items():
+                        yield f"  {location}: {item}"
+                else:
+                    for item in sphere:
+                        yield f"  {item}"
+                yield "}"
+
+        def path_lines() -> Iterator[str]:
+            for location, path in sorted(self.paths.items()):
+                path_lines: List[str] = []
+                for region, exit in path:
+                    if exit is not None:
+                        path_lines.append("{} -> {}".format(region, exit))
+                    else:
+                        path_lines.append(region)
+                yield "{}\n        {}".format(location, "\n   =>   ".join(path_lines))
+
         with open(filename, 'w', encoding="utf-8-sig") as outfile:
             outfile.write(
                 'Archipelago Version %s  -  Seed: %s\n\n' % (
@@ -1858,7 +2525,7 @@ class Spoiler:
             outfile.write('Filling Algorithm:               %s\n' % self.multiworld.algorithm)
             outfile.write('Players:                         %d\n' % self.multiworld.players)
             if self.multiworld.players > 1:
-                loc_count = len([loc for loc in self.multiworld.get_locations() if not loc.is_event])
+                loc_count = sum(1 for loc in self.multiworld.get_locations() if not loc.is_event)
                 outfile.write('Total Location Count:            %d\n' % loc_count)
             outfile.write(f'Plando Options:                  {self.multiworld.plando_options}\n')
             AutoWorld.call_stage(self.multiworld, "write_spoiler_header", outfile)
@@ -1868,7 +2535,7 @@ class Spoiler:
                     outfile.write('\nPlayer %d: %s\n' % (player, self.multiworld.get_player_name(player)))
                 outfile.write('Game:                            %s\n' % self.multiworld.game[player])
 
-                loc_count = len([loc for loc in self.multiworld.get_locations(player) if not loc.is_event])
+                loc_count = sum(1 for loc in self.multiworld.get_locations(player) if not loc.is_event)
                 outfile.write('Location Count:                  %d\n' % loc_count)
 
                 for f_option, option in self.multiworld.worlds[player].options_dataclass.type_hints.items():
@@ -1878,51 +2545,34 @@ class Spoiler:
 
             if self.entrances:
                 outfile.write('\n\nEntrances:\n\n')
-                outfile.write('\n'.join(['%s%s %s %s' % (f'{self.multiworld.get_player_name(entry["player"])}: '
-                                                         if self.multiworld.players > 1 else '', entry['entrance'],
-                                                         '<=>' if entry['direction'] == 'both' else
-                                                         '<=' if entry['direction'] == 'exit' else '=>',
-                                                         entry['exit']) for entry in self.entrances.values()]))
+                write_lines('%s%s %s %s' % (f'{self.multiworld.get_player_name(entry["player"])}: '
+                                            if self.multiworld.players > 1 else '', entry['entrance'],
+                                            '<=>' if entry['direction'] == 'both' else
+                                            '<=' if entry['direction'] == 'exit' else '=>',
+                                            entry['exit']) for entry in self.entrances.values())
 
             AutoWorld.call_all(self.multiworld, "write_spoiler", outfile)
 
-            precollected_items = [f"{item.name} ({self.multiworld.get_player_name(item.player)})"
-                                  if self.multiworld.players > 1
-                                  else item.name
-                                  for item in chain.from_iterable(self.multiworld.precollected_items.values())]
-            if precollected_items:
+            if any(self.multiworld.precollected_items.values()):
                 outfile.write("\n\nStarting Items:\n\n")
-                outfile.write("\n".join([item for item in precollected_items]))
+                write_lines(f"{item.name} ({self.multiworld.get_player_name(item.player)})"
+                            if self.multiworld.players > 1
+                            else item.name
+                            for item in chain.from_iterable(self.multiworld.precollected_items.values()))
 
-            locations = [(str(location), str(location.item) if location.item is not None else "Nothing")
-                         for location in self.multiworld.get_locations() if location.show_in_spoiler]
             outfile.write('\n\nLocations:\n\n')
-            outfile.write('\n'.join(
-                ['%s: %s' % (location, item) for location, item in locations]))
+            write_lines('%s: %s' % (location, location.item if location.item is not None else "Nothing")
+                        for location in self.multiworld.get_locations() if location.show_in_spoiler)
 
             outfile.write('\n\nPlaythrough:\n\n')
-            outfile.write('\n'.join(['%s: {\n%s\n}' % (sphere_nr, '\n'.join(
-                [f"  {location}: {item}" for (location, item) in sphere.items()] if isinstance(sphere, dict) else
-                [f"  {item}" for item in sphere])) for (sphere_nr, sphere) in self.playthrough.items()]))
+            write_lines(playthrough_lines())
             if self.unreachables:
                 outfile.write('\n\nUnreachable Progression Items:\n\n')
-                outfile.write(
-                    '\n'.join(['%s: %s' % (unreachable.item, unreachable)
-                               for unreachable in sorted(self.unreachables)]))
+                write_lines('%s: %s' % (unreachable.item, unreachable) for unreachable in sorted(self.unreachables))
 
             if self.paths:
                 outfile.write('\n\nPaths:\n\n')
-                path_listings: List[str] = []
-                for location, path in sorted(self.paths.items()):
-                    path_lines: List[str] = []
-                    for region, exit in path:
-                        if exit is not None:
-                            path_lines.append("{} -> {}".format(region, exit))
-                        else:
-                            path_lines.append(region)
-                    path_listings.append("{}\n        {}".format(location, "\n   =>   ".join(path_lines)))
-
-                outfile.write('\n'.join(path_listings))
+                write_lines(path_lines())
             AutoWorld.call_all(self.multiworld, "write_spoiler_end", outfile)
 
 
@@ -4,7 +4,8 @@ import logging
 import typing
 from collections import Counter, deque
 
-from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock
+from BaseClasses import CollectionState, Item, Location, LocationProgressType, LocationWaitList, MultiWorld, \
+    PlandoItemBlock
 from Options import Accessibility
 
 from worlds.AutoWorld import call_all
@@ -20,8 +21,14 @@ class FillError(RuntimeError):
         super().__init__(*args)
 
 
+fill_progress_listeners: typing.List[typing.Callable[[str, int, int], None]] = []
+"""called with the fill step, placed and total items whenever fill progress is logged"""
+
+
 def _log_fill_progress(name: str, placed: int, total_items: int) -> None:
     logging.info(f"Current fill step ({name}) at {placed}/{total_items} items placed.")
+    for listener in fill_progress_listeners:
+        listener(name, placed, total_items)
 
 
 def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item] = tuple(),
@@ -58,12 +65,19 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     reachable_items: typing.Dict[int, typing.Deque[Item]] = {}
     for item in item_pool:
         reachable_items.setdefault(item.player, deque()).append(item)
+    # with single player placement, an item can only go to locations of its own player, so only those are searched
+    # and the filled ones are removed from `locations` all at once after the placements
+    locations_by_player: typing.Dict[int, typing.List[Location]] = {}
+    filled_locations: typing.Set[Location] = set()
+    if single_player_placement:
+        for location in locations:
+            locations_by_player.setdefault(location.player, []).append(location)
 
     # for progress logging
     total = min(len(item_pool), len(locations))
     placed = 0
 
-    while any(reachable_items.values()) and locations:
+    while any(reachable_items.values()) and len(locations) > len(filled_locations):
         if one_item_per_player:
             # grab one item per player
             items_to_place = [items.pop()
@@ -90,7 +104,7 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
         while items_to_place:
             # if we have run out of locations to fill,break out of this loop
-            if not locations:
+            if len(locations) == len(filled_locations):
                 unplaced_items += items_to_place
                 break
             item_to_place = items_to_place.pop(0)
@@ -105,15 +119,22 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
             else:
                 perform_access_check = True
 
-            for i, location in enumerate(locations):
-                if (not single_player_placement or location.player == item_to_place.player) \
-                        and location.can_fill(maximum_exploration_state, item_to_place, perform_access_check):
-                    # popping by index is faster than removing by content,
-                    spot_to_fill = locations.pop(i)
-                    # skipping a scan for the element
-                    break
-
+            if single_player_placement:
+                player_locations = locations_by_player.get(item_to_place.player, [])
+                for i, location in enumerate(player_locations):
+                    if location.can_fill(maximum_exploration_state, item_to_place, perform_access_check):
+                        spot_to_fill = player_locations.pop(i)
+                        filled_locations.add(spot_to_fill)
+                        break
             else:
+                for i, location in enumerate(locations):
+                    if location.can_fill(maximum_exploration_state, item_to_place, perform_access_check):
+                        # popping by index is faster than removing by content,
+                        spot_to_fill = locations.pop(i)
+                        # skipping a scan for the element
+                        break
+
+            if spot_to_fill is None:
                 # we filled all reachable spots.
                 if swap:
                     # Keep a cache of previous safe swap states that might be usable to sweep from to produce the next
@@ -142,16 +163,20 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                         location.item = None
                         placed_item.location = None
 
+                        swap_checkpoint: typing.Optional[CollectionState] = None
                         for previous_safe_swap_state in previous_safe_swap_state_cache:
                             # If a state has already checked the location of the swap, then it cannot be used.
                             if location not in previous_safe_swap_state.advancements:
                                 # Previous swap states will have collected all items in `item_pool`, so the new
                                 # `swap_state` can skip having to collect them again.
                                 # Previous swap states will also have already checked many locations, making the sweep
-                                # faster.
-                                swap_state = sweep_from_pool(previous_safe_swap_state, (placed_item,) if unsafe else (),
-                                                             multiworld.get_filled_locations(item.player)
-                                                             if single_player_placement else None)
+                                # faster. The cached state is swept speculatively and rolled back after the attempt.
+                                swap_state = previous_safe_swap_state
+                                swap_checkpoint = swap_state.checkpoint()
+                                if unsafe:
+                                    swap_state.collect(placed_item, True)
+                                swap_state.sweep_for_advancements(locations=multiworld.get_filled_locations(item.player)
+                                                                  if single_player_placement else None)
                                 break
                         else:
                             # No previous swap_state was usable as a base state to sweep from, so create a new one.
@@ -168,8 +193,11 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                         # unsafe means swap_state assumes we can somehow collect placed_item before item_to_place
                         # by continuing to swap, which is not guaranteed. This is unsafe because there is no mechanic
                         # to clean that up later, so there is a chance generation fails.
-                        if (not single_player_placement or location.player == item_to_place.player) \
-                                and location.can_fill(swap_state, item_to_place, perform_access_check):
+                        can_swap = (not single_player_placement or location.player == item_to_place.player) \
+                            and location.can_fill(swap_state, item_to_place, perform_access_check)
+                        if swap_checkpoint:
+                            swap_state.rollback(swap_checkpoint)
+                        if can_swap:
                             # Add this item to the existing placement, and
                             # add the old item to the back of the queue
                             spot_to_fill = placements.pop(i)
@@ -209,6 +237,9 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     if total > 1000:
         _log_fill_progress(name, placed, total)
 
+    if filled_locations:
+        locations[:] = [location for location in locations if location not in filled_locations]
+
     if cleanup_required:
         # validate all placements and remove invalid ones
         state = sweep_from_pool(
@@ -769,10 +800,39 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
         sphere_num: int = 1
         moved_item_count: int = 0
 
+        # Upcoming spheres with the state each was found with, found ahead of time while balancing.
+        # They are only found again after items were swapped, as swaps can change every sphere after the current one.
+        spheres_ahead: typing.List[typing.Set[Location]] = []
+        states_ahead: typing.List[CollectionState] = []
+        sphere_finder: typing.Optional[typing.Iterator[typing.Tuple[typing.Set[Location], CollectionState]]] = None
+
         def get_sphere_locations(sphere_state: CollectionState,
                                  locations: typing.Set[Location]) -> typing.Set[Location]:
             return {loc for loc in locations if sphere_state.can_reach(loc)}
 
+        def find_spheres(sphere_state: CollectionState, locations: typing.List[Location]) \
+                -> typing.Iterator[typing.Tuple[typing.Set[Location], CollectionState]]:
+            # locations are only tested again once something they depend on was collected
+            wait_list = LocationWaitList(sphere_state)
+            while True:
+                sphere = set(wait_list.test(locations))
+                yield sphere, sphere_state.copy()
+                changed_players: typing.Set[int] = set()
+                for location in sphere:
+                    if location.advancement and sphere_state.collect(location.item, True, location):
+                        changed_players.add(location.item.player)
+                locations = wait_list.wake(changed_players)
+
+        def look_ahead(depth: int) -> None:
+            """Finds the upcoming spheres up to spheres_ahead[depth]."""
+            nonlocal sphere_finder
+            if sphere_finder is None:
+                sphere_finder = find_spheres(state.copy(), list(unchecked_locations))
+            while len(spheres_ahead) <= depth:
+                sphere, sphere_state = next(sphere_finder)
+                spheres_ahead.append(sphere)
+                states_ahead.append(sphere_state)
+
         def item_percentage(player: int, num: int) -> float:
             return num / total_locations_count[player]
 
@@ -784,7 +844,9 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
             # Gather non-locked locations.
             # This ensures that only shuffled locations get counted for progression balancing,
             #   i.e. the items the players will be checking.
-            sphere_locations = get_sphere_locations(state, unchecked_locations)
+            look_ahead(0)
+            sphere_locations = spheres_ahead.pop(0)
+            states_ahead.pop(0)
             for location in sphere_locations:
                 unchecked_locations.remove(location)
                 if not location.locked:
@@ -814,16 +876,14 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         and item_percentage(player, reachables) < threshold_percentages[player])
                 }
                 if balancing_players:
-                    balancing_state = state.copy()
-                    balancing_unchecked_locations = unchecked_locations.copy()
                     balancing_reachables = reachable_locations_count.copy()
-                    balancing_sphere = sphere_locations.copy()
+                    balancing_sphere = sphere_locations
+                    depth = 0
                     candidate_items: typing.Dict[int, typing.Set[Location]] = collections.defaultdict(set)
                     while True:
                         # Check locations in the current sphere and gather progression items to swap earlier
                         for location in balancing_sphere:
                             if location.advancement:
-                                balancing_state.collect(location.item, True, location)
                                 player = location.item.player
                                 # only replace items that end up in another player's world
                                 if (not location.locked and not location.item.skip_in_prog_balancing and
@@ -832,9 +892,11 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                                         location.progress_type != LocationProgressType.PRIORITY):
                                     candidate_items[player].add(location)
                                     logging.debug(f"Candidate item: {location.name}, {location.item.name}")
-                        balancing_sphere = get_sphere_locations(balancing_state, balancing_unchecked_locations)
+                        look_ahead(depth)
+                        balancing_state = states_ahead[depth]
+                        balancing_sphere = spheres_ahead[depth]
+                        depth += 1
                         for location in balancing_sphere:
-                            balancing_unchecked_locations.remove(location)
                             if not location.locked:
                                 balancing_reachables[location.player] += 1
                         if multiworld.has_beaten_game(balancing_state) or all(
@@ -846,8 +908,9 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                             raise RuntimeError("Not all required items reachable. Something went terribly wrong here.")
                     # Gather a set of locations which we can swap items into
                     unlocked_locations: typing.Dict[int, typing.Set[Location]] = collections.defaultdict(set)
+                    balancing_locations = set().union(*spheres_ahead[:depth])
                     for l in unchecked_locations:
-                        if l not in balancing_unchecked_locations:
+                        if l in balancing_locations:
                             unlocked_locations[l.player].add(l)
                     items_to_replace: typing.List[Location] = []
                     for player in balancing_players:
@@ -855,25 +918,27 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         items_to_test = list(candidate_items[player])
                         items_to_test.sort()
                         multiworld.random.shuffle(items_to_test)
+                        # each test collects into state speculatively and rolls it back afterward
+                        unreduced = state.checkpoint()
                         while items_to_test:
                             testing = items_to_test.pop()
-                            reducing_state = state.copy()
                             for location in itertools.chain((
                                     l for l in items_to_replace
                                     if l.item.player == player
                             ), items_to_test):
-                                reducing_state.collect(location.item, True, location)
+                                state.collect(location.item, True, location)
 
-                            reducing_state.sweep_for_advancements(locations=locations_to_test)
+                            state.sweep_for_advancements(locations=locations_to_test)
 
                             if multiworld.has_beaten_game(balancing_state):
-                                if not multiworld.has_beaten_game(reducing_state):
+                                if not multiworld.has_beaten_game(state):
                                     items_to_replace.append(testing)
                             else:
-                                reduced_sphere = get_sphere_locations(reducing_state, locations_to_test)
+                                reduced_sphere = get_sphere_locations(state, locations_to_test)
                                 p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
                                 if p < threshold_percentages[player]:
                                     items_to_replace.append(testing)
+                            state.rollback(unreduced)
 
                     old_moved_item_count = moved_item_count
 
@@ -902,6 +967,9 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
 
                     if old_moved_item_count < moved_item_count:
                         logging.debug(f"Moved {moved_item_count} items so far\n")
+                        spheres_ahead.clear()
+                        states_ahead.clear()
+                        sphere_finder = None
                         unlocked = {fresh for player in balancing_players for fresh in unlocked_locations[player]}
                         for location in get_sphere_locations(state, unlocked):
                             unchecked_locations.remove(location)
@@ -57,6 +57,9 @@ def mystery_argparse(argv: list[str] | None = None):
     parser.add_argument("--spoiler_only", action="store_true",
                         help="Skips generation assertion and multidata, outputting only a spoiler log. "
                              "Intended for debugging and testing purposes.")
+    parser.add_argument("--workers", type=lambda value: max(int(value), 1), default=1,
+                        help="Number of processes to find the spheres of the multiworld with. "
+                             "Only used on platforms that can fork processes.")
     args = parser.parse_args(argv)
 
     if args.skip_output and args.spoiler_only:
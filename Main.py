@@ -15,6 +15,7 @@ from Fill import FillError, balance_multiworld_progression, distribute_items_res
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from NetUtils import convert_to_base_types
 from Options import StartInventoryPool
+import parallel_sweep
 from Utils import __version__, output_path, restricted_dumps, version_tuple
 from settings import get_settings
 from worlds import AutoWorld
@@ -230,7 +231,9 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     with output as temp_dir:
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
-        with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
+        # the sphere workers are forked before any other thread is started, so they can't inherit a lock held by one
+        with parallel_sweep.SphereWorkers(multiworld, args.workers, sendable_only=True) as sphere_workers, \
+                concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
             check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
 
             output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
@@ -318,7 +321,7 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
                 # get spheres -> filter address==None -> skip empty
                 spheres: list[dict[int, set[int]]] = []
-                for sphere in multiworld.get_sendable_spheres():
+                for sphere in sphere_workers.spheres():
                     current_sphere: dict[int, set[int]] = collections.defaultdict(set)
                     for sphere_location in sphere:
                         current_sphere[sphere_location.player].add(sphere_location.address)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import bisect
 import collections
 import contextlib
 import copy
@@ -19,6 +20,7 @@ import shlex
 import threading
 import time
 import typing
+import uuid
 import weakref
 import zlib
 
@@ -43,7 +45,7 @@ import NetUtils
 import Utils
 from Utils import version_tuple, restricted_loads, Version, async_start, get_intended_text
 from NetUtils import Endpoint, ClientStatus, NetworkItem, decode, encode, NetworkPlayer, Permission, NetworkSlot, \
-    SlotType, LocationStore, MultiData, Hint, HintStatus
+    SlotType, LocationStore, MultiData, Hint, HintStatus, EncodedJSON, cached_fragment_encoder, encode_fragment
 from BaseClasses import ItemClassification
 
 
@@ -133,6 +135,345 @@ def get_saving_second(seed_name: str, interval: int = 60) -> int:
     return int(hashlib.sha256(seed_name.encode()).hexdigest(), 16) % interval
 
 
+JournalRecord = typing.Tuple[str, str, typing.Any, typing.Any]
+"""operation, save section, key within the section and value"""
+
+
+class SaveJournal:
+    """
+    Tracks what changed in the save of a Context since its last full save, so that regular saves can append just the
+    changes to a journal instead of writing the whole save again.
+
+    The parts of the save that grow with the room, which are received items, location checks, hints and data storage,
+    are journaled per key the server touched. The remaining, small parts of the save are journaled whole whenever they
+    differ from what was last written. Every journal entry carries the generation of the full save it follows, so
+    entries left over from before the latest full save are skipped when loading.
+
+    Changes are tracked from the event loop while saves are taken on the auto save thread, so the tracked changes are
+    only handed over under a lock, and before the values to journal are read.
+    """
+    keyed_sections: typing.ClassVar[typing.Tuple[str, ...]] = ("received_items", "location_checks", "hints",
+                                                               "stored_data", "stored_data_sizes")
+    unjournaled_sections: typing.ClassVar[typing.Tuple[str, ...]] = ("version", "connect_names", "journal_generation")
+    max_entries: int = 60
+    """journal entries after which the next save is a full save again"""
+
+    generation: typing.Optional[str]
+    entries: int
+    journal_size: int
+    save_size: int
+
+    def __init__(self) -> None:
+        self.generation = None
+        self.entries = 0
+        self.journal_size = 0
+        self.save_size = 0
+        self._touched: typing.DefaultDict[str, typing.Set[typing.Any]] = collections.defaultdict(set)
+        self._added: typing.DefaultDict[typing.Tuple[str, typing.Any], typing.Set[typing.Any]] = \
+            collections.defaultdict(set)
+        self._received_lengths: typing.Dict[typing.Any, int] = {}
+        self._written: typing.Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, section: str, key: typing.Any) -> None:
+        """Marks a key of a keyed section as changed, to journal its current value."""
+        with self._lock:
+            self._touched[section].add(key)
+
+    def add(self, section: str, key: typing.Any, values: typing.Iterable[typing.Any]) -> None:
+        """Journals values added to the set at a key of a keyed section."""
+        with self._lock:
+            self._added[section, key].update(values)
+
+    def needs_full_save(self) -> bool:
+        return self.generation is None or self.entries >= self.max_entries or self.journal_size > self.save_size
+
+    def start_full_save(self) -> None:
+        """Drops the changes tracked so far, which the full save about to be taken contains."""
+        with self._lock:
+            self._touched = collections.defaultdict(set)
+            self._added = collections.defaultdict(set)
+
+    def full_save_taken(self, save: typing.Dict[str, typing.Any]) -> None:
+        """Starts a new generation of the journal for a full save, which is marked with the generation."""
+        self.generation = uuid.uuid4().hex
+        self.entries = 0
+        self.journal_size = 0
+        save["journal_generation"] = self.generation
+        self._received_lengths = {key: len(items) for key, items in save["received_items"].items()}
+        self._written = {section: pickle.dumps(value) for section, value in save.items()
+                         if section not in self.keyed_sections and section not in self.unjournaled_sections}
+
+    def take_records(self, get_save: typing.Callable[[], typing.Dict[str, typing.Any]]) -> typing.List[JournalRecord]:
+        """
+        Returns the records of what changed since the last save, with the values from the save `get_save` takes.
+        The changes are handed over before the save is taken, so a change made meanwhile is journaled again by the next
+        save instead of being lost.
+        """
+        with self._lock:
+            touched, self._touched = self._touched, collections.defaultdict(set)
+            added, self._added = self._added, collections.defaultdict(set)
+        save = get_save()
+        records: typing.List[JournalRecord] = []
+        for section, value in save.items():
+            if section in self.keyed_sections or section in self.unjournaled_sections:
+                continue
+            encoded = pickle.dumps(value)
+            if self._written.get(section, None) != encoded:
+                self._written[section] = encoded
+                records.append(("replace", section, None, value))
+
+        for (section, key), values in added.items():
+            records.append(("add", section, key, values))
+        received_items = save["received_items"]
+        for key in touched["received_items"]:
+            items = received_items[key]
+            start = self._received_lengths.get(key, 0)
+            if len(items) > start:
+                records.append(("extend", "received_items", key, (start, items[start:])))
+                self._received_lengths[key] = len(items)
+        for section in ("hints", "stored_data", "stored_data_sizes"):
+            values = save[section]
+            for key in touched[section]:
+                if key in values:
+                    records.append(("set", section, key, values[key]))
+                else:
+                    records.append(("delete", section, key, None))
+        return records
+
+    def encode_entry(self, records: typing.List[JournalRecord]) -> bytes:
+        return pickle.dumps((self.generation, records))
+
+    def entry_written(self, size: int) -> None:
+        self.entries += 1
+        self.journal_size += size
+
+
+def replay_save_journal(save: typing.Dict[str, typing.Any],
+                        entries: typing.Iterable[bytes]) -> typing.Dict[str, typing.Any]:
+    """Applies the journal entries written after a full save to it, skipping entries of older full saves."""
+    generation = save.get("journal_generation", None)
+    for entry in entries:
+        entry_generation, records = restricted_loads(entry)
+        if generation is None or entry_generation != generation:
+            continue
+        for operation, section, key, value in records:
+            if operation == "replace":
+                save[section] = value
+            elif operation == "set":
+                save.setdefault(section, {})[key] = value
+            elif operation == "delete":
+                save.setdefault(section, {}).pop(key, None)
+            elif operation == "add":
+                save.setdefault(section, {}).setdefault(key, set()).update(value)
+            elif operation == "extend":
+                start, items = value
+                save.setdefault(section, {}).setdefault(key, [])[start:] = items
+            else:
+                raise ValueError(f"Unknown save journal operation {operation}")
+    return save
+
+
+def read_journal_file(path: str) -> typing.List[bytes]:
+    """Reads the entries of a save journal file, ignoring an entry cut short by an interrupted write."""
+    entries: typing.List[bytes] = []
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return entries
+    position = 0
+    while position + 4 <= len(data):
+        length = int.from_bytes(data[position:position + 4], "little")
+        if position + 4 + length > len(data):
+            break
+        entries.append(zlib.decompress(data[position + 4:position + 4 + length]))
+        position += 4 + length
+    return entries
+
+
+class _PrefixNode:
+    __slots__ = ("children", "clients")
+
+    children: typing.Dict[str, _PrefixNode]
+    clients: typing.Optional[weakref.WeakSet[Client]]
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.clients = None
+
+
+class DataStorageSubscriptions:
+    """
+    Clients to notify of changes to data storage keys, registered with SetNotify.
+    Besides exact keys, a client can subscribe to every key starting with a prefix. These prefixes are kept in a
+    trie, so finding the clients of a key takes a step per character of the key, however many prefixes there are.
+    """
+    exact: typing.Dict[str, weakref.WeakSet[Client]]
+
+    def __init__(self) -> None:
+        self.exact = {}
+        self.root = _PrefixNode()
+
+    def add(self, key: str, client: Client) -> None:
+        clients = self.exact.get(key, None)
+        if clients is None:
+            clients = self.exact[key] = weakref.WeakSet()
+        clients.add(client)
+
+    def add_prefix(self, prefix: str, client: Client) -> None:
+        node = self.root
+        for char in prefix:
+            child = node.children.get(char, None)
+            if child is None:
+                child = node.children[char] = _PrefixNode()
+            node = child
+        if node.clients is None:
+            node.clients = weakref.WeakSet()
+        node.clients.add(client)
+
+    def get(self, key: str) -> typing.Set[Client]:
+        """Returns the clients subscribed to key, directly or through a prefix of it."""
+        clients = self.exact.get(key, None)
+        targets: typing.Set[Client] = set(clients) if clients else set()
+        node: typing.Optional[_PrefixNode] = self.root
+        if node.clients:
+            targets.update(node.clients)
+        for char in key:
+            node = node.children.get(char, None)
+            if node is None:
+                break
+            if node.clients:
+                targets.update(node.clients)
+        return targets
+
+
+class CommandMetrics:
+    __slots__ = ("count", "total", "max", "histogram")
+
+    count: int
+    total: float
+    max: float
+    histogram: typing.List[int]
+    """number of commands per bucket of ServerMetrics.latency_buckets, with a last bucket for slower ones"""
+
+    def __init__(self, buckets: int) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (buckets + 1)
+
+
+class ServerMetrics:
+    """Counts and timings of what a room spends its time on, readable as _read_server_metrics and with /metrics.
+    Times are in seconds, sizes of sent messages in characters of uncompressed JSON."""
+    latency_buckets: typing.ClassVar[typing.Tuple[float, ...]] = (0.0001, 0.001, 0.01, 0.1, 1.0)
+    """upper bounds of the latency histogram buckets"""
+    lag_interval: typing.ClassVar[float] = 1.0
+    """how often event loop lag is measured"""
+    known_commands: typing.ClassVar[typing.FrozenSet[str]] = frozenset((
+        "Connect", "ConnectUpdate", "Sync", "LocationChecks", "LocationScouts", "CreateHints", "UpdateHint",
+        "StatusUpdate", "Say", "GetDataPackage", "Bounce", "Get", "Set", "SetNotify"))
+    """commands timed by name, others are counted together so that clients cannot grow the table"""
+
+    commands: typing.Dict[str, CommandMetrics]
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.commands = {}
+        self.sent_frames = 0
+        self.sent_chars = 0
+        self.outbound_queued = 0  # times messages were queued for an endpoint, each of which used to be a frame
+        self.outbound_frames = 0  # frames sent for them after merging
+        self.saves = 0
+        self.full_saves = 0
+        self.save_time = 0.0
+        self.last_save_time = 0.0
+        self.last_save_size = 0
+        self.hint_rechecks = 0
+        self.hint_recheck_time = 0.0
+        self.hint_recheck_max = 0.0
+        self.loop_lag = 0.0
+        self.loop_lag_max = 0.0
+
+    def record_command(self, cmd: typing.Any, duration: float) -> None:
+        name = cmd if type(cmd) is str and cmd in self.known_commands else "Unknown"
+        metrics = self.commands.get(name, None)
+        if metrics is None:
+            metrics = self.commands[name] = CommandMetrics(len(self.latency_buckets))
+        metrics.count += 1
+        metrics.total += duration
+        if duration > metrics.max:
+            metrics.max = duration
+        metrics.histogram[bisect.bisect_left(self.latency_buckets, duration)] += 1
+
+    def record_sent(self, endpoints: typing.Iterable[Client], size: int) -> None:
+        for endpoint in endpoints:
+            endpoint.sent_frames += 1
+            endpoint.sent_chars += size
+            self.sent_frames += 1
+            self.sent_chars += size
+
+    def record_queued(self, endpoints: int) -> None:
+        self.outbound_queued += endpoints
+
+    def record_merged_frame(self, endpoints: int) -> None:
+        self.outbound_frames += endpoints
+
+    def record_save(self, duration: float, size: int, full: bool) -> None:
+        self.saves += 1
+        self.full_saves += full
+        self.save_time += duration
+        self.last_save_time = duration
+        self.last_save_size = size
+
+    def record_hint_recheck(self, duration: float) -> None:
+        self.hint_rechecks += 1
+        self.hint_recheck_time += duration
+        if duration > self.hint_recheck_max:
+            self.hint_recheck_max = duration
+
+    def record_loop_lag(self, lag: float) -> None:
+        self.loop_lag = lag
+        if lag > self.loop_lag_max:
+            self.loop_lag_max = lag
+
+    def get_data(self, endpoints: typing.Iterable[Client]) -> typing.Dict[str, typing.Any]:
+        return {
+            "uptime": time.monotonic() - self.started,
+            "latency_buckets": self.latency_buckets,
+            "commands": {name: {"count": metrics.count, "total": metrics.total, "max": metrics.max,
+                                "histogram": metrics.histogram}
+                         for name, metrics in self.commands.items()},
+            "sent": {"frames": self.sent_frames, "chars": self.sent_chars,
+                     "queued": self.outbound_queued, "merged_frames": self.outbound_frames,
+                     "clients": [{"team": endpoint.team, "slot": endpoint.slot,
+                                  "frames": endpoint.sent_frames, "chars": endpoint.sent_chars}
+                                 for endpoint in endpoints if endpoint.auth]},
+            "saves": {"count": self.saves, "full": self.full_saves, "total": self.save_time,
+                      "last": self.last_save_time, "last_size": self.last_save_size},
+            "hint_rechecks": {"count": self.hint_rechecks, "total": self.hint_recheck_time,
+                              "max": self.hint_recheck_max},
+            "loop_lag": {"last": self.loop_lag, "max": self.loop_lag_max},
+        }
+
+    def get_text(self) -> typing.List[str]:
+        texts = [f"Uptime {datetime.timedelta(seconds=int(time.monotonic() - self.started))}, "
+                 f"event loop lag {self.loop_lag * 1000:.1f} ms (max {self.loop_lag_max * 1000:.1f} ms)"]
+        for name, metrics in sorted(self.commands.items(), key=lambda entry: -entry[1].total):
+            texts.append(f"{name}: {metrics.count} times, {metrics.total * 1000:.1f} ms total, "
+                         f"{metrics.total / metrics.count * 1000:.2f} ms average, {metrics.max * 1000:.1f} ms max")
+        texts.append(f"Sent {self.sent_frames} frames, "
+                     f"{Utils.format_SI_prefix(self.sent_chars, power=1024)} characters, "
+                     f"merged {self.outbound_queued} queued messages into {self.outbound_frames} frames")
+        texts.append(f"Saved {self.saves} times ({self.full_saves} full), {self.save_time * 1000:.1f} ms total, "
+                     f"last {self.last_save_time * 1000:.1f} ms for "
+                     f"{Utils.format_SI_prefix(self.last_save_size, power=1024)}B")
+        texts.append(f"Rechecked hints {self.hint_rechecks} times, {self.hint_recheck_time * 1000:.1f} ms total, "
+                     f"{self.hint_recheck_max * 1000:.1f} ms max")
+        return texts
+
+
 class Client(Endpoint):
     __slots__ = (
         "__weakref__",
@@ -149,6 +490,8 @@ class Client(Endpoint):
         "no_items",
         "no_locations",
         "no_text",
+        "sent_frames",
+        "sent_chars",
     )
 
     version: Version
@@ -164,6 +507,8 @@ class Client(Endpoint):
     no_items: bool
     no_locations: bool
     no_text: bool
+    sent_frames: int
+    sent_chars: int
 
     def __init__(self, socket: "ServerConnection", ctx: Context) -> None:
         super().__init__(socket)
@@ -180,6 +525,8 @@ class Client(Endpoint):
         self.no_items = False
         self.no_locations = False
         self.no_text = False
+        self.sent_frames = 0
+        self.sent_chars = 0
 
     @property
     def items_handling(self):
@@ -206,6 +553,49 @@ class Client(Endpoint):
 team_slot = typing.Tuple[int, int]
 
 
+class UnknownNames(dict):
+    """Names of ids, giving a placeholder for unknown ids without storing it, so the names can be shared."""
+    __slots__ = ("unknown",)
+
+    def __init__(self, unknown: str, names: typing.Dict[int, str]):
+        super().__init__(names)
+        self.unknown = unknown
+
+    def __missing__(self, key: int) -> str:
+        return self.unknown.format(key)
+
+
+class GameNames:
+    """Name lookups of one game, including the Archipelago ids for other games.
+    Never changed once built, so contexts loading the same data package can share them."""
+    __slots__ = ("item_names", "location_names", "all_item_and_group_names", "all_location_and_group_names",
+                 "__weakref__")
+
+    item_names: UnknownNames
+    location_names: UnknownNames
+    all_item_and_group_names: typing.FrozenSet[str]
+    all_location_and_group_names: typing.FrozenSet[str]
+
+    def __init__(self, game_package: typing.Dict[str, typing.Any],
+                 archipelago_package: typing.Optional[typing.Dict[str, typing.Any]],
+                 item_name_groups: typing.Mapping[str, typing.Any],
+                 location_name_groups: typing.Mapping[str, typing.Any]):
+        self.item_names = UnknownNames("Unknown item (ID:{})", {
+            item_id: item_name for item_name, item_id in game_package["item_name_to_id"].items()})
+        self.location_names = UnknownNames("Unknown location (ID:{})", {
+            location_id: location_name for location_name, location_id in game_package["location_name_to_id"].items()})
+        if archipelago_package:
+            # Add Archipelago items and locations to each data package.
+            self.item_names.update(
+                (item_id, item_name) for item_name, item_id in archipelago_package["item_name_to_id"].items())
+            self.location_names.update(
+                (location_id, location_name)
+                for location_name, location_id in archipelago_package["location_name_to_id"].items())
+        self.all_item_and_group_names = frozenset(game_package["item_name_to_id"]) | frozenset(item_name_groups)
+        self.all_location_and_group_names = \
+            frozenset(game_package["location_name_to_id"]) | frozenset(location_name_groups)
+
+
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
@@ -230,16 +620,25 @@ class Context:
     save_version = 2
     stored_data: typing.Dict[str, object]
     read_data: typing.Dict[str, object]
-    stored_data_notification_clients: typing.Dict[str, typing.Set[Client]]
+    stored_data_subscriptions: DataStorageSubscriptions
+    stored_data_sizes: typing.Dict[str, typing.Tuple[team_slot, int]]
+    """key -> slot that last set it and the pickled size of the value, kept when data_storage_quota is set"""
+    data_storage_quota: int = 0
+    """bytes of data storage values a slot can have set, 0 for no limit"""
     slot_info: typing.Dict[int, NetworkSlot]
     generator_version = Version(0, 0, 0)
+    max_messages_per_frame: typing.ClassVar[int] = 140
+    """Queued messages are merged into frames of up to this many messages, which for PrintJSON is close to the
+    compression window of 64K, but not too big on the wire (roughly 1300-2600 bytes after compression)."""
     checksums: typing.Dict[str, str]
     item_names: typing.Dict[str, typing.Dict[int, str]]
     item_name_groups: typing.Dict[str, typing.Dict[str, typing.Set[str]]]
     location_names: typing.Dict[str, typing.Dict[int, str]]
     location_name_groups: typing.Dict[str, typing.Dict[str, typing.Set[str]]]
-    all_item_and_group_names: typing.Dict[str, typing.Set[str]]
-    all_location_and_group_names: typing.Dict[str, typing.Set[str]]
+    all_item_and_group_names: typing.Dict[str, typing.AbstractSet[str]]
+    all_location_and_group_names: typing.Dict[str, typing.AbstractSet[str]]
+    game_names: typing.Dict[str, GameNames]
+    """game -> name lookups, which item_names, location_names and the all_*_and_group_names are taken from"""
     non_hintable_names: typing.Dict[str, typing.AbstractSet[str]]
     spheres: typing.List[typing.Dict[int, typing.Set[int]]]
     """ each sphere is { player: { location_id, ... } } """
@@ -252,8 +651,14 @@ class Context:
         self.logger = logger
         super(Context, self).__init__()
         self.slot_info = {}
+        self.encoded_slot_info = encode_fragment(self.slot_info)
+        # big message parts shared between clients, kept only as long as this context
+        self.encode_cached = cached_fragment_encoder()
         self.log_network = log_network
         self.endpoints = []
+        # messages queued for each endpoint during this event loop iteration, as (encoded messages, message count)
+        self.outbound: typing.Dict[Endpoint, typing.List[typing.Tuple[str, int]]] = {}
+        self.metrics = ServerMetrics()
         self.clients = {}
         self.compatibility: int = compatibility
         self.shutdown_task = None
@@ -271,6 +676,7 @@ class Context:
         self.server = None
         self.countdown_timer = 0
         self.received_items = {}
+        self.item_delivery_queue: typing.Set[team_slot] = set()  # slots with items for send_new_items to deliver
         self.start_inventory = {}
         self.name_aliases: typing.Dict[team_slot, str] = {}
         self.location_checks = collections.defaultdict(set)
@@ -278,6 +684,8 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # (team, finding_player, location) -> hints in any slot's set, so that checks only recheck their own hints
+        self.location_hints: typing.Dict[typing.Tuple[int, int, int], typing.Set[Hint]] = {}
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -297,6 +705,7 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_journal = SaveJournal()
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -305,7 +714,9 @@ class Context:
         self.group_collected: typing.Dict[int, typing.Set[int]] = {}
         self.random = random.Random()
         self.stored_data = {}
-        self.stored_data_notification_clients = collections.defaultdict(weakref.WeakSet)
+        self.stored_data_subscriptions = DataStorageSubscriptions()
+        self.stored_data_sizes = {}
+        self.stored_data_usage: typing.Counter[team_slot] = collections.Counter()
         self.read_data = {}
         self.spheres = []
 
@@ -316,6 +727,9 @@ class Context:
         self.location_name_groups = {}
         self.all_item_and_group_names = {}
         self.all_location_and_group_names = {}
+        self.game_names = {}
+        # id of a name collection of the game data -> (collection, index), holding on to the collection keeps the id
+        self.fuzzy_indexes: typing.Dict[int, typing.Tuple[typing.Collection[str], Utils.FuzzyIndex]] = {}
         self.item_names = collections.defaultdict(
             lambda: Utils.KeyedDefaultDict(lambda code: f'Unknown item (ID:{code})'))
         self.location_names = collections.defaultdict(
@@ -342,24 +756,21 @@ class Context:
             del game_package["location_name_groups"]
 
     def _init_game_data(self):
+        archipelago_package = self.gamespackage.get("Archipelago", {"item_name_to_id": {}, "location_name_to_id": {}})
         for game_name, game_package in self.gamespackage.items():
             if "checksum" in game_package:
                 self.checksums[game_name] = game_package["checksum"]
-            for item_name, item_id in game_package["item_name_to_id"].items():
-                self.item_names[game_name][item_id] = item_name
-            for location_name, location_id in game_package["location_name_to_id"].items():
-                self.location_names[game_name][location_id] = location_name
-            self.all_item_and_group_names[game_name] = \
-                set(game_package["item_name_to_id"]) | set(self.item_name_groups[game_name])
-            self.all_location_and_group_names[game_name] = \
-                set(game_package["location_name_to_id"]) | set(self.location_name_groups.get(game_name, []))
-
-        archipelago_item_names = self.item_names["Archipelago"]
-        archipelago_location_names = self.location_names["Archipelago"]
-        for game in [game_name for game_name in self.gamespackage if game_name != "Archipelago"]:
-            # Add Archipelago items and locations to each data package.
-            self.item_names[game].update(archipelago_item_names)
-            self.location_names[game].update(archipelago_location_names)
+            self.game_names[game_name] = names = self._get_game_names(game_name, game_package, archipelago_package)
+            self.item_names[game_name] = names.item_names
+            self.location_names[game_name] = names.location_names
+            self.all_item_and_group_names[game_name] = names.all_item_and_group_names
+            self.all_location_and_group_names[game_name] = names.all_location_and_group_names
+
+    def _get_game_names(self, game_name: str, game_package: typing.Dict[str, typing.Any],
+                        archipelago_package: typing.Dict[str, typing.Any]) -> GameNames:
+        return GameNames(game_package, archipelago_package if game_name != "Archipelago" else None,
+                         self.item_name_groups[game_name],
+                         self.location_name_groups.get(game_name, {}))
 
     def item_names_for_game(self, game: str) -> typing.Optional[typing.Dict[str, int]]:
         return self.gamespackage[game]["item_name_to_id"] if game in self.gamespackage else None
@@ -367,6 +778,14 @@ class Context:
     def location_names_for_game(self, game: str) -> typing.Optional[typing.Dict[str, int]]:
         return self.gamespackage[game]["location_name_to_id"] if game in self.gamespackage else None
 
+    def get_fuzzy_index(self, names: typing.Collection[str]) -> Utils.FuzzyIndex:
+        """Returns the search index for one of the name collections of the game data, built on first use.
+        The collection must not change afterwards."""
+        cached = self.fuzzy_indexes.get(id(names), None)
+        if cached is None or cached[0] is not names:
+            cached = self.fuzzy_indexes[id(names)] = names, Utils.FuzzyIndex(names)
+        return cached[1]
+
     # General networking
     async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
         if not endpoint.socket or not endpoint.socket.open:
@@ -379,6 +798,7 @@ class Context:
             await self.disconnect(endpoint)
             return False
         else:
+            self.metrics.record_sent((endpoint,), len(msg))
             if self.log_network:
                 self.logger.info(f"Outgoing message: {msg}")
             return True
@@ -393,25 +813,73 @@ class Context:
             await self.disconnect(endpoint)
             return False
         else:
+            self.metrics.record_sent((endpoint,), len(msg))
             if self.log_network:
                 self.logger.info(f"Outgoing message: {msg}")
             return True
 
     async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
-        sockets = []
-        for endpoint in endpoints:
-            if endpoint.socket and endpoint.socket.open:
-                sockets.append(endpoint.socket)
+        endpoints = [endpoint for endpoint in endpoints if endpoint.socket and endpoint.socket.open]
         try:
-            websockets.broadcast(sockets, msg)
+            websockets.broadcast([endpoint.socket for endpoint in endpoints], msg)
         except RuntimeError:
             self.logger.exception("Exception during broadcast_send_encoded_msgs")
             return False
         else:
+            self.metrics.record_sent(endpoints, len(msg))
             if self.log_network:
                 self.logger.info(f"Outgoing broadcast: {msg}")
             return True
 
+    def queue_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msgs: str, count: int) -> None:
+        """Queues a list of count messages encoded by dumper for the endpoints. At the end of this event loop iteration,
+        send_outbound sends everything queued for an endpoint together."""
+        if not count:
+            return
+        if not self.outbound:
+            asyncio.get_running_loop().call_soon(self.send_outbound)
+        part = msgs[1:-1], count  # without the brackets of the list, to be joined with other parts
+        queued = 0
+        for endpoint in endpoints:
+            self.outbound.setdefault(endpoint, []).append(part)
+            queued += 1
+        self.metrics.record_queued(queued)
+
+    def send_outbound(self) -> None:
+        """Sends the queued messages, merged into as few frames as max_messages_per_frame allows.
+        Endpoints that got the same messages share their frames, which are then only put together once."""
+        outbound = self.outbound
+        self.outbound = {}
+        receivers: typing.Dict[typing.Tuple[int, ...], typing.Tuple[typing.List[typing.Tuple[str, int]],
+                                                                    typing.List[Endpoint]]] = {}
+        for endpoint, parts in outbound.items():
+            if endpoint.socket and endpoint.socket.open:
+                receivers.setdefault(tuple(map(id, parts)), (parts, []))[1].append(endpoint)
+        for parts, endpoints in receivers.values():
+            frame: typing.List[str] = []
+            frame_count = 0
+            for encoded, count in parts:
+                if frame and frame_count + count > self.max_messages_per_frame:
+                    self.send_frame(endpoints, frame)
+                    self.metrics.record_merged_frame(len(endpoints))
+                    frame = []
+                    frame_count = 0
+                frame.append(encoded)
+                frame_count += count
+            self.send_frame(endpoints, frame)
+            self.metrics.record_merged_frame(len(endpoints))
+
+    def send_frame(self, endpoints: typing.List[Endpoint], parts: typing.List[str]) -> None:
+        msg = "[" + ",".join(parts) + "]"
+        try:
+            websockets.broadcast([endpoint.socket for endpoint in endpoints], msg)
+        except RuntimeError:
+            self.logger.exception("Exception during send_frame")
+        else:
+            self.metrics.record_sent(endpoints, len(msg))
+            if self.log_network:
+                self.logger.info(f"Outgoing broadcast: {msg}")
+
     def broadcast_all(self, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
         data = self.dumper(msgs)
@@ -420,7 +888,7 @@ class Context:
             for endpoint in self.endpoints
             if endpoint.auth and not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_encoded_msgs(endpoints, data, len(msgs))
 
     def broadcast_text_all(self, text: str, additional_arguments: dict = {}):
         self.logger.info("Notice (all): %s" % text)
@@ -434,11 +902,10 @@ class Context:
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_encoded_msgs(endpoints, data, len(msgs))
 
-    def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
-        msgs = self.dumper(msgs)
-        async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
+    def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[typing.Dict[str, typing.Any]]):
+        self.queue_encoded_msgs(endpoints, self.dumper(msgs), len(msgs))
 
     async def disconnect(self, endpoint: Client):
         if endpoint in self.endpoints:
@@ -451,14 +918,13 @@ class Context:
         if not client.auth or client.no_text:
             return
         self.logger.info("Notice (Player %s in team %d): %s" % (client.name, client.team + 1, text))
-        async_start(self.send_msgs(client, [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}]))
+        self.broadcast((client,), [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}])
 
     def notify_client_multiple(self, client: Client, texts: typing.List[str], additional_arguments: dict = {}):
         if not client.auth or client.no_text:
             return
-        async_start(self.send_msgs(client,
-                                   [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}
-                                    for text in texts]))
+        self.broadcast((client,), [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}
+                                   for text in texts])
 
     # loading
     def load(self, multidatapath: str, use_embedded_server_options: bool = False):
@@ -480,10 +946,15 @@ class Context:
 
     @staticmethod
     def decompress(data: bytes) -> dict:
+        return restricted_loads(Context.decompress_pickle(data))
+
+    @staticmethod
+    def decompress_pickle(data: bytes) -> bytes:
+        """Returns the pickled multidata of compressed multidata, without loading it yet."""
         format_version = data[0]
         if format_version > 3:
             raise Utils.VersionException("Incompatible multidata.")
-        return restricted_loads(zlib.decompress(data[1:]))
+        return zlib.decompress(data[1:])
 
     def _load(self, decoded_obj: MultiData, game_data_packages: typing.Dict[str, typing.Any],
               use_embedded_server_options: bool):
@@ -491,6 +962,7 @@ class Context:
         self.read_data = {}
         # there might be a better place to put this.
         self.read_data["race_mode"] = lambda: decoded_obj.get("race_mode", 0)
+        self.read_data["server_metrics"] = lambda: self.metrics.get_data(self.endpoints)
         mdata_ver = decoded_obj["minimum_versions"]["server"]
         if mdata_ver > version_tuple:
             raise RuntimeError(f"Supplied Multidata (.archipelago) requires a server of at least version {mdata_ver},"
@@ -506,6 +978,7 @@ class Context:
             self.minimum_client_versions[player] = max(Version(*version), min_version)
 
         self.slot_info = decoded_obj["slot_info"]
+        self.encoded_slot_info: EncodedJSON = encode_fragment(self.slot_info)  # sent to every connecting client
         self.games = {slot: slot_info.game for slot, slot_info in self.slot_info.items()}
         self.groups = {slot: set(slot_info.group_members) for slot, slot_info in self.slot_info.items()
                        if slot_info.type == SlotType.group}
@@ -540,6 +1013,7 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+        self.index_hints()
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -584,16 +1058,41 @@ class Context:
 
         return False
 
+    @property
+    def journal_filename(self) -> str:
+        return self.save_filename + ".journal"
+
     def _save(self, exit_save: bool = False) -> bool:
+        journal = self.save_journal
+        start = time.perf_counter()
         try:
-            # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            full = exit_save or journal.needs_full_save()
+            size = 0
+            if full:
+                journal.start_full_save()
+                save = self.get_save()
+                journal.full_save_taken(save)
+                # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+                encoded_save = zlib.compress(pickle.dumps(save))
+                with open(self.save_filename, "wb") as f:
+                    f.write(encoded_save)
+                journal.save_size = size = len(encoded_save)
+                # entries left in the journal belong to the previous generation and would be skipped anyway
+                open(self.journal_filename, "wb").close()
+            else:
+                records = journal.take_records(self.get_save)
+                if records:
+                    entry = zlib.compress(journal.encode_entry(records))
+                    with open(self.journal_filename, "ab") as f:
+                        f.write(len(entry).to_bytes(4, "little") + entry)
+                    size = len(entry) + 4
+                    journal.entry_written(size)
         except Exception as e:
             self.logger.exception(e)
+            journal.generation = None  # changes may be lost, so the next save has to be a full save
             return False
         else:
+            self.metrics.record_save(time.perf_counter() - start, size, full)
             return True
 
     def init_save(self, enabled: bool = True):
@@ -607,7 +1106,7 @@ class Context:
             try:
                 with open(self.save_filename, 'rb') as f:
                     save_data = restricted_loads(zlib.decompress(f.read()))
-                    self.set_save(save_data)
+                self.set_save(replay_save_journal(save_data, read_journal_file(self.journal_filename)))
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
@@ -645,8 +1144,7 @@ class Context:
                 import atexit
                 atexit.register(self._save, True)  # make sure we save on exit too
 
-    def get_save(self) -> dict:
-        self.recheck_hints()
+    def get_save(self) -> typing.Dict[str, typing.Any]:
         d = {
             "version": self.save_version,
             "connect_names": self.connect_names,
@@ -663,6 +1161,7 @@ class Context:
             "random_state": self.random.getstate(),
             "group_collected": dict(self.group_collected),
             "stored_data": self.stored_data,
+            "stored_data_sizes": self.stored_data_sizes,
             "game_options": {"hint_cost": self.hint_cost, "location_check_points": self.location_check_points,
                              "server_password": self.server_password, "password": self.password,
                              "release_mode": self.release_mode,
@@ -674,7 +1173,7 @@ class Context:
 
         return d
 
-    def set_save(self, savedata: dict):
+    def set_save(self, savedata: typing.Dict[str, typing.Any]):
         if self.connect_names != savedata["connect_names"]:
             raise Exception("This savegame does not appear to match the loaded multiworld.")
         if savedata["version"] > self.save_version:
@@ -682,6 +1181,7 @@ class Context:
         self.received_items = savedata["received_items"]
         self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        self.index_hints()
 
         self.name_aliases.update(savedata["name_aliases"])
         self.client_game_state.update(savedata["client_game_state"])
@@ -692,6 +1192,7 @@ class Context:
             {tuple(key): datetime.datetime.fromtimestamp(value, datetime.timezone.utc) for key, value
              in savedata["client_activity_timers"]})
         self.location_checks.update(savedata["location_checks"])
+        self.recheck_hints()  # checks only recheck the hints for their own locations from here on
         self.random.setstate(savedata["random_state"])
 
         if "game_options" in savedata:
@@ -711,6 +1212,12 @@ class Context:
 
         if "stored_data" in savedata:
             self.stored_data = savedata["stored_data"]
+        if "stored_data_sizes" in savedata:
+            # who set which key is only known from the save, so the usage of each slot is counted up from it
+            self.stored_data_sizes = savedata["stored_data_sizes"]
+            self.stored_data_usage = collections.Counter()
+            for team_and_slot, size in self.stored_data_sizes.values():
+                self.stored_data_usage[team_and_slot] += size
         # count items and slots from lists for items_handling = remote
         self.logger.info(
             f'Loaded save file with {sum([len(v) for k, v in self.received_items.items() if k[2]])} received items '
@@ -724,28 +1231,35 @@ class Context:
         return 0
 
     def recheck_hints(self, team: typing.Optional[int] = None, slot: typing.Optional[int] = None,
-                      changed: typing.Optional[typing.Set[team_slot]] = None) -> None:
+                      changed: typing.Optional[typing.Set[team_slot]] = None,
+                      locations: typing.Optional[typing.Iterable[int]] = None) -> None:
         """Refreshes the hints for the specified team/slot. Providing 'None' for either team or slot
         will refresh all teams or all slots respectively. If a set is passed for 'changed', each (team,slot)
         pair that has at least one hint modified will be added to the set.
+        If locations are passed, only the hints for those locations of the team's slot are refreshed.
         """
-        for hint_team, hint_slot in self.hints:
-            if team != hint_team and team is not None:
-                continue  # Check specified team only, all if team is None
-            if slot != hint_slot and slot is not None:
-                continue  # Check specified slot only, all if slot is None
-            new_hints: typing.Set[Hint] = set()
-            for hint in self.hints[hint_team, hint_slot]:
-                new_hint = hint.re_check(self, hint_team)
-                new_hints.add(new_hint)
-                if hint == new_hint:
-                    continue
-                for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
-                    if changed is not None:
-                        changed.add((hint_team,player))
-                    if slot is not None and slot != player:
-                        self.replace_hint(hint_team, player, hint, new_hint)
-            self.hints[hint_team, hint_slot] = new_hints
+        start = time.perf_counter()
+        rechecked: typing.Set[typing.Tuple[int, Hint]] = set()
+        if locations is not None:
+            for location in locations:
+                for hint in self.location_hints.get((team, slot, location), ()):
+                    rechecked.add((team, hint))
+        else:
+            for (hint_team, hint_slot), hints in self.hints.items():
+                if team != hint_team and team is not None:
+                    continue  # Check specified team only, all if team is None
+                if slot != hint_slot and slot is not None:
+                    continue  # Check specified slot only, all if slot is None
+                rechecked.update((hint_team, hint) for hint in hints)
+        for hint_team, hint in rechecked:
+            new_hint = hint.re_check(self, hint_team)
+            if hint == new_hint:
+                continue
+            for player in self.slot_set(hint.receiving_player) | {hint.finding_player}:
+                if changed is not None:
+                    changed.add((hint_team, player))
+                self.replace_hint(hint_team, player, hint, new_hint)
+        self.metrics.record_hint_recheck(time.perf_counter() - start)
 
     def get_rechecked_hints(self, team: int, slot: int):
         self.recheck_hints(team, slot)
@@ -817,26 +1331,29 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.location_hints.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
+                    self.save_journal.touch("hints", (team, hint.finding_player))
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
+                        self.save_journal.touch("hints", (team, player))
                         new_hint_events.add(player)
 
-            self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
+            self.logger.info("Notice (Team #%d): %s", team + 1, HintText(self, team, hint))
         for slot in new_hint_events:
             self.on_new_hint(team, slot)
         for slot, hint_data in concerns.items():
             if recipients is None or slot in recipients:
-                clients = filter(lambda c: not c.no_text, self.clients[team].get(slot, []))
+                clients = [client for client in self.clients[team].get(slot, []) if not client.no_text]
                 if not clients:
                     continue
                 client_hints = [datum[1] for datum in sorted(hint_data, key=lambda x: x[0].finding_player != slot)]
-                for client in clients:
-                    async_start(self.send_msgs(client, client_hints))
+                self.broadcast(clients, client_hints)
 
     def get_hint(self, team: int, finding_player: int, seeked_location: int) -> typing.Optional[Hint]:
-        for hint in self.hints[team, finding_player]:
-            if hint.location == seeked_location and hint.finding_player == finding_player:
+        slot_hints = self.hints[team, finding_player]
+        for hint in self.location_hints.get((team, finding_player, seeked_location), ()):
+            if hint in slot_hints:
                 return hint
         return None
     
@@ -844,6 +1361,17 @@ class Context:
         if old_hint in self.hints[team, slot]:
             self.hints[team, slot].remove(old_hint)
             self.hints[team, slot].add(new_hint)
+            location_hints = self.location_hints.setdefault((team, old_hint.finding_player, old_hint.location), set())
+            location_hints.discard(old_hint)
+            location_hints.add(new_hint)
+            self.save_journal.touch("hints", (team, slot))
+
+    def index_hints(self) -> None:
+        """Rebuilds location_hints, after hints were changed without notify_hints or replace_hint."""
+        self.location_hints.clear()
+        for (team, _), hints in self.hints.items():
+            for hint in hints:
+                self.location_hints.setdefault((team, hint.finding_player, hint.location), set()).add(hint)
     
     # "events"
 
@@ -864,26 +1392,41 @@ class Context:
             "hint_points": get_slot_points(self, team, slot)
         }])
 
+    def charge_data_storage(self, team: int, slot: int, key: str, value: typing.Any) -> bool:
+        """Counts value against the data storage quota of the slot setting key, instead of whoever set it before.
+        Returns False, without counting it, if that would exceed the quota.
+        The size is that of the whole value pickled, so every Set costs time in proportion to the size of its value,
+        not of the change; a quota makes large values that are changed often, like long lists, slower to set."""
+        size = len(pickle.dumps(value))
+        previous, previous_size = self.stored_data_sizes.get(key, (None, 0))
+        usage = self.stored_data_usage[team, slot] + size
+        if previous == (team, slot):
+            usage -= previous_size
+        if usage > self.data_storage_quota:
+            return False
+        if previous:
+            self.stored_data_usage[previous] -= previous_size
+        self.stored_data_usage[team, slot] += size
+        self.stored_data_sizes[key] = (team, slot), size
+        self.save_journal.touch("stored_data_sizes", key)
+        return True
+
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.stored_data_subscriptions.get(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.hints[team, slot]}])
 
     def on_client_status_change(self, team: int, slot: int):
         key: str = f"_read_client_status_{team}_{slot}"
-        targets: typing.Set[Client] = set(self.stored_data_notification_clients[key])
+        targets: typing.Set[Client] = self.stored_data_subscriptions.get(key)
         if targets:
             self.broadcast(targets, [{"cmd": "SetReply", "key": key, "value": self.client_game_state[team, slot]}])
 
 
 def update_aliases(ctx: Context, team: int):
-    cmd = ctx.dumper([{"cmd": "RoomUpdate",
-                       "players": ctx.get_players_package()}])
-
-    for clients in ctx.clients[team].values():
-        for client in clients:
-            async_start(ctx.send_encoded_msgs(client, cmd))
+    ctx.broadcast(itertools.chain.from_iterable(ctx.clients[team].values()),
+                  [{"cmd": "RoomUpdate", "players": ctx.get_players_package()}])
 
 
 async def server(websocket: "ServerConnection", path: str = "/", ctx: Context = None) -> None:
@@ -900,7 +1443,10 @@ async def server(websocket: "ServerConnection", path: str = "/", ctx: Context =
             if ctx.log_network:
                 ctx.logger.info(f"Incoming message: {data}")
             for msg in decode(data):
+                start = time.perf_counter()
                 await process_client_cmd(ctx, client, msg)
+                ctx.metrics.record_command(msg.get("cmd", None) if isinstance(msg, dict) else None,
+                                           time.perf_counter() - start)
     except Exception as e:
         if not isinstance(e, websockets.WebSocketException):
             ctx.logger.exception(e)
@@ -1066,19 +1612,25 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
 
 
 def send_new_items(ctx: Context):
-    for team, clients in ctx.clients.items():
-        for slot, clients in clients.items():
-            for client in clients:
-                if client.no_items:
-                    continue
-                start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-                items = get_received_items(ctx, team, slot, client.remote_items)
-                if len(start_inventory) + len(items) > client.send_index:
-                    first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
-                        "cmd": "ReceivedItems",
-                        "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
+    """Sends the items queued for delivery to the clients of their slots.
+    Clients that are at the same point of the same item lists get the same frame, which is encoded once."""
+    queue = ctx.item_delivery_queue
+    ctx.item_delivery_queue = set()
+    for team, slot in queue:
+        receivers: typing.Dict[typing.Tuple[int, bool, bool], typing.List[Client]] = collections.defaultdict(list)
+        for client in ctx.clients.get(team, {}).get(slot, ()):
+            if not client.no_items:
+                receivers[client.send_index, client.remote_start_inventory, client.remote_items].append(client)
+        for (send_index, remote_start_inventory, remote_items), clients in receivers.items():
+            start_inventory = get_start_inventory(ctx, slot, remote_start_inventory)
+            items = get_received_items(ctx, team, slot, remote_items)
+            if len(start_inventory) + len(items) > send_index:
+                first_new_item = max(0, send_index - len(start_inventory))
+                ctx.broadcast(clients, [{
+                    "cmd": "ReceivedItems",
+                    "index": send_index,
+                    "items": start_inventory[send_index:] + items[first_new_item:]}])
+                for client in clients:
                     client.send_index = len(start_inventory) + len(items)
 
 
@@ -1126,7 +1678,10 @@ def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem
         for item in items:
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
+                ctx.save_journal.touch("received_items", (team, target, False))
             get_received_items(ctx, team, target, True).append(item)
+            ctx.save_journal.touch("received_items", (team, target, True))
+        ctx.item_delivery_queue.add((team, target))
 
 
 def register_location_checks(ctx: Context, team: int, slot: int, locations: typing.Iterable[int],
@@ -1150,12 +1705,12 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             new_item = NetworkItem(item_id, location, slot, flags)
             send_items_to(ctx, team, target_player, new_item)
 
-            ctx.logger.info('(Team #%d) %s sent %s to %s (%s)' % (
-                team + 1, ctx.player_names[(team, slot)], ctx.item_names[ctx.slot_info[target_player].game][item_id],
-                ctx.player_names[(team, target_player)], ctx.location_names[ctx.slot_info[slot].game][location]))
-            if len(info_texts) >= 140:
-                # split into chunks that are close to compression window of 64K but not too big on the wire
-                # (roughly 1300-2600 bytes after compression depending on repetitiveness)
+            ctx.logger.info('(Team #%d) %s sent %s to %s (%s)',
+                            team + 1, ctx.player_names[(team, slot)],
+                            ctx.item_names[ctx.slot_info[target_player].game][item_id],
+                            ctx.player_names[(team, target_player)],
+                            ctx.location_names[ctx.slot_info[slot].game][location])
+            if len(info_texts) >= ctx.max_messages_per_frame:
                 ctx.broadcast_team(team, info_texts)
                 info_texts.clear()
             info_texts.append(json_format_send_event(new_item, target_player))
@@ -1164,6 +1719,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
         del sortable
 
         ctx.location_checks[team, slot] |= new_locations
+        ctx.save_journal.add("location_checks", (team, slot), new_locations)
         send_new_items(ctx)
         ctx.broadcast(ctx.clients[team][slot], [{
             "cmd": "RoomUpdate",
@@ -1171,7 +1727,7 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
             "checked_locations": new_locations,  # send back new checks only
         }])
         updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
+        ctx.recheck_hints(team, slot, updated_slots, new_locations)
         for hint_team, hint_slot in updated_slots:
             ctx.on_changed_hints(hint_team, hint_slot)
         ctx.save()
@@ -1273,6 +1829,19 @@ def format_hint(ctx: Context, team: int, hint: Hint) -> str:
     return text + ". " + status_names.get(hint.status, "(unknown)")
 
 
+class HintText:
+    """Formats a hint when it is turned into a string, so logging only does so for records that get written."""
+    __slots__ = ("ctx", "team", "hint")
+
+    def __init__(self, ctx: Context, team: int, hint: Hint) -> None:
+        self.ctx = ctx
+        self.team = team
+        self.hint = hint
+
+    def __str__(self) -> str:
+        return format_hint(self.ctx, self.team, self.hint)
+
+
 def json_format_send_event(net_item: NetworkItem, receiving_player: int):
     parts = []
     NetUtils.add_json_text(parts, net_item.player, type=NetUtils.JSONTypes.player_id)
@@ -1657,12 +2226,15 @@ class ClientMessageProcessor(CommonCommandProcessor):
             names = self.ctx.item_names_for_game(self.ctx.games[self.client.slot])
             item_name, usable, response = get_intended_text(
                 item_name,
-                names
+                self.ctx.get_fuzzy_index(names)
             )
             if usable:
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                self.ctx.save_journal.touch("received_items", (self.client.team, self.client.slot, False))
+                self.ctx.save_journal.touch("received_items", (self.client.team, self.client.slot, True))
+                self.ctx.item_delivery_queue.add((self.client.team, self.client.slot))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1680,9 +2252,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
         points_available = get_client_points(self.ctx, self.client)
         cost = self.ctx.get_hint_cost(self.client.slot)
         if not input_text:
-            hints = {hint.re_check(self.ctx, self.client.team) for hint in
-                     self.ctx.hints[self.client.team, self.client.slot]}
-            self.ctx.hints[self.client.team, self.client.slot] = hints
+            hints = self.ctx.get_rechecked_hints(self.client.team, self.client.slot)
             self.ctx.notify_hints(self.client.team, list(hints), recipients=(self.client.slot,))
             self.output(f"A hint costs {self.ctx.get_hint_cost(self.client.slot)} points. "
                         f"You have {points_available} points.")
@@ -1716,7 +2286,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
             names = self.ctx.all_location_and_group_names[game] \
                 if for_location else \
                 self.ctx.all_item_and_group_names[game]
-            hint_name, usable, response = get_intended_text(input_text, names)
+            hint_name, usable, response = get_intended_text(input_text, self.ctx.get_fuzzy_index(names))
 
             if usable:
                 if hint_name in self.ctx.non_hintable_names[game]:
@@ -1840,7 +2410,7 @@ def get_slot_points(ctx: Context, team: int, slot: int) -> int:
             ctx.get_hint_cost(slot) * ctx.hints_used[team, slot])
 
 
-async def process_client_cmd(ctx: Context, client: Client, args: dict):
+async def process_client_cmd(ctx: Context, client: Client, args: typing.Dict[str, typing.Any]):
     try:
         cmd: str = args["cmd"]
     except:
@@ -1908,10 +2478,11 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             connected_packet = {
                 "cmd": "Connected",
                 "team": client.team, "slot": client.slot,
-                "players": ctx.get_players_package(),
-                "missing_locations": get_missing_checks(ctx, team, slot),
-                "checked_locations": get_checked_checks(ctx, team, slot),
-                "slot_info": ctx.slot_info,
+                # the big parts are shared between clients, and encoded only once each after a restart
+                "players": ctx.encode_cached(tuple(ctx.get_players_package())),
+                "missing_locations": ctx.encode_cached(tuple(get_missing_checks(ctx, team, slot))),
+                "checked_locations": ctx.encode_cached(tuple(get_checked_checks(ctx, team, slot))),
+                "slot_info": ctx.encoded_slot_info,
                 "hint_points": get_slot_points(ctx, team, slot),
             }
             reply = [connected_packet]
@@ -2168,14 +2739,24 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                                               "text": 'Set', "original_cmd": cmd}])
                 return
             args["cmd"] = "SetReply"
-            value = ctx.stored_data.get(args["key"], args.get("default", 0))
+            key = args["key"]
+            value = ctx.stored_data.get(key, args.get("default", 0))
             args["original_value"] = copy.copy(value)
             args["slot"] = client.slot
             for operation in args["operations"]:
                 func = modify_functions[operation["operation"]]
                 value = func(value, operation["value"])
-            ctx.stored_data[args["key"]] = args["value"] = value
-            targets = set(ctx.stored_data_notification_clients[args["key"]])
+            if ctx.data_storage_quota and not ctx.charge_data_storage(client.team, client.slot, key, value):
+                if key in ctx.stored_data:
+                    # operations may have changed the stored container itself
+                    ctx.stored_data[key] = args["original_value"]
+                await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
+                                              "text": f"Set: data storage quota of {ctx.data_storage_quota} bytes "
+                                                      f"exceeded", "original_cmd": cmd}])
+                return
+            ctx.stored_data[key] = args["value"] = value
+            ctx.save_journal.touch("stored_data", key)
+            targets = ctx.stored_data_subscriptions.get(key)
             if args.get("want_reply", False):
                 targets.add(client)
             if targets:
@@ -2183,12 +2764,16 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             ctx.save()
 
         elif cmd == "SetNotify":
-            if "keys" not in args or type(args["keys"]) != list:
+            prefixes = args.get("prefixes", [])
+            if "keys" not in args or type(args["keys"]) != list or type(prefixes) != list or \
+                    not all(type(prefix) is str for prefix in prefixes):
                 await ctx.send_msgs(client, [{'cmd': 'InvalidPacket', "type": "arguments",
                                               "text": 'SetNotify', "original_cmd": cmd}])
                 return
             for key in args["keys"]:
-                ctx.stored_data_notification_clients[key].add(client)
+                ctx.stored_data_subscriptions.add(key, client)
+            for prefix in prefixes:
+                ctx.stored_data_subscriptions.add_prefix(prefix, client)
 
 
 def update_client_status(ctx: Context, client: Client, new_status: ClientStatus):
@@ -2365,7 +2950,7 @@ class ServerCommandProcessor(CommonCommandProcessor):
             team, slot = self.ctx.player_name_lookup[seeked_player]
             item_name = " ".join(item_name)
             names = self.ctx.item_names_for_game(self.ctx.games[slot])
-            item_name, usable, response = get_intended_text(item_name, names)
+            item_name, usable, response = get_intended_text(item_name, self.ctx.get_fuzzy_index(names))
             if usable:
                 amount: int = int(amount)
                 if amount > 100:
@@ -2400,7 +2985,8 @@ class ServerCommandProcessor(CommonCommandProcessor):
             if full_name.isnumeric():
                 location, usable, response = int(full_name), True, None
             elif self.ctx.location_names_for_game(game) is not None:
-                location, usable, response = get_intended_text(full_name, self.ctx.location_names_for_game(game))
+                location, usable, response = get_intended_text(
+                    full_name, self.ctx.get_fuzzy_index(self.ctx.location_names_for_game(game)))
             else:
                 self.output("Can't look up location for unknown game. Send by ID instead.")
                 return False
@@ -2431,7 +3017,8 @@ class ServerCommandProcessor(CommonCommandProcessor):
             if full_name.isnumeric():
                 item, usable, response = int(full_name), True, None
             elif game in self.ctx.all_item_and_group_names:
-                item, usable, response = get_intended_text(full_name, self.ctx.all_item_and_group_names[game])
+                item, usable, response = get_intended_text(
+                    full_name, self.ctx.get_fuzzy_index(self.ctx.all_item_and_group_names[game]))
             else:
                 self.output("Can't look up item for unknown game. Hint for ID instead.")
                 return False
@@ -2470,7 +3057,8 @@ class ServerCommandProcessor(CommonCommandProcessor):
             if full_name.isnumeric():
                 location, usable, response = int(full_name), True, None
             elif game in self.ctx.all_location_and_group_names:
-                location, usable, response = get_intended_text(full_name, self.ctx.all_location_and_group_names[game])
+                location, usable, response = get_intended_text(
+                    full_name, self.ctx.get_fuzzy_index(self.ctx.all_location_and_group_names[game]))
             else:
                 self.output("Can't look up location for unknown game. Hint for ID instead.")
                 return False
@@ -2532,6 +3120,11 @@ class ServerCommandProcessor(CommonCommandProcessor):
             self.ctx.broadcast_all([{"cmd": "RoomUpdate", option_name: getattr(self.ctx, option_name)}])
         return True
 
+    def _cmd_metrics(self) -> bool:
+        """List where the server spent its time, the messages it sent and its event loop lag."""
+        self.output("\n".join(self.ctx.metrics.get_text()))
+        return True
+
     def _cmd_datastore(self):
         """Debug Tool: list writable datastorage keys and approximate the size of their values with pickle."""
         total: int = 0
@@ -2631,10 +3224,33 @@ def parse_args() -> argparse.Namespace:
     #0 -> recommended for tournaments to force a level playing field, only allow an exact version match
     """)
     parser.add_argument('--log_network', default=defaults["log_network"], action="store_true")
+    parser.add_argument('--data_storage_quota', default=defaults["data_storage_quota"], type=int,
+                        help="bytes of data storage values each slot can have set, 0 for no limit. "
+                             "Values are measured in full on every Set while a limit is set.")
+    parser.add_argument('--log_queue', default=defaults["log_queue"], type=int,
+                        help="write logs on a background thread, queueing up to this many records. "
+                             "0 to write them directly.")
+    parser.add_argument('--log_queue_block', default=defaults["log_queue_block"], action="store_true",
+                        help="wait for room when the log queue is full, instead of dropping records")
     args = parser.parse_args()
     return args
 
 
+async def track_metrics(ctx: Context, log_interval: float = 0) -> None:
+    """Measures event loop lag until the server exits, writing the metrics to the log every log_interval seconds."""
+    loop = asyncio.get_running_loop()
+    next_log = loop.time() + log_interval
+    while not ctx.exit_event.is_set():
+        start = loop.time()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(ctx.exit_event.wait(), ctx.metrics.lag_interval)
+        now = loop.time()
+        ctx.metrics.record_loop_lag(max(0.0, now - start - ctx.metrics.lag_interval))
+        if log_interval and now >= next_log:
+            next_log = now + log_interval
+            ctx.logger.info("Server metrics:\n%s", "\n".join(ctx.metrics.get_text()))
+
+
 async def auto_shutdown(ctx, to_cancel=None):
     with contextlib.suppress(asyncio.TimeoutError):
         await asyncio.wait_for(ctx.exit_event.wait(), ctx.auto_shutdown)
@@ -2672,12 +3288,15 @@ def load_server_cert(path: str, cert_key: typing.Optional[str]) -> "ssl.SSLConte
 async def main(args: argparse.Namespace):
     Utils.init_logging(name="Server",
                        loglevel=args.loglevel.lower(),
-                       add_timestamp=args.logtime)
+                       add_timestamp=args.logtime,
+                       log_queue=args.log_queue,
+                       log_queue_block=args.log_queue_block)
 
     ctx = Context(args.host, args.port, args.server_password, args.password, args.location_check_points,
                   args.hint_cost, not args.disable_item_cheat, args.release_mode, args.collect_mode,
                   args.countdown_mode, args.remaining_mode,
                   args.auto_shutdown, args.compatibility, args.log_network)
+    ctx.data_storage_quota = args.data_storage_quota
     data_filename = args.multidata
 
     if not data_filename:
@@ -2724,10 +3343,12 @@ async def main(args: argparse.Namespace):
 
     await ctx.server
     console_task = asyncio.create_task(console(ctx))
+    metrics_task = asyncio.create_task(track_metrics(ctx))
     if ctx.auto_shutdown:
         ctx.shutdown_task = asyncio.create_task(auto_shutdown(ctx, [console_task]))
     await ctx.exit_event.wait()
     console_task.cancel()
+    metrics_task.cancel()
     if ctx.shutdown_task:
         await ctx.shutdown_task
 
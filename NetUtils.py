@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from collections.abc import Mapping, Sequence
+import functools
 import typing
 import enum
 import warnings
 from json import JSONEncoder, JSONDecoder
+from json.encoder import encode_basestring
 
 if typing.TYPE_CHECKING:
     from websockets import WebSocketServerProtocol as ServerConnection
@@ -95,7 +97,18 @@ class NetworkItem(typing.NamedTuple):
     flags: int = 0
 
 
+_plain_types = frozenset((str, int, float, bool, type(None)))
+
+
 def _scan_for_TypedTuples(obj: typing.Any) -> typing.Any:
+    obj_type = type(obj)
+    # exact types first, as almost everything sent is made of them
+    if obj_type in _plain_types:
+        return obj
+    if obj_type is dict:
+        return {key: _scan_for_TypedTuples(value) for key, value in obj.items()}
+    if obj_type is list or obj_type is tuple or obj_type is set or obj_type is frozenset:
+        return tuple([_scan_for_TypedTuples(o) for o in obj])
     if isinstance(obj, tuple) and hasattr(obj, "_fields"):  # NamedTuple is not actually a parent class
         data = obj._asdict()
         data["class"] = obj.__class__.__name__
@@ -135,10 +148,80 @@ _encode = JSONEncoder(
 ).encode
 
 
+class EncodedJSON(str):
+    """JSON text, which encode puts into a message as is when it is the value of one of the message's keys."""
+    __slots__ = ()
+
+
+def _encode_network_items(items: typing.Sequence[NetworkItem]) -> str:
+    return "[" + ",".join([
+        '{"item":%d,"location":%d,"player":%d,"flags":%d,"class":"NetworkItem"}' % item for item in items
+    ]) + "]"
+
+
+def _encode_network_players(players: typing.Sequence[NetworkPlayer]) -> str:
+    return "[" + ",".join([
+        '{"team":%d,"slot":%d,"alias":%s,"name":%s,"class":"NetworkPlayer"}' % (
+            player.team, player.slot, encode_basestring(player.alias), encode_basestring(player.name))
+        for player in players
+    ]) + "]"
+
+
+# encoders for sequences of a single type, writing the JSON without building a dict per element
+_sequence_encoders: typing.Dict[type, typing.Callable[[typing.Sequence[typing.Any]], str]] = {
+    NetworkItem: _encode_network_items,
+    NetworkPlayer: _encode_network_players,
+}
+
+
+def _is_preencodable(value: typing.Any) -> bool:
+    value_type = type(value)
+    if value_type is EncodedJSON:
+        return True
+    return (value_type is list or value_type is tuple) and bool(value) and type(value[0]) in _sequence_encoders
+
+
+def _encode_value(value: typing.Any) -> str:
+    value_type = type(value)
+    if value_type is EncodedJSON:
+        return value
+    if (value_type is list or value_type is tuple) and value:
+        element_type = type(value[0])
+        sequence_encoder = _sequence_encoders.get(element_type)
+        if sequence_encoder and all([type(element) is element_type for element in value]):
+            try:
+                return sequence_encoder(value)
+            except TypeError:
+                pass  # a field is not a number or string, which only the generic encoder can handle
+    return _encode(_scan_for_TypedTuples(value))
+
+
+def _encode_message(msg: typing.Any) -> str:
+    if type(msg) is dict and all([type(key) is str for key in msg]):
+        return "{" + ",".join([encode_basestring(key) + ":" + _encode_value(value) for key, value in msg.items()]) + "}"
+    return _encode(_scan_for_TypedTuples(msg))
+
+
 def encode(obj: typing.Any) -> str:
+    if type(obj) is list and any([type(msg) is dict and any([_is_preencodable(value) for value in msg.values()])
+                                  for msg in obj]):
+        # messages with big sequences or pre-encoded parts are put together key by key
+        return "[" + ",".join([_encode_message(msg) for msg in obj]) + "]"
     return _encode(_scan_for_TypedTuples(obj))
 
 
+def encode_fragment(obj: typing.Any) -> EncodedJSON:
+    """Encodes a part of a message ahead of time, to be sent as the value of a key."""
+    return EncodedJSON(_encode_value(obj))
+
+
+def cached_fragment_encoder(maxsize: int = 64) -> typing.Callable[[typing.Hashable], EncodedJSON]:
+    """Returns an encode_fragment that only encodes equal values once, keeping up to `maxsize` of the most recent.
+    Meant for big parts that many messages share, such as the players package or a slot's missing locations, so its
+    owner decides how long those are kept around."""
+    return functools.lru_cache(maxsize=maxsize)(encode_fragment)
+
+
 def get_any_version(data: dict) -> Version:
     data = {key.lower(): value for key, value in data.items()}  # .NET version classes have capitalized keys
     return Version(int(data["major"]), int(data["minor"]), int(data["build"]))
@@ -415,6 +498,10 @@ class Hint(typing.NamedTuple):
 
 
 class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
+    # reverse indexes, built on the first lookup by receiver, so that hints and collects only visit their results
+    _item_index: typing.Optional[typing.Dict[typing.Tuple[int, int], typing.List[typing.Tuple[int, int, int]]]] = None
+    _receiver_index: typing.Optional[typing.Dict[int, typing.Dict[int, typing.List[int]]]] = None
+
     def __init__(self, values: typing.MutableMapping[int, typing.Dict[int, typing.Tuple[int, int, int]]]):
         super().__init__(values)
 
@@ -427,21 +514,30 @@ class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tu
         if len(self.get(0, {})):
             raise ValueError("Invalid player id 0 for location")
 
-    def find_item(self, slots: typing.Set[int], seeked_item_id: int
-                  ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
+    def _build_indexes(self) -> None:
+        item_index: typing.Dict[typing.Tuple[int, int], typing.List[typing.Tuple[int, int, int]]] = {}
+        receiver_index: typing.Dict[int, typing.Dict[int, typing.List[int]]] = {}
         for finding_player, check_data in self.items():
             for location_id, (item_id, receiving_player, item_flags) in check_data.items():
-                if receiving_player in slots and item_id == seeked_item_id:
-                    yield finding_player, location_id, item_id, receiving_player, item_flags
+                item_index.setdefault((receiving_player, item_id), []).append(
+                    (finding_player, location_id, item_flags))
+                receiver_index.setdefault(receiving_player, {}).setdefault(finding_player, []).append(location_id)
+        self._item_index = item_index
+        self._receiver_index = receiver_index
+
+    def find_item(self, slots: typing.Set[int], seeked_item_id: int
+                  ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
+        if self._item_index is None:
+            self._build_indexes()
+        for receiving_player in slots:
+            for finding_player, location_id, item_flags in self._item_index.get((receiving_player, seeked_item_id), ()):
+                yield finding_player, location_id, seeked_item_id, receiving_player, item_flags
 
     def get_for_player(self, slot: int) -> typing.Dict[int, typing.Set[int]]:
-        import collections
-        all_locations: typing.Dict[int, typing.Set[int]] = collections.defaultdict(set)
-        for source_slot, location_data in self.items():
-            for location_id, values in location_data.items():
-                if values[1] == slot:
-                    all_locations[source_slot].add(location_id)
-        return all_locations
+        if self._receiver_index is None:
+            self._build_indexes()
+        return {source_slot: set(location_ids)
+                for source_slot, location_ids in self._receiver_index.get(slot, {}).items()}
 
     def get_checked(self, state: typing.Dict[typing.Tuple[int, int], typing.Set[int]], team: int, slot: int
                     ) -> typing.List[int]:
@@ -7,9 +7,12 @@ import typing
 import builtins
 import os
 import itertools
+import operator
 import subprocess
 import sys
 import pickle
+import queue
+import threading
 import functools
 import io
 import collections
@@ -539,10 +542,145 @@ def get_text_after(text: str, start: str) -> str:
 loglevel_mapping = {'error': logging.ERROR, 'info': logging.INFO, 'warning': logging.WARNING, 'debug': logging.DEBUG}
 
 
+class LogWriter:
+    """
+    Writes log records on a background thread, so that logging does not wait on formatting and file I/O.
+    Records are taken off the queue in batches and every handler is flushed once per batch.
+    When the queue is full, records are dropped and their count is logged with the next batch,
+    unless block is set, in which case logging waits for room in the queue.
+    """
+    batch_size: typing.ClassVar[int] = 512
+
+    queue: "queue.Queue[typing.Optional[typing.Tuple[logging.Handler, typing.Optional[logging.LogRecord]]]]"
+    dropped: int
+    stopping: bool
+    """Set before the end of the queue is marked, from then on records are written directly."""
+
+    def __init__(self, max_size: int, block: bool = False) -> None:
+        import atexit
+        self.queue = queue.Queue(max_size)
+        self.block = block
+        self.dropped = 0
+        self.stopping = False
+        # held while checking stopping and queueing, so that nothing is queued after the end of the queue
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def wrap(self, handler: logging.Handler) -> QueuedLogHandler:
+        return QueuedLogHandler(self, handler)
+
+    def put(self, handler: logging.Handler, record: typing.Optional[logging.LogRecord]) -> None:
+        """Queue record for handler, None closes handler once the records before it are written."""
+        block = self.block or record is None
+        while True:
+            with self.lock:
+                if self.stopping:
+                    break
+                try:
+                    self.queue.put_nowait((handler, record))
+                    return
+                except queue.Full:
+                    if not block:
+                        self.dropped += 1
+                        return
+            # wait for room outside the lock, so that stop is not held up
+            with self.queue.not_full:
+                if self.queue.full():
+                    self.queue.not_full.wait(0.1)
+        if record:
+            handler.handle(record)
+        else:
+            handler.close()
+
+    def stop(self) -> None:
+        """Write all queued records and end the thread, records logged from the start of this are written directly."""
+        with self.lock:
+            if self.stopping:
+                return
+            self.stopping = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        reported = 0
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            written: typing.Dict[logging.Handler, None] = {}
+            for entry in batch:
+                if entry is None:
+                    running = False
+                    continue
+                handler, record = entry
+                if record is None:
+                    if handler in written:
+                        del written[handler]
+                        del handler.flush
+                    handler.close()
+                    continue
+                if handler not in written:
+                    written[handler] = None
+                    handler.flush = _skip_flush  # flushed once after the batch instead of after every record
+                handler.handle(record)
+            dropped = self.dropped - reported
+            if dropped:
+                reported += dropped
+                notice = logging.makeLogRecord({
+                    "name": "LogWriter", "msg": "%d log records were dropped, as the log queue was full.",
+                    "args": (dropped,),
+                    "levelno": logging.WARNING, "levelname": "WARNING"})
+                for handler in written:
+                    handler.handle(notice)
+            for handler in written:
+                del handler.flush
+                handler.flush()
+
+
+def _skip_flush() -> None:
+    pass
+
+
+class QueuedLogHandler(logging.Handler):
+    """
+    Passes records on to handler through a LogWriter.
+    Messages are formatted on the writer's thread, so arguments given to a logging call should not be changed after it.
+    """
+
+    def __init__(self, writer: LogWriter, handler: logging.Handler) -> None:
+        super().__init__(handler.level)
+        self.writer = writer
+        self.handler = handler
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # filters of the wrapped handler are applied by the writer
+        self.writer.put(self.handler, record)
+        return True
+
+    def close(self) -> None:
+        self.writer.put(self.handler, None)
+        super().close()
+
+
+log_writer: typing.Optional[LogWriter] = None
+
+
 def init_logging(name: str, loglevel: typing.Union[str, int] = logging.INFO,
                  write_mode: str = "w", log_format: str = "[%(name)s at %(asctime)s]: %(message)s",
-                 add_timestamp: bool = False, exception_logger: typing.Optional[str] = None):
+                 add_timestamp: bool = False, exception_logger: typing.Optional[str] = None,
+                 log_queue: int = 0, log_queue_block: bool = False):
+    """
+    Set up logging to a file in the logs folder and stdout.
+    If log_queue is set, the handlers are written to by a LogWriter with a queue of that many records.
+    """
     import datetime
+    global log_writer
     loglevel: int = loglevel_mapping.get(loglevel, loglevel)
     log_folder = user_path("logs")
     os.makedirs(log_folder, exist_ok=True)
@@ -550,6 +688,11 @@ def init_logging(name: str, loglevel: typing.Union[str, int] = logging.INFO,
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
         handler.close()
+    if log_writer:
+        log_writer.stop()
+        log_writer = None
+    if log_queue > 0:
+        log_writer = LogWriter(log_queue, log_queue_block)
     root_logger.setLevel(loglevel)
     logging.getLogger("websockets").setLevel(loglevel)  # make sure level is applied for websockets
     if "a" not in write_mode:
@@ -570,14 +713,14 @@ def init_logging(name: str, loglevel: typing.Union[str, int] = logging.INFO,
 
     file_handler.addFilter(Filter("NoStream", lambda record: not getattr(record, "NoFile", False)))
     file_handler.addFilter(Filter("NoCarriageReturn", lambda record: '\r' not in record.getMessage()))
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(log_writer.wrap(file_handler) if log_writer else file_handler)
     if sys.stdout:
         formatter = logging.Formatter(fmt='[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
         stream_handler = logging.StreamHandler(sys.stdout)
         stream_handler.addFilter(Filter("NoFile", lambda record: not getattr(record, "NoStream", False)))
         if add_timestamp:
             stream_handler.setFormatter(formatter)
-        root_logger.addHandler(stream_handler)
+        root_logger.addHandler(log_writer.wrap(stream_handler) if log_writer else stream_handler)
         if hasattr(sys.stdout, "reconfigure"):
             sys.stdout.reconfigure(encoding="utf-8", errors="replace")
 
@@ -696,8 +839,89 @@ def get_fuzzy_results(input_word: str, word_list: typing.Collection[str], limit:
     )
 
 
-def get_intended_text(input_text: str, possible_answers) -> typing.Tuple[str, bool, str]:
-    picks = get_fuzzy_results(input_text, possible_answers, limit=2)
+class FuzzyIndex:
+    """
+    Words to look up like with get_fuzzy_results, for word lists that are searched many times.
+    Words are grouped by length, and as the distance between two words is at least their difference in length,
+    only groups that can still hold one of the closest words are compared to the input.
+    """
+    words: typing.List[str]
+    _first_positions: typing.Dict[str, int]
+    _lowered_first_positions: typing.Dict[str, int]
+    _by_length: typing.Dict[typing.Tuple[int, int], typing.List[typing.Tuple[int, str, str]]]
+
+    def __init__(self, words: typing.Iterable[str]) -> None:
+        self.words = list(words)
+        self._first_positions = {}
+        self._lowered_first_positions = {}
+        self._by_length = {}
+        for position, word in enumerate(self.words):
+            lowered = word.lower()
+            self._first_positions.setdefault(word, position)
+            self._lowered_first_positions.setdefault(lowered, position)
+            self._by_length.setdefault((len(word), len(lowered)), []).append((position, word, lowered))
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def get_perfect_match(self, input_word: str) -> typing.Optional[typing.Tuple[str, int]]:
+        """Returns the first result of get_fuzzy_results if it is a perfect match, ignoring case, or else None."""
+        if input_word in self._first_positions:
+            return input_word, 101
+        position = self._lowered_first_positions.get(input_word.lower(), None)
+        if position is None:
+            return None
+        return self.words[position], 100
+
+    def get_fuzzy_results(self, input_word: str, limit: int) -> typing.List[typing.Tuple[str, int]]:
+        """Returns the same as get_fuzzy_results(input_word, self.words, limit)."""
+        from jellyfish import damerau_levenshtein_distance
+
+        lowered_input = input_word.lower()
+        input_length = len(input_word)
+        lowered_input_length = len(lowered_input)
+        groups: typing.List[typing.Tuple[float, typing.List[typing.Tuple[int, str, str]]]] = []
+        for (length, lowered_length), group in self._by_length.items():
+            if length == input_length and lowered_length == lowered_input_length:
+                best_ratio = 1.01  # may hold the input itself
+            elif length != lowered_length or input_length != lowered_input_length:
+                # lowering added combining characters, which the distance does not count like len() does
+                best_ratio = 1.01
+            else:
+                best_ratio = 1 - abs(lowered_input_length - lowered_length) / max(input_length, length)
+            groups.append((best_ratio, group))
+        groups.sort(key=operator.itemgetter(0), reverse=True)
+
+        # (ratio, position, word) of the best words so far, ties going to the word that comes first like in sorted()
+        results: typing.List[typing.Tuple[float, int, str]] = []
+        for best_ratio, group in groups:
+            if len(results) == limit and best_ratio < results[-1][0]:
+                break
+            for position, word, lowered in group:
+                if word == input_word:
+                    ratio = 1.01
+                else:
+                    ratio = (1 - damerau_levenshtein_distance(lowered_input, lowered)
+                             / max(input_length, len(word)))
+                if len(results) < limit or ratio > results[-1][0] or \
+                        ratio == results[-1][0] and position < results[-1][1]:
+                    results.append((ratio, position, word))
+                    results.sort(key=lambda result: (-result[0], result[1]))
+                    del results[limit:]
+        return [(word, int(ratio * 100)) for ratio, _, word in results]
+
+
+def get_intended_text(input_text: str, possible_answers: typing.Union[typing.Collection[str], FuzzyIndex]
+                      ) -> typing.Tuple[str, bool, str]:
+    if isinstance(possible_answers, FuzzyIndex):
+        if len(possible_answers) > 1:
+            perfect_match = possible_answers.get_perfect_match(input_text)
+            if perfect_match:
+                return perfect_match[0], True, "Perfect Match" if perfect_match[1] == 101 else \
+                    "Case Insensitive Perfect Match"
+        picks = possible_answers.get_fuzzy_results(input_text, 2)
+    else:
+        picks = get_fuzzy_results(input_text, possible_answers, limit=2)
     if len(picks) > 1:
         dif = picks[0][1] - picks[1][1]
         if picks[0][1] == 101:
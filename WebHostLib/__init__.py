@@ -42,6 +42,8 @@ app.config["JOB_THRESHOLD"] = 1
 app.config["JOB_TIME"] = 600
 # memory limit for generator processes in bytes
 app.config["GENERATOR_MEMORY_LIMIT"] = 4294967296
+# predicted memory all running generations may use together in bytes, None for GENERATORS * GENERATOR_MEMORY_LIMIT
+app.config["GENERATOR_MEMORY_BUDGET"] = None
 app.config['SESSION_PERMANENT'] = True
 
 # waitress uses one thread for I/O, these are for processing of views that then get sent
@@ -57,6 +59,10 @@ app.config["MAX_ROLL"] = 20
 app.config["CACHE_TYPE"] = "SimpleCache"
 app.config["HOST_ADDRESS"] = ""
 app.config["ASSET_RIGHTS"] = False
+# write room logs on a background thread, queueing up to this many records, 0 writes them directly
+app.config["LOG_QUEUE"] = 0
+# bytes of uncompressed multidata that trackers keep decoded for the seeds last tracked, per process
+app.config["TRACKER_MULTIDATA_CACHE_BYTES"] = 64 * 1024 * 1024
 
 cache = Cache()
 Compress(app)
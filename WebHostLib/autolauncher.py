@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import functools
 import json
 import logging
 import multiprocessing
+import time
 import typing
 from datetime import timedelta, datetime
-from threading import Event, Thread
+from threading import Event, Lock, Thread
 from typing import Any
 from uuid import UUID
 
@@ -15,6 +17,8 @@ from Utils import restricted_loads
 from .locker import Locker, AlreadyRunningException
 
 _stop_event = Event()
+# how long to keep trying to start a woken up room that is still hosted, as it may be shutting down
+wake_up_retry_seconds = 10
 
 
 def stop() -> None:
@@ -52,7 +56,18 @@ def _mp_gen_game(
         setproctitle(f"Generator (idle)")
 
 
-def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, timeout: int|None) -> None:
+def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, timeout: int|None,
+                     done: typing.Callable[[], None] | None = None) -> None:
+    def success(seed_id):
+        if done:
+            done()
+        handle_generation_success(seed_id)
+
+    def failure(result: BaseException):
+        if done:
+            done()
+        handle_generation_failure(result)
+
     try:
         meta = json.loads(generation.meta)
         options = restricted_loads(generation.options)
@@ -66,17 +81,126 @@ def launch_generator(pool: multiprocessing.pool.Pool, generation: Generation, ti
                 "owner": generation.owner,
                 "timeout": timeout,
             },
-            handle_generation_success,
-            handle_generation_failure,
+            success,
+            failure,
         )
     except Exception as e:
         generation.state = STATE_ERROR
         commit()
         logging.exception(e)
+        if done:
+            done()
     else:
         generation.state = STATE_STARTED
 
 
+class GenerationCost(typing.NamedTuple):
+    players: int
+    games: int
+
+    @property
+    def work(self) -> int:
+        """Rough amount of work, in players, where each distinct game counts as a few more players."""
+        return self.players + GenerationScheduler.game_work * self.games
+
+    @property
+    def memory(self) -> int:
+        """Predicted peak memory of the generator in bytes."""
+        return (GenerationScheduler.base_memory + GenerationScheduler.player_memory * self.players +
+                GenerationScheduler.game_memory * self.games)
+
+
+def estimate_generation_cost(options: dict[str, dict[str, Any]]) -> GenerationCost:
+    return GenerationCost(len(options), len({player_options.get("game", None) for player_options in options.values()}))
+
+
+class GenerationScheduler:
+    """Decides which queued generations to start on the generator pool, instead of starting all of them in order.
+    Small generations go first and have a generator kept free for them, so they are not stuck behind huge ones,
+    and generations only start once their predicted memory fits next to the ones running.
+    Generations that waited for longer than max_wait go before all others, so big ones can't be held back forever."""
+    small_work: typing.ClassVar[int] = 10
+    """generations of up to this much work may use the last free generator"""
+    max_wait: typing.ClassVar[float] = 15 * 60
+    """seconds after which a queued generation is started next, regardless of its size"""
+    game_work: typing.ClassVar[int] = 2
+    base_memory: typing.ClassVar[int] = 256 * 1024 * 1024
+    player_memory: typing.ClassVar[int] = 16 * 1024 * 1024
+    game_memory: typing.ClassVar[int] = 32 * 1024 * 1024
+
+    generators: int
+    memory_budget: int | None
+    """predicted memory all running generations may use together, None for no limit"""
+    queued: dict[UUID, GenerationCost]
+    """generation id -> cost, in the order the generations were first seen"""
+    queued_since: dict[UUID, float]
+    """generation id -> time.monotonic() of when the generation was first seen"""
+    running: dict[UUID, GenerationCost]
+
+    def __init__(self, generators: int, memory_budget: int | None):
+        self.generators = generators
+        self.memory_budget = memory_budget
+        self.queued = {}
+        self.queued_since = {}
+        self.running = {}
+        self._lock = Lock()  # running is updated from the result thread of the pool
+
+    def get_cost(self, generation: Generation) -> GenerationCost:
+        cost = self.queued.get(generation.id, None)
+        if cost is None:
+            cost = self.queued[generation.id] = estimate_generation_cost(restricted_loads(generation.options))
+            self.queued_since[generation.id] = time.monotonic()
+        return cost
+
+    def pick(self, generations: typing.Iterable[Generation]) -> list[Generation]:
+        """Returns which of the queued generations to start now, in order."""
+        by_id = {generation.id: generation for generation in generations}
+        for generation_id in list(self.queued):
+            if generation_id not in by_id:
+                del self.queued[generation_id]  # started or deleted elsewhere
+                del self.queued_since[generation_id]
+        for generation in by_id.values():
+            self.get_cost(generation)
+        with self._lock:
+            running = len(self.running)
+            memory = sum(cost.memory for cost in self.running.values())
+        overdue_since = time.monotonic() - self.max_wait
+
+        def order(item: tuple[UUID, GenerationCost]) -> tuple[bool, bool]:
+            generation_id, cost = item
+            return self.queued_since[generation_id] > overdue_since, cost.work > self.small_work
+
+        picked: list[Generation] = []
+        # stable sort, so generations of the same size start in the order they were queued
+        for generation_id, cost in sorted(self.queued.items(), key=order):
+            free = self.generators - running
+            if free <= 0:
+                break
+            overdue = self.queued_since[generation_id] <= overdue_since
+            if free == 1 and self.generators > 1 and cost.work > self.small_work and not overdue:
+                continue  # keep the fast lane free for small generations
+            if self.memory_budget is not None and running and memory + cost.memory > self.memory_budget:
+                if overdue:
+                    break  # start nothing else until the overdue generation fits
+                continue  # a generation predicted to be too big on its own still starts once nothing else runs
+            picked.append(by_id[generation_id])
+            running += 1
+            memory += cost.memory
+        return picked
+
+    def start(self, pool: multiprocessing.pool.Pool, generation: Generation, timeout: int | None) -> None:
+        cost = self.get_cost(generation)
+        del self.queued[generation.id]
+        del self.queued_since[generation.id]
+        with self._lock:
+            self.running[generation.id] = cost
+        launch_generator(pool, generation, timeout, functools.partial(self.done, generation.id))
+
+    def done(self, generation_id: UUID) -> None:
+        with self._lock:
+            self.running.pop(generation_id, None)
+
+
 def init_generator(config: dict[str, Any]) -> None:
     from setproctitle import setproctitle
 
@@ -113,6 +237,11 @@ def cleanup():
         logging.info(f"{rooms} Rooms, {seeds} Seeds and {slots} Slots have been deleted.")
 
 
+def is_room_active(room: Room) -> bool:
+    # has to be checked in python, as the per-room timeout can't currently be PonyORM transpiled.
+    return room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5)
+
+
 def autohost(config: dict):
     def keep_running():
         stop_event = _stop_event
@@ -125,15 +254,39 @@ def autohost(config: dict):
                     hosters.append(hoster)
                     hoster.start()
 
+                with db_session:
+                    # resume rooms that were active when autohost last stopped, from then on rooms ask to be woken up
+                    rooms = select(
+                        room for room in Room if
+                        room.last_activity >= datetime.utcnow() - timedelta(days=3))
+                    for room in rooms:
+                        if is_room_active(room):
+                            hosters[room.id.int % len(hosters)].start_room(room.id)
+
+                # room id -> until when to retry starting the room, in case it was still shutting down
+                waking: dict[UUID, datetime] = {}
                 while not stop_event.wait(0.1):
                     with db_session:
-                        rooms = select(
-                            room for room in Room if
-                            room.last_activity >= datetime.utcnow() - timedelta(days=3))
-                        for room in rooms:
-                            # we have to filter twice, as the per-room timeout can't currently be PonyORM transpiled.
-                            if room.last_activity >= datetime.utcnow() - timedelta(seconds=room.timeout + 5):
-                                hosters[room.id.int % len(hosters)].start_room(room.id)
+                        wake_ups = select(wake_up for wake_up in RoomWakeUp)[:]
+                        retry_until = datetime.utcnow() + timedelta(seconds=wake_up_retry_seconds)
+                        for wake_up in wake_ups:
+                            room_id = wake_up.room.id
+                            hoster = hosters[room_id.int % len(hosters)]
+                            if hoster.is_hosting(room_id):
+                                hoster.notify_commands(room_id)
+                            waking[room_id] = retry_until
+                            wake_up.delete()
+
+                        now = datetime.utcnow()
+                        for room_id, until in list(waking.items()):
+                            hoster = hosters[room_id.int % len(hosters)]
+                            if not hoster.is_hosting(room_id):
+                                room = Room.get(id=room_id)
+                                if room and is_room_active(room):
+                                    hoster.start_room(room_id)
+                                del waking[room_id]
+                            elif until < now:
+                                del waking[room_id]  # room kept running
 
         except AlreadyRunningException:
             logging.info("Autohost reports as already running, not starting another.")
@@ -150,6 +303,10 @@ def autogen(config: dict):
                 with multiprocessing.Pool(config["GENERATORS"], initializer=init_generator,
                                           initargs=(config,), maxtasksperchild=10) as generator_pool:
                     job_time = config["JOB_TIME"]
+                    memory_budget = config["GENERATOR_MEMORY_BUDGET"]
+                    if memory_budget is None and config["GENERATOR_MEMORY_LIMIT"] > 0:
+                        memory_budget = config["GENERATORS"] * config["GENERATOR_MEMORY_LIMIT"]
+                    scheduler = GenerationScheduler(config["GENERATORS"], memory_budget)
                     with db_session:
                         to_start = select(generation for generation in Generation if generation.state == STATE_STARTED)
 
@@ -160,7 +317,8 @@ def autogen(config: dict):
                                 if sid:
                                     generation.delete()
                                 else:
-                                    launch_generator(generator_pool, generation, timeout=job_time)
+                                    generation.state = STATE_QUEUED  # scheduled again, ahead of new generations
+                                    scheduler.get_cost(generation)
 
                             commit()
                         select(generation for generation in Generation if generation.state == STATE_ERROR).delete()
@@ -171,8 +329,8 @@ def autogen(config: dict):
                             to_start = select(
                                 generation for generation in Generation
                                 if generation.state == STATE_QUEUED).for_update()
-                            for generation in to_start:
-                                launch_generator(generator_pool, generation, timeout=job_time)
+                            for generation in scheduler.pick(to_start):
+                                scheduler.start(generator_pool, generation, timeout=job_time)
         except AlreadyRunningException:
             logging.info("Autogen reports as already running, not starting another.")
 
@@ -187,8 +345,10 @@ class MultiworldInstance():
         self.cert = config["SELFLAUNCHCERT"]
         self.key = config["SELFLAUNCHKEY"]
         self.host = config["HOST_ADDRESS"]
+        self.log_queue = config["LOG_QUEUE"]
         self.rooms_to_start = multiprocessing.Queue()
         self.rooms_shutting_down = multiprocessing.Queue()
+        self.rooms_with_commands = multiprocessing.Queue()
         self.name = f"MultiHoster{id}"
 
     def start(self):
@@ -198,20 +358,28 @@ class MultiworldInstance():
         process = multiprocessing.Process(group=None, target=run_server_process,
                                           args=(self.name, self.ponyconfig, get_static_server_data(),
                                                 self.cert, self.key, self.host,
-                                                self.rooms_to_start, self.rooms_shutting_down),
+                                                self.rooms_to_start, self.rooms_shutting_down, self.log_queue,
+                                                self.rooms_with_commands),
                                           name=self.name)
         process.start()
         self.process = process
 
-    def start_room(self, room_id):
+    def is_hosting(self, room_id) -> bool:
         while not self.rooms_shutting_down.empty():
             self.room_ids.remove(self.rooms_shutting_down.get(block=True, timeout=None))
-        if room_id in self.room_ids:
+        return room_id in self.room_ids
+
+    def start_room(self, room_id):
+        if self.is_hosting(room_id):
             pass  # should already be hosted currently.
         else:
             self.room_ids.add(room_id)
             self.rooms_to_start.put(room_id)
 
+    def notify_commands(self, room_id):
+        """Lets the room know it may have new commands, instead of it having to look for them."""
+        self.rooms_with_commands.put(room_id)
+
     def stop(self):
         if self.process:
             self.process.terminate()
@@ -225,6 +393,6 @@ class MultiworldInstance():
         self.process = None
 
 
-from .models import Room, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, db, Seed, Slot
+from .models import Room, RoomWakeUp, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, db, Seed, Slot
 from .customserver import run_server_process, get_static_server_data
 from .generate import gen_game
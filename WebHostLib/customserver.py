@@ -13,19 +13,20 @@ import threading
 import time
 import typing
 import sys
+import weakref
 
 import websockets
-from pony.orm import commit, db_session, select
+from pony.orm import commit, db_session, delete, select
 
 import Utils
 
 from MultiServer import (
-    Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
-    server_per_message_deflate_factory,
+    Context, GameNames, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
+    server_per_message_deflate_factory, replay_save_journal, track_metrics,
 )
 from Utils import restricted_loads, cache_argsless
 from .locker import Locker
-from .models import Command, GameDataPackage, Room, db
+from .models import Command, GameDataPackage, Room, SaveJournalEntry, TrackerSlot, db
 
 
 class CustomClientMessageProcessor(ClientMessageProcessor):
@@ -60,8 +61,14 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+# (game, checksum, Archipelago checksum) -> name lookups, shared between the rooms of a hoster using them
+_shared_game_names: weakref.WeakValueDictionary[typing.Tuple[str, str, str], GameNames] = \
+    weakref.WeakValueDictionary()
+
+
 class WebHostContext(Context):
     room_id: int
+    metrics_log_interval: typing.ClassVar[float] = 600  # seconds between server metrics written to the room log
 
     def __init__(self, static_server_data: dict, logger: logging.Logger):
         # static server data is used during _load_game_data to load required data,
@@ -74,6 +81,11 @@ class WebHostContext(Context):
         self.main_loop = asyncio.get_running_loop()
         self.video = {}
         self.tags = ["AP", "WebHost"]
+        self.commands_event = threading.Event()  # set when the room may have new commands
+        self.tracker_version = 0
+        self.tracker_locations: typing.Dict[int, typing.List[int]] = {}  # sorted locations of each slot
+        # what was last published for each slot, to only publish slots that changed
+        self.tracker_fingerprints: typing.Dict[typing.Tuple[int, int], typing.Tuple[typing.Any, ...]] = {}
 
     def __del__(self):
         try:
@@ -93,6 +105,7 @@ class WebHostContext(Context):
         cmdprocessor = DBCommandProcessor(self)
 
         while not self.exit_event.is_set():
+            self.commands_event.clear()
             with db_session:
                 commands = select(command for command in Command if command.room.id == self.room_id)
                 if commands:
@@ -101,7 +114,8 @@ class WebHostContext(Context):
                         command.delete()
                     commit()
             del commands
-            time.sleep(5)
+            # woken up by the hoster when commands are added, instead of every room looking for them
+            self.commands_event.wait()
 
     @db_session
     def load(self, room_id: int):
@@ -114,6 +128,9 @@ class WebHostContext(Context):
 
         multidata = self.decompress(room.seed.multidata)
         game_data_packages = {}
+        self.tracker_locations = {slot: sorted(locations) for slot, locations in multidata["locations"].items()}
+        self.tracker_version = select(tracker_slot.version for tracker_slot in TrackerSlot
+                                      if tracker_slot.room == room).max() or 0
 
         static_gamespackage = self.gamespackage  # this is shared across all rooms
         static_item_name_groups = self.item_name_groups
@@ -150,26 +167,113 @@ class WebHostContext(Context):
             self.location_name_groups = static_location_name_groups
         return self._load(multidata, game_data_packages, True)
 
+    def _get_game_names(self, game_name: str, game_package: typing.Dict[str, typing.Any],
+                        archipelago_package: typing.Dict[str, typing.Any]) -> GameNames:
+        checksum = game_package.get("checksum", None)
+        archipelago_checksum = archipelago_package.get("checksum", None)
+        if not checksum or not archipelago_checksum:  # rolled on old AP, can't tell it apart from other versions
+            return super()._get_game_names(game_name, game_package, archipelago_package)
+        key = game_name, checksum, archipelago_checksum
+        names = _shared_game_names.get(key, None)
+        if names is None:
+            names = _shared_game_names[key] = super()._get_game_names(game_name, game_package, archipelago_package)
+        return names
+
     def init_save(self, enabled: bool = True):
         self.saving = enabled
         if self.saving:
             with db_session:
-                savegame_data = Room.get(id=self.room_id).multisave
+                room = Room.get(id=self.room_id)
+                savegame_data = room.multisave
                 if savegame_data:
-                    self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
+                    journal = [entry.data for entry in room.save_journal.order_by(SaveJournalEntry.id)]
+                    self.set_save(replay_save_journal(restricted_loads(savegame_data), journal))
             self._start_async_saving(atexit_save=False)
         threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
 
     @db_session
     def _save(self, exit_save: bool = False) -> bool:
         room = Room.get(id=self.room_id)
-        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-        room.multisave = pickle.dumps(self.get_save())
-        # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
-        if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
-            room.last_activity = datetime.datetime.utcnow()
+        journal = self.save_journal
+        start = time.perf_counter()
+        try:
+            full = exit_save or journal.needs_full_save()
+            size = 0
+            if full:
+                journal.start_full_save()
+                save = self.get_save()
+                journal.full_save_taken(save)
+                # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+                room.multisave = pickle.dumps(save)
+                journal.save_size = size = len(room.multisave)
+                delete(entry for entry in SaveJournalEntry if entry.room == room)
+            else:
+                records = journal.take_records(self.get_save)
+                if records:
+                    entry = journal.encode_entry(records)
+                    SaveJournalEntry(room=room, data=entry)
+                    size = len(entry)
+                    journal.entry_written(size)
+            # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
+            if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
+                room.last_activity = datetime.datetime.utcnow()
+            published = self.publish_tracker_slots(room)
+            commit()
+            self.tracker_fingerprints.update(published)
+        except Exception:
+            journal.generation = None  # changes may be lost, so the next save has to be a full save
+            raise
+        self.metrics.record_save(time.perf_counter() - start, size, full)
         return True
 
+    def publish_tracker_slots(self, room: Room) -> typing.Dict[typing.Tuple[int, int], typing.Tuple[typing.Any, ...]]:
+        """Writes what trackers show of each slot that changed since it was last published.
+        Returns the fingerprints of the written slots, to be remembered once they are committed."""
+        changed: typing.Dict[typing.Tuple[int, int], typing.Tuple[typing.Any, ...]] = {}
+        for team_slot in self.player_names:
+            hints = self.hints.get(team_slot, None)
+            fingerprint = (len(self.location_checks.get(team_slot, ())),
+                           len(self.received_items.get((*team_slot, True), ())),
+                           frozenset(hints) if hints else None,
+                           self.client_game_state.get(team_slot, 0),
+                           self.name_aliases.get(team_slot, None),
+                           self.client_activity_timers.get(team_slot, None),
+                           self.client_connection_timers.get(team_slot, None),
+                           self.video.get(team_slot, None))
+            if self.tracker_fingerprints.get(team_slot, None) != fingerprint:
+                changed[team_slot] = fingerprint
+        if not changed:
+            return changed
+        self.tracker_version += 1
+        existing = {(tracker_slot.team, tracker_slot.slot): tracker_slot for tracker_slot in room.tracker_slots}
+        for team_slot in changed:
+            team, slot = team_slot
+            locations = self.tracker_locations.get(slot, [])
+            checks = self.location_checks.get(team_slot, set())
+            checked = bytearray((len(locations) + 7) // 8)
+            for index, location in enumerate(locations):
+                if location in checks:
+                    checked[index >> 3] |= 1 << (index & 7)
+            activity = self.client_activity_timers.get(team_slot, None)
+            connection = self.client_connection_timers.get(team_slot, None)
+            data = pickle.dumps({
+                "checked": bytes(checked),
+                "received_items": self.received_items.get((team, slot, True), []),
+                "hints": self.hints.get(team_slot, set()),
+                "status": self.client_game_state.get(team_slot, 0),
+                "alias": self.name_aliases.get(team_slot, None),
+                "activity": activity.timestamp() if activity else None,
+                "connection": connection.timestamp() if connection else None,
+                "video": self.video.get(team_slot, None),
+            })
+            tracker_slot = existing.get(team_slot, None)
+            if tracker_slot:
+                tracker_slot.version = self.tracker_version
+                tracker_slot.data = data
+            else:
+                TrackerSlot(room=room, team=team, slot=slot, version=self.tracker_version, data=data)
+        return changed
+
     def get_save(self) -> dict:
         d = super(WebHostContext, self).get_save()
         d["video"] = [(tuple(playerslot), videodata) for playerslot, videodata in self.video.items()]
@@ -225,17 +329,18 @@ def set_up_logging(room_id) -> logging.Logger:
         encoding="utf-8-sig")
     file_handler.setFormatter(logging.Formatter("[%(asctime)s]: %(message)s"))
     logger.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
+    logger.addHandler(Utils.log_writer.wrap(file_handler) if Utils.log_writer else file_handler)
     return logger
 
 
 def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
-                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
+                       host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue,
+                       log_queue: int = 0, rooms_with_commands: typing.Optional[multiprocessing.Queue] = None):
     from setproctitle import setproctitle
 
     setproctitle(name)
-    Utils.init_logging(name)
+    Utils.init_logging(name, log_queue=log_queue)
     try:
         import resource
     except ModuleNotFoundError:
@@ -273,8 +378,11 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
 
     del ponyconfig
     gc.collect()  # free intermediate objects used during setup
+    # static server data is never freed, keep the collector from visiting it, and from touching its pages if forked
+    gc.freeze()
 
     loop = asyncio.get_event_loop()
+    contexts: typing.Dict[typing.Any, WebHostContext] = {}  # room id -> context of the running room
 
     async def start_room(room_id):
         with Locker(f"RoomLocker {room_id}"):
@@ -282,6 +390,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 logger = set_up_logging(room_id)
                 ctx = WebHostContext(static_server_data, logger)
                 ctx.load(room_id)
+                contexts[room_id] = ctx
                 ctx.init_save()
                 assert ctx.server is None
                 try:
@@ -320,7 +429,8 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 if ctx.saving:
                     setattr(asyncio.current_task(), "save", lambda: ctx._save(True))
                 assert ctx.shutdown_task is None
-                ctx.shutdown_task = asyncio.create_task(auto_shutdown(ctx, []))
+                metrics_task = asyncio.create_task(track_metrics(ctx, ctx.metrics_log_interval))
+                ctx.shutdown_task = asyncio.create_task(auto_shutdown(ctx, [metrics_task]))
                 await ctx.shutdown_task
 
             except (KeyboardInterrupt, SystemExit):
@@ -342,6 +452,8 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 try:
                     ctx.save_dirty = False  # make sure the saving thread does not write to DB after final wakeup
                     ctx.exit_event.set()  # make sure the saving thread stops at some point
+                    ctx.commands_event.set()  # and the command thread
+                    contexts.pop(room_id, None)
                     # NOTE: async saving should probably be an async task and could be merged with shutdown_task
                     with db_session:
                         # ensure the Room does not spin up again on its own, minute of safety buffer
@@ -375,9 +487,21 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
                 logging.info(f"Starting room {next_room} on {name}.")
                 del task  # delete reference to task object
 
+    class CommandNotifier(threading.Thread):
+        def run(self):
+            while 1:
+                room_id = rooms_with_commands.get(block=True, timeout=None)
+                ctx = contexts.get(room_id, None)
+                if ctx:
+                    ctx.commands_event.set()
+
     starter = Starter()
     starter.daemon = True
     starter.start()
+    if rooms_with_commands:
+        notifier = CommandNotifier()
+        notifier.daemon = True
+        notifier.start()
     try:
         loop.run_forever()
     finally:
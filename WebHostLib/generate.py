@@ -1,8 +1,11 @@
 import concurrent.futures
 import json
+import logging
 import os
 import random
 import tempfile
+import threading
+import time
 import zipfile
 from collections import Counter
 from pickle import PicklingError
@@ -12,13 +15,14 @@ from flask import flash, redirect, render_template, request, session, url_for
 from pony.orm import commit, db_session
 
 from BaseClasses import get_seed, seeddigits
+from Fill import fill_progress_listeners
 from Generate import PlandoOptions, handle_name, mystery_argparse
 from Main import main as ERmain
 from Utils import __version__, restricted_dumps, DaemonThreadPoolExecutor
 from WebHostLib import app
 from settings import ServerOptions, GeneratorOptions
 from .check import get_yaml_data, roll_options
-from .models import Generation, STATE_ERROR, STATE_QUEUED, Seed, UUID
+from .models import Generation, STATE_ERROR, STATE_QUEUED, STATE_STARTED, Seed, UUID
 from .upload import upload_zip_to_db
 
 
@@ -118,6 +122,38 @@ def start_generation(options: dict[str, dict | str], meta: dict[str, Any]):
         return redirect(url_for("view_seed", seed=seed_id))
 
 
+class ProgressWriter:
+    """
+    Writes fill progress of a queued generation into its meta, for the wait page to show.
+    Only progress of the thread that created it is written, as fill progress listeners are shared by every generation
+    in the process, including ones that timed out but keep running.
+    """
+    interval: float = 1.0
+    """minimum seconds between writes"""
+
+    def __init__(self, sid: UUID):
+        self.sid = sid
+        self.thread = threading.get_ident()
+        self.last_write = 0.0
+
+    def __call__(self, name: str, placed: int, total_items: int) -> None:
+        if threading.get_ident() != self.thread:
+            return
+        now = time.monotonic()
+        if now - self.last_write < self.interval and placed < total_items:
+            return
+        self.last_write = now
+        try:
+            with db_session:
+                gen = Generation.get(id=self.sid)
+                if gen is not None and gen.state == STATE_STARTED:
+                    meta = json.loads(gen.meta)
+                    meta["progress"] = f"Fill step {name} at {placed}/{total_items} items placed."
+                    gen.meta = json.dumps(meta)
+        except Exception as e:  # progress is only informational, don't fail the generation over it
+            logging.debug(f"Could not write progress of generation {self.sid}: {format_exception(e)}")
+
+
 def gen_game(gen_options: dict, meta: dict[str, Any] | None = None, owner=None, sid=None, timeout: int|None = None):
     if meta is None:
         meta = {}
@@ -169,7 +205,14 @@ def gen_game(gen_options: dict, meta: dict[str, Any] | None = None, owner=None,
             args.name[player] = handle_name(args.name[player], player, name_counter)
         if len(set(args.name.values())) != len(args.name):
             raise Exception(f"Names have to be unique. Names: {Counter(args.name.values())}")
-        ERmain(args, seed, baked_server_options=meta["server_options"])
+        progress_writer = ProgressWriter(sid) if sid else None
+        if progress_writer:
+            fill_progress_listeners.append(progress_writer)
+        try:
+            ERmain(args, seed, baked_server_options=meta["server_options"])
+        finally:
+            if progress_writer:
+                fill_progress_listeners.remove(progress_writer)
 
         return upload_to_db(target.name, sid, owner, race)
 
@@ -10,7 +10,7 @@ from werkzeug.utils import secure_filename
 from worlds.AutoWorld import AutoWorldRegister, World
 from . import app, cache
 from .markdown import render_markdown
-from .models import Seed, Room, Command, UUID, uuid4
+from .models import Seed, Room, RoomWakeUp, Command, UUID, uuid4
 from Utils import title_sorted
 
 
@@ -153,6 +153,7 @@ def new_room(seed: UUID):
     if not seed:
         abort(404)
     room = Room(seed=seed, owner=session["_id"], tracker=uuid4())
+    RoomWakeUp(room=room)
     commit()
     return redirect(url_for("host_room", room=room.id))
 
@@ -202,6 +203,7 @@ def host_room_command(room: UUID):
         cmd = request.form["cmd"]
         if cmd:
             Command(room=room, commandtext=cmd)
+            RoomWakeUp(room=room)  # lets the running room know it has a new command
             commit()
     return redirect(url_for("host_room", room=room.id))
 
@@ -220,7 +222,8 @@ def host_room(room: UUID):
     if now - room.last_activity > datetime.timedelta(minutes=1):
         # we only set last_activity if needed, otherwise parallel access on /room will cause an internal server error
         # due to "pony.orm.core.OptimisticCheckError: Object Room was updated outside of current transaction"
-        room.last_activity = now  # will trigger a spinup, if it's not already running
+        room.last_activity = now
+        RoomWakeUp(room=room)  # will trigger a spinup, if it's not already running
 
     browser_tokens = "Mozilla", "Chrome", "Safari"
     automated = ("update" in request.args
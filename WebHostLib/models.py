@@ -24,8 +24,11 @@ class Room(db.Entity):
     creation_time = Required(datetime, default=lambda: datetime.utcnow(), index=True)  # index used by landing page
     owner = Required(UUID, index=True)
     commands = Set('Command')
+    wake_ups = Set('RoomWakeUp')
     seed = Required('Seed', index=True)
     multisave = Optional(buffer, lazy=True)
+    save_journal = Set('SaveJournalEntry')
+    tracker_slots = Set('TrackerSlot')
     show_spoiler = Required(int, default=0)  # 0 -> never, 1 -> after completion, -> 2 always
     timeout = Required(int, default=lambda: 2 * 60 * 60)  # seconds since last activity to shutdown
     tracker = Optional(UUID, index=True)
@@ -50,6 +53,31 @@ class Command(db.Entity):
     commandtext = Required(str)
 
 
+class RoomWakeUp(db.Entity):
+    """Asks autohost to start the room if it is active and to pass on new commands if it is already running.
+    Queued when the room is created, visited or sent a command, so autohost does not have to look at every room."""
+    id = PrimaryKey(int, auto=True)
+    room = Required(Room, index=True)
+
+
+class SaveJournalEntry(db.Entity):
+    id = PrimaryKey(int, auto=True)
+    room = Required(Room, index=True)
+    data = Required(buffer, lazy=True)
+
+
+class TrackerSlot(db.Entity):
+    """What trackers show of a slot, published by the room whenever it saves with changes to it.
+    Versions count up across all slots of a room, so trackers can load just the slots changed since they last looked.
+    data is a pickled dict, in which checked locations are a bitset over the sorted locations of the slot."""
+    room = Required(Room)
+    team = Required(int)
+    slot = Required(int)
+    version = Required(int)
+    data = Required(buffer, lazy=True)
+    PrimaryKey(room, team, slot)
+
+
 class Generation(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
     owner = Required(UUID)
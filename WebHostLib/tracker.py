@@ -1,21 +1,29 @@
 import datetime
 import collections
+import functools
+import threading
 from dataclasses import dataclass
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, NamedTuple, Counter
 from uuid import UUID
 from email.utils import parsedate_to_datetime
 
 from flask import make_response, render_template, request, Request, Response
+from pony.orm import select
 from werkzeug.exceptions import abort
 
-from MultiServer import Context, get_saving_second
+from MultiServer import Context, UnknownNames, get_saving_second, replay_save_journal
 from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
 from Utils import restricted_loads, KeyedDefaultDict
 from . import app, cache
-from .models import GameDataPackage, Room
+from .models import GameDataPackage, Room, SaveJournalEntry, Seed, TrackerSlot
 
 # Multisave is currently updated, at most, every minute.
 TRACKER_CACHE_TIMEOUT_IN_SECONDS = 60
+# Decoded multidata and data packages never change, so they are kept for the seeds and games last tracked.
+# How much multidata is kept is set by app.config["TRACKER_MULTIDATA_CACHE_BYTES"].
+TRACKER_DATA_PACKAGE_CACHE_SIZE = 256
+# Slots published by rooms, decoded, for the rooms last tracked.
+TRACKER_ROOM_CACHE_SIZE = 64
 
 _multiworld_trackers: Dict[str, Callable] = {}
 _player_trackers: Dict[str, Callable] = {}
@@ -24,6 +32,97 @@ TeamPlayer = Tuple[int, int]
 ItemMetadata = Tuple[int, int, int]
 
 
+_seed_multidata: Dict[UUID, Tuple[int, Dict[str, Any]]] = {}
+"""seed id -> size of the uncompressed multidata and the decoded multidata, least recently tracked first"""
+_seed_multidata_lock = threading.Lock()
+
+
+def get_seed_multidata(seed_id: UUID) -> Dict[str, Any]:
+    """Retrieves the decoded multidata of a seed, shared between requests, so it must not be modified.
+    The multidata of the seeds last tracked is kept, up to TRACKER_MULTIDATA_CACHE_BYTES of it uncompressed."""
+    with _seed_multidata_lock:
+        cached = _seed_multidata.pop(seed_id, None)
+        if cached:
+            _seed_multidata[seed_id] = cached
+            return cached[1]
+    pickled = Context.decompress_pickle(Seed[seed_id].multidata)
+    size, multidata = len(pickled), restricted_loads(pickled)
+    del pickled
+    budget = app.config["TRACKER_MULTIDATA_CACHE_BYTES"]
+    with _seed_multidata_lock:
+        _seed_multidata.pop(seed_id, None)
+        used = sum(cached_size for cached_size, _ in _seed_multidata.values())
+        while _seed_multidata and used + size > budget:
+            used -= _seed_multidata.pop(next(iter(_seed_multidata)))[0]
+        if size <= budget:
+            _seed_multidata[seed_id] = size, multidata
+    return multidata
+
+
+class GameLookup(NamedTuple):
+    """Lookup tables of a data package, shared between requests, so they must not be modified."""
+    item_id_to_name: Dict[int, str]
+    location_id_to_name: Dict[int, str]
+    item_name_to_id: Dict[str, int]
+    location_name_to_id: Dict[str, int]
+
+
+@functools.lru_cache(maxsize=TRACKER_DATA_PACKAGE_CACHE_SIZE)
+def get_game_lookup(checksum: str) -> GameLookup:
+    """Retrieves the lookup tables of the data package with a checksum, shared between requests."""
+    game_package = restricted_loads(GameDataPackage.get(checksum=checksum).data)
+    # unknown ids are not stored, as the tables are shared between threads
+    return GameLookup(
+        UnknownNames("Unknown Item (ID: {})", {
+            id: name for name, id in game_package["item_name_to_id"].items()}),
+        UnknownNames("Unknown Location (ID: {})", {
+            id: name for name, id in game_package["location_name_to_id"].items()}),
+        game_package["item_name_to_id"],
+        game_package["location_name_to_id"],
+    )
+
+
+_tracker_slots: Dict[UUID, Tuple[int, Dict[TeamPlayer, Dict[str, Any]]]] = {}
+"""room id -> latest version loaded and the decoded slots, which are replaced rather than modified once stored"""
+
+
+def load_tracker_slots(room: Room) -> Optional[Dict[str, Any]]:
+    """Builds the sections of the multisave that trackers use from the slots published by the room.
+    Only slots published since the room was last loaded by this process are loaded and decoded again.
+    Returns None if the room did not publish any slots yet."""
+    version, slots = _tracker_slots.pop(room.id, (0, {}))
+    rows = select((tracker_slot.team, tracker_slot.slot, tracker_slot.version, tracker_slot.data)
+                  for tracker_slot in TrackerSlot if tracker_slot.room == room and tracker_slot.version > version)[:]
+    if rows:
+        slots = dict(slots)
+        locations = get_seed_multidata(room.seed.id)["locations"]
+        for team, slot, slot_version, data in rows:
+            slot_data = restricted_loads(data)
+            checked = slot_data["checked"]
+            slot_data["checked"] = {location for index, location in enumerate(sorted(locations.get(slot, ())))
+                                    if checked[index >> 3] >> (index & 7) & 1}
+            slots[team, slot] = slot_data
+            version = max(version, slot_version)
+    if not slots:
+        return None
+    while len(_tracker_slots) >= TRACKER_ROOM_CACHE_SIZE:
+        _tracker_slots.pop(next(iter(_tracker_slots)), None)
+    _tracker_slots[room.id] = version, slots
+
+    return {
+        "location_checks": {team_slot: data["checked"] for team_slot, data in slots.items()},
+        "received_items": {(*team_slot, True): data["received_items"] for team_slot, data in slots.items()},
+        "hints": {team_slot: data["hints"] for team_slot, data in slots.items()},
+        "client_game_state": {team_slot: data["status"] for team_slot, data in slots.items()},
+        "name_aliases": {team_slot: data["alias"] for team_slot, data in slots.items() if data["alias"]},
+        "client_activity_timers": [(team_slot, data["activity"]) for team_slot, data in slots.items()
+                                   if data["activity"] is not None],
+        "client_connection_timers": [(team_slot, data["connection"]) for team_slot, data in slots.items()
+                                     if data["connection"] is not None],
+        "video": [(team_slot, data["video"]) for team_slot, data in slots.items() if data["video"]],
+    }
+
+
 def _cache_results(func: Callable) -> Callable:
     """Stores the results of any computationally expensive methods after the initial call in TrackerData.
     If called again, returns the cached result instead, as results will not change for the lifetime of TrackerData.
@@ -46,6 +145,8 @@ class TrackerData:
 
     Provides helper methods to lazily load necessary data that each tracker require and caches any results so any
     subsequent helper method calls do not need to recompute results during the lifetime of this instance.
+    The multidata and data package lookups are shared between instances, as are the slots rooms publish for trackers,
+    which stand in for the multisave once the room published them.
     """
     room: Room
     _multidata: Dict[str, Any]
@@ -55,8 +156,13 @@ class TrackerData:
     def __init__(self, room: Room):
         """Initialize a new RoomMultidata object for the current room."""
         self.room = room
-        self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        self._multidata = get_seed_multidata(room.seed.id)
+        self._multisave = load_tracker_slots(room)
+        if self._multisave is None:  # room was not saved since it started publishing its slots
+            self._multisave = replay_save_journal(
+                restricted_loads(room.multisave),
+                [entry.data for entry in room.save_journal.order_by(SaveJournalEntry.id)]
+            ) if room.multisave else {}
         self._tracker_cache = {}
 
         self.item_name_to_id: Dict[str, Dict[str, int]] = {}
@@ -70,15 +176,13 @@ class TrackerData:
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Location (ID: {code})")
         })
         for game, game_package in self._multidata["datapackage"].items():
-            game_package = restricted_loads(GameDataPackage.get(checksum=game_package["checksum"]).data)
-            self.item_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
-                id: name for name, id in game_package["item_name_to_id"].items()})
-            self.location_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
-                id: name for name, id in game_package["location_name_to_id"].items()})
+            lookup = get_game_lookup(game_package["checksum"])
+            self.item_id_to_name[game] = lookup.item_id_to_name
+            self.location_id_to_name[game] = lookup.location_id_to_name
 
             # Normal lookup tables as well.
-            self.item_name_to_id[game] = game_package["item_name_to_id"]
-            self.location_name_to_id[game] = game_package["location_name_to_id"]
+            self.item_name_to_id[game] = lookup.item_name_to_id
+            self.location_name_to_id[game] = lookup.location_name_to_id
 
     def get_seed_name(self) -> str:
         """Retrieves the seed name."""
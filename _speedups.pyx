@@ -14,6 +14,7 @@ from cpython cimport PyObject
 from typing import Any, Dict, Iterable, Iterator, Generator, Sequence, Tuple, TypeVar, Union, Set, List, TYPE_CHECKING
 from cymem.cymem cimport Pool
 from libc.stdint cimport int64_t, uint32_t
+from libc.stdlib cimport qsort
 from collections import defaultdict
 
 cdef extern from *:
@@ -69,6 +70,25 @@ cdef struct IndexEntry:
     size_t count
 
 
+cdef struct ReceiverEntry:
+    # entries of the reverse index, sorted by receiver, item and then position in entries
+    ap_player_t receiver
+    ap_id_t item
+    size_t entry
+
+
+cdef int compare_receiver_entries(const void* a, const void* b) noexcept nogil:
+    cdef const ReceiverEntry* left = <const ReceiverEntry*>a
+    cdef const ReceiverEntry* right = <const ReceiverEntry*>b
+    if left.receiver != right.receiver:
+        return -1 if left.receiver < right.receiver else 1
+    if left.item != right.item:
+        return -1 if left.item < right.item else 1
+    if left.entry != right.entry:
+        return -1 if left.entry < right.entry else 1
+    return 0
+
+
 if TYPE_CHECKING:
     State = Dict[Tuple[int, int], Set[int]]
 else:
@@ -96,6 +116,10 @@ cdef class LocationStore:
     cdef list _items  # ~64KB/1000 players, speed up items (56 per tuple + 8 per list entry)
     cdef list _proxies  # ~92KB/1000 players, speed up self[player] (56 per struct + 28 per len + 8 per list entry)
     cdef PyObject** _raw_proxies  # 8K/1000 players, faster access to _proxies, but does not keep a ref
+    cdef ReceiverEntry* receiver_entries  # 2.4MB/100k items, built on first lookup by receiver
+    cdef IndexEntry* receiver_index  # 16KB/1000 players, ranges of receiver_entries
+    cdef size_t receiver_index_size  # 0 until the reverse index is built
+    cdef size_t max_receiver
 
     def get_size(self):
         from sys import getsizeof
@@ -106,6 +130,8 @@ cdef class LocationStore:
         size += sum(sizeof(item) for item in self._items)
         size += sum(sizeof(proxy) for proxy in self._proxies)
         size += sizeof(self._raw_proxies[0]) * self.sender_index_size
+        if self.receiver_index_size:
+            size += sizeof(ReceiverEntry) * self.entry_count + sizeof(IndexEntry) * self.receiver_index_size
         return size
 
     def __init__(self, locations_dict: Dict[int, Dict[int, Sequence[int]]]) -> None:
@@ -117,6 +143,7 @@ cdef class LocationStore:
 
         # iterate over everything to get all maxima and validate everything
         cdef size_t max_sender = INVALID_SIZE  # keep track of highest used player id for indexing
+        cdef size_t max_receiver = 0
         cdef size_t sender_count = 0
         cdef size_t count = 0
         for sender, locations in locations_dict.items():
@@ -131,6 +158,7 @@ cdef class LocationStore:
                 receiver = data[1]
                 if receiver < 1 or receiver > MAX_PLAYER_ID:
                     raise ValueError(f"Invalid player id {receiver} for item")
+                max_receiver = max(max_receiver, receiver)
                 count += 1
             sender_count += 1
 
@@ -187,6 +215,7 @@ cdef class LocationStore:
             self._raw_proxies[i] = <PyObject*>proxy
 
         self.sender_index_size = max_sender + 1
+        self.max_receiver = max_receiver
         self.entry_count = count
         self._len = sender_count
 
@@ -214,48 +243,85 @@ cdef class LocationStore:
     def items(self) -> Iterable[Tuple[int, PlayerLocationProxy]]:
         return self._items
 
+    cdef void _build_receiver_index(self):
+        # Sorting a copy of (receiver, item) lets hints and collects binary search for their results,
+        # instead of going through all entries. Only done once needed, since many rooms never hint or collect.
+        cdef size_t i
+        cdef ap_player_t receiver
+        self.receiver_index = <IndexEntry*>self._mem.alloc(self.max_receiver + 1, sizeof(IndexEntry))
+        if self.entry_count:
+            self.receiver_entries = <ReceiverEntry*>self._mem.alloc(self.entry_count, sizeof(ReceiverEntry))
+            for i in range(self.entry_count):
+                self.receiver_entries[i].receiver = self.entries[i].receiver
+                self.receiver_entries[i].item = self.entries[i].item
+                self.receiver_entries[i].entry = i
+            qsort(self.receiver_entries, self.entry_count, sizeof(ReceiverEntry), compare_receiver_entries)
+            for i in range(self.entry_count):
+                receiver = self.receiver_entries[i].receiver
+                if not self.receiver_index[receiver].count:
+                    self.receiver_index[receiver].start = i
+                self.receiver_index[receiver].count += 1
+        self.receiver_index_size = self.max_receiver + 1
+
+    cdef size_t _find_receiver_item(self, ap_player_t receiver, ap_id_t item) noexcept nogil:
+        # returns the first position of item for receiver in receiver_entries, or INVALID_SIZE
+        if receiver >= self.receiver_index_size:
+            return INVALID_SIZE
+        # binary search
+        cdef size_t l = self.receiver_index[receiver].start
+        cdef size_t e = l + self.receiver_index[receiver].count
+        cdef size_t r = e
+        cdef size_t m
+        while l < r:
+            m = (l + r) // 2
+            if self.receiver_entries[m].item < item:
+                l = m + 1
+            else:
+                r = m
+        if l < e and self.receiver_entries[l].item == item:
+            return l
+        return INVALID_SIZE
+
     # specialized accessors
     def find_item(self, slots: Set[int], seeked_item_id: int) -> Generator[Tuple[int, int, int, int, int], None, None]:
         cdef ap_id_t item = seeked_item_id
         cdef ap_player_t receiver
-        cdef ap_player_set* receivers
-        cdef size_t slot_count = len(slots)
-        if slot_count == 1:
-            # specialized implementation for single slot
-            receiver = list(slots)[0]
-            with nogil:
-                for entry in self.entries[:self.entry_count]:
-                    if entry.item == item and entry.receiver == receiver:
-                        with gil:
-                            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-        elif slot_count:
-            # generic implementation with lookup in set
-            receivers = ap_player_set_new(min(1023, slot_count))  # limit top level struct to 16KB
-            if not receivers:
-                raise MemoryError()
-            try:
-                for receiver in slots:
-                    if not ap_player_set_add(receivers, receiver):
-                        raise MemoryError()
-                with nogil:
-                    for entry in self.entries[:self.entry_count]:
-                        if entry.item == item and ap_player_set_contains(receivers, entry.receiver):
-                            with gil:
-                                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-            finally:
-                ap_player_set_free(receivers)
+        cdef size_t i
+        cdef LocationEntry* entry
+        if not self.receiver_index_size:
+            self._build_receiver_index()
+        for slot in slots:
+            if slot < 1 or slot > MAX_PLAYER_ID:
+                continue
+            receiver = slot
+            i = self._find_receiver_item(receiver, item)
+            if i == INVALID_SIZE:
+                continue
+            while i < self.entry_count and self.receiver_entries[i].receiver == receiver \
+                    and self.receiver_entries[i].item == item:
+                entry = self.entries + self.receiver_entries[i].entry
+                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
+                i += 1
 
     def get_for_player(self, slot: int) -> Dict[int, Set[int]]:
-        cdef ap_player_t receiver = slot
+        cdef ap_player_t receiver
+        cdef LocationEntry* entry
         all_locations: Dict[int, Set[int]] = {}
-        with nogil:
-            for entry in self.entries[:self.entry_count]:
-                if entry.receiver == receiver:
-                    with gil:
-                        sender: int = entry.sender
-                        if sender not in all_locations:
-                            all_locations[sender] = set()
-                        all_locations[sender].add(entry.location)
+        if slot < 1 or slot > MAX_PLAYER_ID:
+            return all_locations
+        receiver = slot
+        if not self.receiver_index_size:
+            self._build_receiver_index()
+        if receiver >= self.receiver_index_size:
+            return all_locations
+        cdef size_t start = self.receiver_index[receiver].start
+        cdef size_t count = self.receiver_index[receiver].count
+        for i in range(start, start + count):
+            entry = self.entries + self.receiver_entries[i].entry
+            sender: int = entry.sender
+            if sender not in all_locations:
+                all_locations[sender] = set()
+            all_locations[sender].add(entry.location)
         return all_locations
 
     def get_checked(self, state: State, team: int, slot: int) -> List[int]:
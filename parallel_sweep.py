@@ -0,0 +1,184 @@
+"""
+Finds the spheres of a filled multiworld with worker processes, each one testing the locations of a share of the
+players.
+
+The workers are forked, so they start out with the multiworld as it is, and only the locations found reachable are
+exchanged after each round, for every worker to collect their items into its own state. This gives the same spheres as
+MultiWorld.get_spheres and MultiWorld.get_sendable_spheres, which are used instead if only a single worker is requested
+or processes can not be forked on this platform.
+
+Forking only copies the thread that forks, along with any lock other threads held at that moment, so SphereWorkers
+should be started before any other threads are.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import traceback
+import typing
+
+from BaseClasses import CollectionState, Location, MultiWorld
+
+if typing.TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+LocationKey = typing.Tuple[int, str]
+
+
+def can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def get_spheres(multiworld: MultiWorld, workers: int) -> typing.Iterator[typing.Set[Location]]:
+    """Yields the same spheres as `multiworld.get_spheres()`, using up to `workers` processes."""
+    with SphereWorkers(multiworld, workers, sendable_only=False) as sphere_workers:
+        yield from sphere_workers.spheres()
+
+
+def get_sendable_spheres(multiworld: MultiWorld, workers: int) -> typing.Iterator[typing.Set[Location]]:
+    """Yields the same spheres as `multiworld.get_sendable_spheres()`, using up to `workers` processes."""
+    with SphereWorkers(multiworld, workers, sendable_only=True) as sphere_workers:
+        yield from sphere_workers.spheres()
+
+
+def _is_sendable(location: Location) -> bool:
+    return type(location.item.code) is int and type(location.address) is int
+
+
+def _split_players(multiworld: MultiWorld, workers: int) -> typing.List[typing.List[int]]:
+    """Splits the players into up to `workers` shares with about as many locations each."""
+    location_counts = {player: len(multiworld.get_locations(player)) for player in multiworld.player_ids}
+    shares: typing.List[typing.List[int]] = [[] for _ in range(min(workers, len(location_counts)))]
+    share_sizes = [0] * len(shares)
+    for player in sorted(location_counts, key=lambda player: (-location_counts[player], player)):
+        smallest = share_sizes.index(min(share_sizes))
+        shares[smallest].append(player)
+        share_sizes[smallest] += location_counts[player]
+    return shares
+
+
+class SphereWorkers:
+    """
+    Worker processes finding the spheres of a multiworld, which are forked on entering. Without more than one worker,
+    player or fork support, no processes are started and the multiworld finds its spheres itself.
+    """
+    multiworld: MultiWorld
+    sendable_only: bool
+    shares: typing.List[typing.List[int]]
+    """the players each worker tests the locations of"""
+    connections: typing.List[Connection]
+    processes: typing.List[multiprocessing.process.BaseProcess]
+
+    def __init__(self, multiworld: MultiWorld, workers: int, sendable_only: bool) -> None:
+        self.multiworld = multiworld
+        self.sendable_only = sendable_only
+        if workers < 2 or multiworld.players < 2 or not can_fork():
+            self.shares = []
+        else:
+            self.shares = _split_players(multiworld, workers)
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self) -> SphereWorkers:
+        if not self.shares:
+            return self
+        context = multiprocessing.get_context("fork")
+        logging.debug(f"Starting {len(self.shares)} sphere workers.")
+        for players in self.shares:
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_work, name="SphereWorker", daemon=True,
+                                      args=(worker_connection, self.multiworld, players, self.sendable_only))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass  # worker already gone
+            connection.close()
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+
+    def ask(self, command: str, collect: typing.Collection[LocationKey]) -> typing.Set[LocationKey]:
+        """
+        Has every worker collect the items at the `collect` locations and then run `command`, returning the union of
+        the locations they answered with.
+        """
+        for connection in self.connections:
+            connection.send((command, collect))
+        found: typing.Set[LocationKey] = set()
+        for connection in self.connections:
+            answer = connection.recv()
+            if isinstance(answer, str):
+                raise RuntimeError(f"Sphere worker failed:\n{answer}")
+            found.update(answer)
+        return found
+
+    def spheres(self) -> typing.Iterator[typing.Set[Location]]:
+        multiworld = self.multiworld
+        if not self.processes:
+            yield from multiworld.get_sendable_spheres() if self.sendable_only else multiworld.get_spheres()
+            return
+        remaining = sum(1 for location in multiworld.get_filled_locations()
+                        if not self.sendable_only or _is_sendable(location))
+        collect: typing.Set[LocationKey] = set()
+        while remaining:
+            if self.sendable_only:
+                # cull events out
+                while True:
+                    collect = self.ask("events", collect)
+                    if not collect:
+                        break
+            collect = self.ask("sphere", collect)
+            sphere = {multiworld.get_location(name, player) for player, name in collect}
+            yield sphere
+            if not sphere:
+                yield {multiworld.get_location(name, player)
+                       for player, name in self.ask("remaining", ())}  # unreachable locations
+                break
+            remaining -= len(sphere)
+
+
+def _work(connection: Connection, multiworld: MultiWorld, players: typing.List[int], sendable_only: bool) -> None:
+    try:
+        locations: typing.Set[Location] = set()
+        events: typing.Set[Location] = set()
+        for player in players:
+            for location in multiworld.get_filled_locations(player):
+                if not sendable_only or _is_sendable(location):
+                    locations.add(location)
+                else:
+                    events.add(location)
+        state = CollectionState(multiworld)
+
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            command, collect = message
+            for player, name in collect:
+                location = multiworld.get_location(name, player)
+                state.collect(location.item, True, location)
+
+            if command == "events":
+                found = {event for event in events if event.can_reach(state)}
+                events -= found
+            elif command == "sphere":
+                found = {location for location in locations if location.can_reach(state)}
+                locations -= found
+            elif command == "remaining":
+                found = locations
+            else:
+                raise ValueError(f"Unknown sphere worker command {command}")
+            connection.send([(location.player, location.name) for location in found])
+    except Exception:
+        connection.send(traceback.format_exc())
+    finally:
+        connection.close()
@@ -0,0 +1,276 @@
+"""
+Access rules built out of nodes instead of lambdas, for example `Has("Hookshot", player) & CanReachRegion("Castle",
+player)`.
+
+A rule is compiled into a flat function that reads the player's items directly instead of going through the methods of
+CollectionState, with the item checks of an And or Or merged into a single loop. `worlds.generic.Rules.set_rule` and
+`add_rule` store the compiled function, which keeps its rule as the `rule` attribute, so that rules added later are
+combined with it before compiling again instead of being wrapped in another lambda.
+"""
+from __future__ import annotations
+
+import abc
+import typing
+
+if typing.TYPE_CHECKING:
+    from BaseClasses import CollectionState
+
+Evaluator = typing.Callable[["CollectionState"], bool]
+
+
+class Rule(abc.ABC):
+    __slots__ = ("_compiled",)
+
+    def __call__(self, state: CollectionState) -> bool:
+        return self.compile()(state)
+
+    def __and__(self, other: Rule) -> Rule:
+        return And(self, other)
+
+    def __or__(self, other: Rule) -> Rule:
+        return Or(self, other)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(repr(getattr(self, name)) for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def compile(self) -> Evaluator:
+        """Returns a function evaluating this rule for a state, which carries this rule as its `rule` attribute."""
+        try:
+            return self._compiled
+        except AttributeError:
+            compiled = self._compile()
+            compiled.rule = self
+            self._compiled = compiled
+            return compiled
+
+    @abc.abstractmethod
+    def _compile(self) -> Evaluator:
+        ...
+
+
+class Has(Rule):
+    """The player has at least `count` of the item."""
+    __slots__ = ("item", "player", "count")
+
+    def __init__(self, item: str, player: int, count: int = 1) -> None:
+        self.item = item
+        self.player = player
+        self.count = count
+
+    def _compile(self) -> Evaluator:
+        return _compile_item_counts(self.player, {self.item: self.count}, True)
+
+
+class HasAll(Rule):
+    """The player has all of the items."""
+    __slots__ = ("items", "player")
+
+    def __init__(self, items: typing.Iterable[str], player: int) -> None:
+        self.items = tuple(items)
+        self.player = player
+
+    def _compile(self) -> Evaluator:
+        return _compile_item_counts(self.player, dict.fromkeys(self.items, 1), True)
+
+
+class HasAny(Rule):
+    """The player has at least one of the items."""
+    __slots__ = ("items", "player")
+
+    def __init__(self, items: typing.Iterable[str], player: int) -> None:
+        self.items = tuple(items)
+        self.player = player
+
+    def _compile(self) -> Evaluator:
+        return _compile_item_counts(self.player, dict.fromkeys(self.items, 1), False)
+
+
+class Count(Rule):
+    """The player has at least `count` items out of the items, like `CollectionState.has_from_list`."""
+    __slots__ = ("items", "player", "count")
+
+    def __init__(self, items: typing.Iterable[str], player: int, count: int) -> None:
+        self.items = tuple(items)
+        self.player = player
+        self.count = count
+
+    def _compile(self) -> Evaluator:
+        items, player, count = self.items, self.player, self.count
+
+        def has_from_list(state: CollectionState) -> bool:
+            player_prog_items = state.prog_items[player]
+            found = 0
+            for item in items:
+                found += player_prog_items.get(item, 0)
+                if found >= count:
+                    return True
+            return False
+        return has_from_list
+
+
+class CanReachRegion(Rule):
+    """The player can reach the region."""
+    __slots__ = ("region", "player")
+
+    def __init__(self, region: str, player: int) -> None:
+        self.region = region
+        self.player = player
+
+    def _compile(self) -> Evaluator:
+        region, player = self.region, self.player
+
+        def can_reach_region(state: CollectionState) -> bool:
+            return state.multiworld.get_region(region, player).can_reach(state)
+        return can_reach_region
+
+
+class CanReachLocation(Rule):
+    """The player can reach the location."""
+    __slots__ = ("location", "player")
+
+    def __init__(self, location: str, player: int) -> None:
+        self.location = location
+        self.player = player
+
+    def _compile(self) -> Evaluator:
+        location, player = self.location, self.player
+
+        def can_reach_location(state: CollectionState) -> bool:
+            return state.multiworld.get_location(location, player).can_reach(state)
+        return can_reach_location
+
+
+class And(Rule):
+    """All of the rules are fulfilled."""
+    __slots__ = ("rules",)
+
+    def __init__(self, *rules: Rule) -> None:
+        self.rules = tuple(_flatten(And, rules))
+
+    def _compile(self) -> Evaluator:
+        # a single check covers every item needed, at the highest count asked for
+        counts_per_player: typing.Dict[int, typing.Dict[str, int]] = {}
+        others: typing.List[Evaluator] = []
+        for rule in self.rules:
+            if type(rule) is Has:
+                counts = counts_per_player.setdefault(rule.player, {})
+                counts[rule.item] = max(counts.get(rule.item, rule.count), rule.count)
+            elif type(rule) is HasAll:
+                counts = counts_per_player.setdefault(rule.player, {})
+                for item in rule.items:
+                    counts[item] = max(counts.get(item, 1), 1)
+            else:
+                others.append(rule._compile())
+        evaluators = [_compile_item_counts(player, counts, True) for player, counts in counts_per_player.items()]
+        return _compile_all(evaluators + others)
+
+
+class Or(Rule):
+    """At least one of the rules is fulfilled."""
+    __slots__ = ("rules",)
+
+    def __init__(self, *rules: Rule) -> None:
+        self.rules = tuple(_flatten(Or, rules))
+
+    def _compile(self) -> Evaluator:
+        # a single check covers every item that would be enough, at the lowest count asked for
+        counts_per_player: typing.Dict[int, typing.Dict[str, int]] = {}
+        others: typing.List[Evaluator] = []
+        for rule in self.rules:
+            if type(rule) is Has:
+                counts = counts_per_player.setdefault(rule.player, {})
+                counts[rule.item] = min(counts.get(rule.item, rule.count), rule.count)
+            elif type(rule) is HasAny:
+                counts = counts_per_player.setdefault(rule.player, {})
+                for item in rule.items:
+                    counts[item] = 1
+            else:
+                others.append(rule._compile())
+        evaluators = [_compile_item_counts(player, counts, False) for player, counts in counts_per_player.items()]
+        return _compile_any(evaluators + others)
+
+
+def get_rule(access_rule: typing.Callable[[CollectionState], bool]) -> typing.Optional[Rule]:
+    """Returns the rule an access rule is, or was compiled from, or None for any other function."""
+    if isinstance(access_rule, Rule):
+        return access_rule
+    rule = getattr(access_rule, "rule", None)
+    return rule if isinstance(rule, Rule) else None
+
+
+def to_access_rule(rule: typing.Union[Rule, typing.Callable[[CollectionState], bool]]) -> \
+        typing.Callable[[CollectionState], bool]:
+    """Compiles rules to be assigned as access rule, returning any other function as is."""
+    return rule.compile() if isinstance(rule, Rule) else rule
+
+
+def _flatten(node_type: typing.Type[Rule], rules: typing.Iterable[Rule]) -> typing.Iterator[Rule]:
+    for rule in rules:
+        if type(rule) is node_type:
+            yield from rule.rules
+        else:
+            yield rule
+
+
+def _compile_item_counts(player: int, counts: typing.Dict[str, int], require_all: bool) -> Evaluator:
+    if len(counts) == 1:
+        (item, count), = counts.items()
+
+        def has(state: CollectionState) -> bool:
+            return state.prog_items[player].get(item, 0) >= count
+        return has
+
+    item_counts = tuple(counts.items())
+    if require_all:
+        def has_all_counts(state: CollectionState) -> bool:
+            player_prog_items = state.prog_items[player]
+            for item, count in item_counts:
+                if player_prog_items.get(item, 0) < count:
+                    return False
+            return True
+        return has_all_counts
+
+    def has_any_count(state: CollectionState) -> bool:
+        player_prog_items = state.prog_items[player]
+        for item, count in item_counts:
+            if player_prog_items.get(item, 0) >= count:
+                return True
+        return False
+    return has_any_count
+
+
+def _compile_all(evaluators: typing.List[Evaluator]) -> Evaluator:
+    if not evaluators:
+        return lambda state: True
+    if len(evaluators) == 1:
+        return evaluators[0]
+    if len(evaluators) == 2:
+        first, second = evaluators
+        return lambda state: first(state) and second(state)
+    evaluators = tuple(evaluators)
+
+    def all_of(state: CollectionState) -> bool:
+        for evaluator in evaluators:
+            if not evaluator(state):
+                return False
+        return True
+    return all_of
+
+
+def _compile_any(evaluators: typing.List[Evaluator]) -> Evaluator:
+    if not evaluators:
+        return lambda state: False
+    if len(evaluators) == 1:
+        return evaluators[0]
+    if len(evaluators) == 2:
+        first, second = evaluators
+        return lambda state: first(state) or second(state)
+    evaluators = tuple(evaluators)
+
+    def any_of(state: CollectionState) -> bool:
+        for evaluator in evaluators:
+            if evaluator(state):
+                return True
+        return False
+    return any_of
@@ -609,6 +609,21 @@ class ServerOptions(Group):
         OFF = 0
         ON = 1
 
+    class DataStorageQuota(int):
+        """
+        Bytes of data storage values each slot can have set, 0 for no limit
+        Values are measured in full on every Set while a limit is set, which slows down setting large values
+        """
+
+    class LogQueue(int):
+        """
+        Write logs on a background thread, holding up to this many records that are not written yet
+        0 -> write logs directly
+        """
+
+    class LogQueueBlock(Bool):
+        """Wait for the log queue to have room when it is full, instead of dropping records"""
+
     host: str | None = None
     port: int = 38281
     password: str | None = None
@@ -628,6 +643,9 @@ class ServerOptions(Group):
     auto_shutdown: AutoShutdown = AutoShutdown(0)
     compatibility: Compatibility = Compatibility(2)
     log_network: LogNetwork = LogNetwork(0)
+    data_storage_quota: DataStorageQuota = DataStorageQuota(0)
+    log_queue: LogQueue = LogQueue(0)
+    log_queue_block: LogQueueBlock | bool = False
 
 
 class GeneratorOptions(Group):
@@ -170,6 +170,7 @@ class WorldTestBase(unittest.TestCase):
                 self.assertEqual(loc_reachable, location.name not in locations,
                                  f"{location.name} is reachable without {all_items}" if loc_reachable
                                  else f"{location.name} is not reachable without {all_items}")
+        checkpoint = state.checkpoint()
         for item_names in possible_items:
             items = self.get_items_by_name(item_names)
             for item in items:
@@ -177,8 +178,7 @@ class WorldTestBase(unittest.TestCase):
             for location in locations:
                 self.assertTrue(state.can_reach(location, "Location", self.player),
                                 f"{location} not reachable with {item_names}")
-            for item in items:
-                state.remove(item)
+            state.rollback(checkpoint)
 
     def assertBeatable(self, beatable: bool):
         """Asserts that the game can be beaten with the current state"""
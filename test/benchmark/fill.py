@@ -0,0 +1,105 @@
+def run_fill_benchmark(freeze_gc: bool = True) -> None:
+    """
+    Run a benchmark of distribute_items_restrictive for multiworlds of increasing size, reporting how much of the fill
+    is spent searching for locations to place items at and how much is spent sweeping.
+
+    :param freeze_gc: Whether to freeze gc before benchmarking and unfreeze gc afterward.
+    """
+    import argparse
+    import collections
+    import gc
+    import logging
+    import time
+    import typing
+
+    from time_it import TimeIt
+
+    from BaseClasses import CollectionState, Location, MultiWorld
+    from Utils import init_logging
+    from worlds import AutoWorld
+    from worlds.AutoWorld import call_all
+    # imported after the worlds, as some of them import from Fill while loading
+    import Fill
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    class BenchmarkRunner:
+        games: typing.Tuple[str, ...] = (
+            "A Link to the Past",
+            "Hollow Knight",
+        )
+        player_counts: typing.Tuple[int, ...] = (1, 5, 20)
+        gen_steps: typing.Tuple[str, ...] = (
+            "generate_early",
+            "create_regions",
+            "create_items",
+            "set_rules",
+            "connect_entrances",
+            "generate_basic",
+            "pre_fill",
+        )
+
+        def __init__(self) -> None:
+            self.timings: collections.Counter[str] = collections.Counter()
+
+        def timed(self, name: str, function: typing.Callable[..., typing.Any]) -> typing.Callable[..., typing.Any]:
+            def wrapper(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.timings[name] += time.perf_counter() - start
+            return wrapper
+
+        def setup_multiworld(self, game: str, players: int) -> MultiWorld:
+            multiworld = MultiWorld(players)
+            multiworld.game = {player: game for player in multiworld.player_ids}
+            multiworld.player_name = {player: f"Tester{player}" for player in multiworld.player_ids}
+            multiworld.set_seed(0)
+            args = argparse.Namespace()
+            for name, option in AutoWorld.AutoWorldRegister.world_types[game].options_dataclass.type_hints.items():
+                setattr(args, name, {player: option.from_any(option.default) for player in multiworld.player_ids})
+            multiworld.set_options(args)
+            multiworld.state = CollectionState(multiworld)
+            for step in self.gen_steps:
+                call_all(multiworld, step)
+            return multiworld
+
+        def fill_test(self, game: str, players: int) -> None:
+            multiworld = self.setup_multiworld(game, players)
+            self.timings.clear()
+            if freeze_gc:
+                gc.freeze()
+            with TimeIt(f"{players} players of {game} distribute_items_restrictive", logger) as t:
+                Fill.distribute_items_restrictive(multiworld)
+            if freeze_gc:
+                gc.unfreeze()
+            logger.info(f"  {self.timings['sweep']:.4f} seconds sweeping, "
+                        f"{self.timings['search']:.4f} seconds searching locations, "
+                        f"{t.dif - self.timings['sweep'] - self.timings['search']:.4f} seconds elsewhere.")
+
+        def main(self) -> None:
+            can_fill = Location.can_fill
+            sweep_for_advancements = CollectionState.sweep_for_advancements
+            Location.can_fill = self.timed("search", can_fill)
+            CollectionState.sweep_for_advancements = self.timed("sweep", sweep_for_advancements)
+            try:
+                for game in self.games:
+                    for players in self.player_counts:
+                        try:
+                            self.fill_test(game, players)
+                        except Exception as e:
+                            logger.exception(e)
+            finally:
+                Location.can_fill = can_fill
+                CollectionState.sweep_for_advancements = sweep_for_advancements
+
+    runner = BenchmarkRunner()
+    runner.main()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_fill_benchmark()
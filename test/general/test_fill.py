@@ -343,6 +343,21 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertEqual(player2.locations[0].item, player1.prog_items[0])
         self.assertEqual(player2.locations[1].item, player1.prog_items[1])
 
+    def test_single_player_placement_fill(self):
+        """Test that single player placement keeps items in their own world and removes what was placed"""
+        multiworld = generate_test_multiworld(2)
+        player1 = generate_player_data(multiworld, 1, 3, 2)
+        player2 = generate_player_data(multiworld, 2, 2, 2)
+        locations = player2.locations + player1.locations
+        items = player1.prog_items + player2.prog_items
+
+        fill_restrictive(multiworld, multiworld.state, locations, items, single_player_placement=True)
+
+        self.assertEqual([], items)
+        self.assertEqual([player1.locations[2]], locations)
+        for location in player1.locations[:2] + player2.locations:
+            self.assertEqual(location.player, location.item.player)
+
     def test_restrictive_progress(self):
         """Test that various spheres with different requirements can be filled"""
         multiworld = generate_test_multiworld()
@@ -880,3 +895,51 @@ class TestBalanceMultiworldProgression(unittest.TestCase):
 
         self.assertRegionContains(
             self.player1.regions[2], self.player2.prog_items[0])
+
+
+class TestBalanceMultiworldProgressionFixedSeed(unittest.TestCase):
+    def setUp(self) -> None:
+        multiworld = generate_test_multiworld(3)
+        self.multiworld = multiworld
+        self.players = [generate_player_data(multiworld, player, prog_item_count=4, basic_item_count=56)
+                        for player in (1, 2, 3)]
+        for player in self.players:
+            multiworld.worlds[player.id].options.progression_balancing.value = 99
+            multiworld.completion_condition[player.id] = \
+                lambda state, player=player: state.has_all(names(player.prog_items), player.id)
+            # a chain of regions, each needing the progression item before it
+            region = player.generate_region(player.menu, 15)
+            for item in player.prog_items[:3]:
+                region = player.generate_region(region, 15, lambda state, item=item: state.has(item.name, item.player))
+
+        player1, player2, player3 = self.players
+        # most progression is late in player 1's world, so the other players wait on it for many spheres
+        layout = {
+            (player1, 1): [player1.prog_items[0]],
+            (player1, 2): [player2.prog_items[0], player1.prog_items[1]],
+            (player1, 3): [player3.prog_items[0], player1.prog_items[2]],
+            (player1, 4): [player2.prog_items[1], player1.prog_items[3]],
+            (player2, 2): [player3.prog_items[1], player2.prog_items[2]],
+            (player2, 3): [player3.prog_items[2], player2.prog_items[3]],
+            (player3, 3): [player3.prog_items[3]],
+        }
+        items = [item for player in self.players for item in player.basic_items]
+        for player in self.players:
+            for index, region in enumerate(player.regions[1:], start=1):
+                items = fill_region(multiworld, region, layout.get((player, index), []) + items)
+
+    def test_balancing_result(self) -> None:
+        """
+        Test that balancing over many spheres, which looks ahead repeatedly and swaps items in between, places the
+        progression items where balancing that found every sphere again from scratch placed them for this seed
+        """
+        balance_multiworld_progression(self.multiworld)
+
+        self.assertEqual([[item.location.name for item in player.prog_items] for player in self.players], [
+            ["player1_region1_location0", "player1_region2_location1", "player1_region3_location1",
+             "player1_region4_location1"],
+            ["player1_region1_location10", "player2_region2_location12", "player2_region2_location1",
+             "player2_region3_location1"],
+            ["player3_region1_location12", "player2_region2_location0", "player2_region3_location0",
+             "player3_region3_location0"],
+        ])
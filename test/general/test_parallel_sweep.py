@@ -0,0 +1,43 @@
+import unittest
+
+from Fill import distribute_items_restrictive
+from worlds.AutoWorld import AutoWorldRegister
+import parallel_sweep
+from . import setup_multiworld
+
+
+@unittest.skipUnless(parallel_sweep.can_fork(), "Processes can not be forked on this platform")
+class TestParallelSpheres(unittest.TestCase):
+    def setUp(self) -> None:
+        games = ("Hollow Knight", "ChecksFinder", "Meritous")
+        self.multiworld = setup_multiworld([AutoWorldRegister.world_types[game] for game in games], seed=0)
+        distribute_items_restrictive(self.multiworld)
+
+    def test_spheres(self) -> None:
+        """Tests that the worker processes find the same spheres as the multiworld itself."""
+        for workers in (2, 3, 8):
+            with self.subTest(workers=workers):
+                self.assertEqual(list(parallel_sweep.get_spheres(self.multiworld, workers)),
+                                 list(self.multiworld.get_spheres()))
+
+    def test_sendable_spheres(self) -> None:
+        """Tests that the worker processes find the same sendable spheres as the multiworld itself."""
+        for workers in (2, 3):
+            with self.subTest(workers=workers):
+                self.assertEqual(list(parallel_sweep.get_sendable_spheres(self.multiworld, workers)),
+                                 list(self.multiworld.get_sendable_spheres()))
+
+    def test_unreachable(self) -> None:
+        """Tests that unreachable locations end up in a last sphere after an empty one."""
+        location = next(iter(self.multiworld.get_filled_locations(2)))
+        location.access_rule = lambda state: False
+        spheres = list(parallel_sweep.get_spheres(self.multiworld, 2))
+        self.assertEqual(spheres[-2], set())
+        self.assertIn(location, spheres[-1])
+        self.assertEqual(spheres, list(self.multiworld.get_spheres()))
+
+    def test_single_worker(self) -> None:
+        """Tests that no processes are started for a single worker, with the multiworld finding its spheres itself."""
+        with parallel_sweep.SphereWorkers(self.multiworld, 1, sendable_only=True) as sphere_workers:
+            self.assertFalse(sphere_workers.processes)
+            self.assertEqual(list(sphere_workers.spheres()), list(self.multiworld.get_sendable_spheres()))
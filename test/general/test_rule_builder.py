@@ -0,0 +1,110 @@
+import random
+import unittest
+
+from BaseClasses import CollectionState, Item, ItemClassification, Location, LocationWaitList, Region
+from rule_builder import And, CanReachLocation, CanReachRegion, Count, Has, HasAll, HasAny, Or, get_rule
+from worlds.generic.Rules import add_rule, set_rule
+from . import generate_test_multiworld
+
+
+class TestRuleBuilder(unittest.TestCase):
+    items = ("Sword", "Shield", "Bow", "Arrows")
+
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.state = CollectionState(self.multiworld)
+
+    def test_rules_match_state(self) -> None:
+        """Ensure compiled rules agree with the CollectionState methods they stand in for."""
+        rng = random.Random(0)
+        for _ in range(50):
+            state = CollectionState(self.multiworld)
+            for player in (1, 2):
+                for item in self.items:
+                    count = rng.randrange(3)
+                    if count:
+                        state.add_item(item, player, count)
+            with self.subTest(items=dict(state.prog_items)):
+                checks = [
+                    (Has("Sword", 1), state.has("Sword", 1)),
+                    (Has("Bow", 2, 2), state.has("Bow", 2, 2)),
+                    (HasAll(("Sword", "Shield"), 1), state.has_all(("Sword", "Shield"), 1)),
+                    (HasAny(("Bow", "Arrows"), 2), state.has_any(("Bow", "Arrows"), 2)),
+                    (Count(self.items, 1, 4), state.has_from_list(self.items, 1, 4)),
+                    (Has("Sword", 1) & Has("Sword", 1, 2) & HasAll(("Bow", "Arrows"), 1),
+                     state.has("Sword", 1, 2) and state.has_all(("Bow", "Arrows"), 1)),
+                    (Has("Bow", 1, 2) | Has("Bow", 1) | HasAny(("Arrows",), 2) | Has("Shield", 2, 2),
+                     state.has("Bow", 1) or state.has("Arrows", 2) or state.has("Shield", 2, 2)),
+                    (Or(And(Has("Sword", 1), Has("Shield", 2)), Count(self.items, 2, 5)),
+                     state.has("Sword", 1) and state.has("Shield", 2) or state.has_from_list(self.items, 2, 5)),
+                ]
+                for rule, expected in checks:
+                    self.assertEqual(rule.compile()(state), expected, rule)
+                    self.assertEqual(rule(state), expected, rule)
+
+    def test_nested_rules_are_flattened(self) -> None:
+        """Ensure nested rules of the same kind end up in a single node."""
+        rule = Has("Sword", 1) & (Has("Shield", 1) & Has("Bow", 1))
+        self.assertEqual(len(rule.rules), 3)
+        rule = (Has("Sword", 1) | Has("Shield", 1)) | (Has("Bow", 1) & Has("Arrows", 1))
+        self.assertEqual(len(rule.rules), 3)
+
+    def test_add_rule_combines_rules(self) -> None:
+        """Ensure rules added to a rule are combined with it, instead of wrapping the compiled rule."""
+        location = Location(1, "Chest", None, self.menu)
+        set_rule(location, Has("Sword", 1))
+        add_rule(location, Has("Shield", 1))
+        add_rule(location, Has("Bow", 1), "or")
+        rule = get_rule(location.access_rule)
+        self.assertIsInstance(rule, Or)
+        self.assertIsInstance(rule.rules[1], And)
+
+        self.assertFalse(location.can_reach(self.state))
+        self.state.add_item("Sword", 1)
+        self.assertFalse(location.access_rule(self.state))
+        self.state.add_item("Shield", 1)
+        self.assertTrue(location.access_rule(self.state))
+        self.state.remove_item("Sword", 1)
+        self.state.add_item("Bow", 1)
+        self.assertTrue(location.access_rule(self.state))
+
+        add_rule(location, lambda state: state.has("Arrows", 1))
+        self.assertIsNone(get_rule(location.access_rule))
+        self.assertFalse(location.access_rule(self.state))
+
+    def test_can_reach_region(self) -> None:
+        """Ensure region rules follow the reachability of the region."""
+        castle = Region("Castle", 1, self.multiworld)
+        self.multiworld.regions.append(castle)
+        door = self.menu.connect(castle, rule=Has("Key", 1))
+        self.assertIsInstance(get_rule(door.access_rule), Has)
+        rule = CanReachRegion("Castle", 1).compile()
+        self.assertFalse(rule(self.state))
+        self.state.collect(Item("Key", ItemClassification.progression, None, 1), True)
+        self.assertTrue(rule(self.state))
+
+    def test_can_reach_location(self) -> None:
+        """Ensure location rules follow the access rule of the location."""
+        location = Location(1, "Chest", None, self.menu)
+        set_rule(location, Has("Key", 1))
+        self.menu.locations.append(location)
+        rule = CanReachLocation("Chest", 1).compile()
+        self.assertFalse(rule(self.state))
+        self.state.collect(Item("Key", ItemClassification.progression, None, 1), True)
+        self.assertTrue(rule(self.state))
+
+    def test_spheres_record_compiled_rules(self) -> None:
+        """Ensure finding spheres can tell which items a compiled rule looked up, rather than testing it every time."""
+        for name, item, rule in (("Sword Chest", "Sword", None),
+                                 ("Key Chest", "Key", Has("Sword", 1)),
+                                 ("Door", "Bow", HasAll(("Sword", "Key"), 1) | Has("Arrows", 1))):
+            location = Location(1, name, None, self.menu)
+            if rule:
+                set_rule(location, rule)
+            location.place_locked_item(Item(item, ItemClassification.progression, None, 1))
+            self.menu.locations.append(location)
+        self.multiworld.worlds[1].record_rule_dependencies = True
+        wait_list = LocationWaitList(self.state)
+        self.assertEqual([location.name for location in wait_list.test(self.menu.locations)], ["Sword Chest"])
+        self.assertFalse(self.state._opaque_locations)
@@ -1,7 +1,10 @@
 import unittest
+from collections import Counter
 
+from BaseClasses import CollectionState, Item, ItemClassification, Location, Region, _DependencyRecorder
+from Fill import distribute_items_restrictive
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from . import generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +30,264 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestStateCopy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        self.state = CollectionState(self.multiworld)
+        self.state.add_item("Sword", 1)
+        self.state.add_item("Shield", 2)
+
+    def test_copy_is_independent(self) -> None:
+        """Ensure changes to a copy or its original are not visible in the other one."""
+        copied = self.state.copy()
+        copied.add_item("Sword", 1)
+        self.state.add_item("Shield", 2)
+        copied.locations_checked.add("dummy")
+
+        self.assertEqual(self.state.count("Sword", 1), 1)
+        self.assertEqual(copied.count("Sword", 1), 2)
+        self.assertEqual(self.state.count("Shield", 2), 2)
+        self.assertEqual(copied.count("Shield", 2), 1)
+        self.assertFalse(self.state.locations_checked)
+
+    def test_copy_of_copy(self) -> None:
+        """Ensure chained copies keep the values of the state they were copied from."""
+        first = self.state.copy()
+        first.add_item("Sword", 1)
+        second = first.copy()
+        first.remove_item("Sword", 1)
+        self.assertEqual(second.count("Sword", 1), 2)
+        self.assertEqual(first.count("Sword", 1), 1)
+        self.assertEqual(second.prog_items, {1: Counter({"Sword": 2}), 2: Counter({"Shield": 1})})
+
+    def test_untouched_players_are_not_cloned(self) -> None:
+        """Ensure a copy only clones the data of players that are accessed."""
+        copied = self.state.copy()
+        copied.has("Sword", 1)
+        self.assertIsNot(copied.prog_items[1], self.state.prog_items[1])
+        self.assertNotIn(2, dict.keys(copied.prog_items))
+        self.assertIn(2, copied.prog_items)
+
+
+class TestStateRollback(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        menu = self.multiworld.get_region("Menu", 1)
+        self.locked_region = Region("Locked", 1, self.multiworld)
+        self.multiworld.regions.append(self.locked_region)
+        menu.connect(self.locked_region, rule=lambda state: state.has("Key", 1))
+        self.key = Item("Key", ItemClassification.progression, None, 1)
+        self.state = CollectionState(self.multiworld)
+
+    def test_rollback_restores_items_and_regions(self) -> None:
+        """Ensure rolling back undoes collected items together with the regions they made reachable."""
+        checkpoint = self.state.checkpoint()
+        self.state.collect(self.key, True)
+        self.assertTrue(self.locked_region.can_reach(self.state))
+
+        self.state.rollback(checkpoint)
+        self.assertFalse(self.state.has("Key", 1))
+        self.assertFalse(self.locked_region.can_reach(self.state))
+
+    def test_rollback_after_remove_keeps_reachable_regions(self) -> None:
+        """Ensure rolling back a removal restores the exact reachable regions without searching them again."""
+        self.state.collect(self.key, True)
+        self.assertTrue(self.locked_region.can_reach(self.state))
+        checkpoint = self.state.checkpoint()
+        self.state.remove(self.key)
+        self.assertFalse(self.locked_region.can_reach(self.state))
+
+        self.state.rollback(checkpoint)
+        self.assertFalse(self.state.stale[1])
+        self.assertIn(self.locked_region, self.state.reachable_regions[1])
+        self.assertTrue(self.state.has("Key", 1))
+
+    def test_checkpoint_is_reusable(self) -> None:
+        """Ensure the same checkpoint can be rolled back to more than once."""
+        checkpoint = self.state.checkpoint()
+        for _ in range(2):
+            self.state.collect(self.key, True)
+            self.state.rollback(checkpoint)
+            self.assertFalse(self.state.has("Key", 1))
+
+
+class TestRecordedIndirectConditions(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        self.multiworld.worlds[1].explicit_indirect_conditions = False
+        self.multiworld.worlds[1].record_rule_dependencies = True
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.state = CollectionState(self.multiworld)
+
+    def create_region(self, name: str) -> Region:
+        region = Region(name, 1, self.multiworld)
+        self.multiworld.regions.append(region)
+        return region
+
+    def test_indirect_condition_without_registration(self) -> None:
+        """Ensure an entrance checked before the region its rule depends on became reachable is retried."""
+        behind_door = self.create_region("Behind Door")
+        door = self.create_region("Door")
+        self.menu.connect(behind_door, rule=lambda state: state.can_reach_region("Door", 1))
+        self.menu.connect(door, rule=lambda state: state.has("Key", 1))
+
+        self.assertFalse(behind_door.can_reach(self.state))
+        self.state.collect(Item("Key", ItemClassification.progression, None, 1), True)
+        self.assertTrue(behind_door.can_reach(self.state))
+
+    def test_blocked_entrance_is_not_evaluated_again(self) -> None:
+        """Ensure a blocked entrance is only evaluated again once something its rule looked up changed."""
+        evaluations: list[bool] = []
+
+        def rule(state: CollectionState) -> bool:
+            evaluations.append(state.has("Key", 1))
+            return evaluations[-1]
+
+        locked = self.create_region("Locked")
+        self.menu.connect(locked, rule=rule)
+        self.assertFalse(locked.can_reach(self.state))
+        self.assertEqual(len(evaluations), 1)
+
+        self.state.collect(Item("Sword", ItemClassification.progression, None, 1), True)
+        self.assertFalse(locked.can_reach(self.state))
+        self.assertEqual(len(evaluations), 1)
+
+        copied = self.state.copy()
+        copied.collect(Item("Key", ItemClassification.progression, None, 1), True)
+        self.assertTrue(locked.can_reach(copied))
+        self.assertEqual(evaluations, [False, True])
+
+    def test_placed_items_are_tracked(self) -> None:
+        """Ensure a rule looking at the item placed at a location is evaluated again once that item changes."""
+        chest = Location(1, "Chest", None, self.menu)
+        self.menu.locations.append(chest)
+        locked = self.create_region("Locked")
+        self.menu.connect(locked, rule=lambda state: state.multiworld.get_location("Chest", 1).item is not None)
+        self.assertFalse(locked.can_reach(self.state))
+
+        chest.place_locked_item(Item("Key", ItemClassification.progression, None, 1))
+        self.state.collect(Item("Sword", ItemClassification.progression, None, 1), True)
+        self.assertTrue(locked.can_reach(self.state))
+
+    def test_opaque_rule_is_evaluated_again(self) -> None:
+        """Ensure a rule looking at something that is not recorded is evaluated again on every update."""
+        evaluations: list[bool] = []
+
+        def rule(state: CollectionState) -> bool:
+            evaluations.append(len(state.reachable_regions[1]) > 1)
+            return evaluations[-1]
+
+        self.menu.connect(self.create_region("Locked"), rule=rule)
+        self.state.update_reachable_regions(1)
+        self.state.collect(Item("Sword", ItemClassification.progression, None, 1), True)
+        self.state.update_reachable_regions(1)
+        self.assertEqual(len(evaluations), 2)
+
+    def test_opt_in(self) -> None:
+        """Ensure blocked entrances of worlds that don't record rule dependencies are evaluated again on every update."""
+        self.multiworld.worlds[1].record_rule_dependencies = False
+        evaluations: list[bool] = []
+
+        def rule(state: CollectionState) -> bool:
+            evaluations.append(state.has("Key", 1))
+            return evaluations[-1]
+
+        self.menu.connect(self.create_region("Locked"), rule=rule)
+        self.state.update_reachable_regions(1)
+        self.state.collect(Item("Sword", ItemClassification.progression, None, 1), True)
+        self.state.update_reachable_regions(1)
+        self.assertEqual(len(evaluations), 2)
+        self.assertFalse(self.state._entrance_dependencies)
+
+
+class TestRecordedRuleDependencies(unittest.TestCase):
+    def test_recorder_matches_state(self) -> None:
+        """
+        Tests that every world's access rules give the same results when evaluated through the dependency recorder as
+        with the state itself, and that recording rule dependencies does not change the spheres.
+        """
+        for game_name, world_type in AutoWorldRegister.world_types.items():
+            with self.subTest(game=game_name):
+                multiworld = setup_solo_multiworld(world_type)
+                world = multiworld.worlds[1]
+                # The world may override these as properties that cannot be set, so try modifying them.
+                try:
+                    world.explicit_indirect_conditions = False
+                    world.record_rule_dependencies = False
+                except Exception:
+                    continue
+                distribute_items_restrictive(multiworld)
+                call_all(multiworld, "post_fill")
+                spheres = list(multiworld.get_spheres())
+
+                state = CollectionState(multiworld)
+                recorder = _DependencyRecorder(state)
+                spots = [*multiworld.get_locations(), *multiworld.get_entrances()]
+                for sphere in spheres:
+                    if not sphere:
+                        break
+                    recorder.refresh()
+                    for spot in spots:
+                        self.assertEqual(recorder.evaluate(spot), spot.can_reach(state),
+                                         f"{spot} with seed {multiworld.seed}")
+                    for location in sphere:
+                        state.collect(location.item, True, location)
+
+                world.record_rule_dependencies = True
+                self.assertEqual(list(multiworld.get_spheres()), spheres, f"seed {multiworld.seed}")
+
+
+class TestSphereWaitList(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld(2)
+        for world in self.multiworld.worlds.values():
+            world.record_rule_dependencies = True
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.evaluations: list[bool] = []
+
+        def door_rule(state: CollectionState) -> bool:
+            self.evaluations.append(state.has("Key", 1))
+            return self.evaluations[-1]
+
+        self.create_location("Sword Chest", "Sword")
+        self.create_location("Key Chest", "Key", lambda state: state.has("Sword", 1))
+        self.create_location("Door", "Bow", door_rule)
+        self.create_location("Sealed", "Arrows", lambda state: state.has("Nothing", 1))
+
+    def create_location(self, name: str, item: str, rule=None, item_player: int = 1) -> Location:
+        location = Location(1, name, None, self.menu)
+        if rule:
+            location.access_rule = rule
+        location.place_locked_item(Item(item, ItemClassification.progression, None, item_player))
+        self.menu.locations.append(location)
+        return location
+
+    def test_spheres(self) -> None:
+        """Ensure spheres are unchanged by waiting, including the unreachable locations at the end."""
+        spheres = [{location.name for location in sphere} for sphere in self.multiworld.get_spheres()]
+        self.assertEqual(spheres, [{"Sword Chest"}, {"Key Chest"}, {"Door"}, set(), {"Sealed"}])
+        self.assertEqual(self.evaluations, [False, True])
+
+    def test_opt_in(self) -> None:
+        """Ensure locations of worlds that don't record rule dependencies are tested again after every sphere."""
+        self.multiworld.worlds[1].record_rule_dependencies = False
+        spheres = [{location.name for location in sphere} for sphere in self.multiworld.get_spheres()]
+        self.assertEqual(spheres, [{"Sword Chest"}, {"Key Chest"}, {"Door"}, set(), {"Sealed"}])
+        self.assertEqual(self.evaluations, [False, False, True])
+
+    def test_region_of_other_player(self) -> None:
+        """Ensure a location waiting on a region of another player is woken once that region became reachable."""
+        tower = Region("Tower", 2, self.multiworld)
+        self.multiworld.regions.append(tower)
+        self.multiworld.get_region("Menu", 2).connect(tower, rule=lambda state: state.has("Tower Key", 2))
+        self.create_location("Tower Key Chest", "Tower Key", lambda state: state.has("Bow", 1), item_player=2)
+        self.create_location("Lookout", "Map", lambda state: state.can_reach_region("Tower", 2))
+
+        spheres = [{location.name for location in sphere} for sphere in self.multiworld.get_spheres()]
+        self.assertEqual(spheres, [{"Sword Chest"}, {"Key Chest"}, {"Door"}, {"Tower Key Chest"}, {"Lookout"},
+                                   set(), {"Sealed"}])
+        state = CollectionState(self.multiworld)
+        state.sweep_for_advancements()
+        self.assertTrue(state.has("Map", 1))
@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from NetUtils import (Hint, HintStatus, NetworkItem, NetworkPlayer, NetworkSlot, SlotType, decode, encode,
+                      cached_fragment_encoder, encode_fragment)
+
+
+class TestEncode(unittest.TestCase):
+    items = [NetworkItem(1, 2, 3, 4), NetworkItem(5, 6, 7, HintStatus.HINT_FOUND)]
+    players = [NetworkPlayer(0, 1, "Alias \"1\"\n", "Plüyer1"), NetworkPlayer(1, 2, "P2", "P2")]
+
+    def test_sequences_match_generic_encoding(self) -> None:
+        """Ensure sequences encoded without building dicts give the same JSON as the generic encoder."""
+        msgs = [
+            {"cmd": "ReceivedItems", "index": 0, "items": self.items},
+            {"cmd": "RoomUpdate", "players": tuple(self.players), "hint": Hint(1, 2, 3, 4, False)},
+            {"cmd": "Mixed", "items": [NetworkItem(1, 2, 3), Hint(1, 2, 3, 4, False)],
+             "other": [NetworkItem(1, 2, None)]},
+        ]
+        expected = [
+            {"cmd": "ReceivedItems", "index": 0, "items": [
+                {"item": 1, "location": 2, "player": 3, "flags": 4, "class": "NetworkItem"},
+                {"item": 5, "location": 6, "player": 7, "flags": 40, "class": "NetworkItem"}]},
+            {"cmd": "RoomUpdate", "players": [
+                {"team": 0, "slot": 1, "alias": "Alias \"1\"\n", "name": "Plüyer1", "class": "NetworkPlayer"},
+                {"team": 1, "slot": 2, "alias": "P2", "name": "P2", "class": "NetworkPlayer"}],
+             "hint": dict(Hint(1, 2, 3, 4, False)._asdict(), **{"class": "Hint"})},
+            {"cmd": "Mixed", "items": [
+                {"item": 1, "location": 2, "player": 3, "flags": 0, "class": "NetworkItem"},
+                dict(Hint(1, 2, 3, 4, False)._asdict(), **{"class": "Hint"})],
+             "other": [{"item": 1, "location": 2, "player": None, "flags": 0, "class": "NetworkItem"}]},
+        ]
+        self.assertEqual(json.loads(encode(msgs)), expected)
+        self.assertEqual(decode(encode(msgs))[0]["items"], self.items)
+
+    def test_encoded_fragments_are_spliced(self) -> None:
+        """Ensure pre-encoded parts of a message end up in it the same way as the values they were encoded from."""
+        slot_info = {1: NetworkSlot("P1", "Game", SlotType.player), 2: NetworkSlot("G", "Game", SlotType.group, [1])}
+        msg = {"cmd": "Connected", "players": self.players, "missing_locations": [1, 2, 3], "slot_info": slot_info}
+        encode_cached = cached_fragment_encoder()
+        spliced = dict(msg, players=encode_cached(tuple(self.players)),
+                       missing_locations=encode_cached((1, 2, 3)), slot_info=encode_fragment(slot_info))
+        self.assertEqual(encode([spliced]), encode([msg]))
+        self.assertIs(encode_cached((1, 2, 3)), spliced["missing_locations"])
+        self.assertIsNot(cached_fragment_encoder()((1, 2, 3)), spliced["missing_locations"])
@@ -117,6 +117,24 @@ class Base:
             self.assertEqual(self.store.get_for_player(1), {1: {13}, 2: {22, 23}})
             self.assertEqual(self.store.get_for_player(9999), {})
 
+        def test_reverse_lookups_match_scan(self) -> None:
+            """Ensure find_item and get_for_player find the same locations as going through all of them."""
+            for receiver in range(7):
+                expected: typing.Dict[int, typing.Set[int]] = {}
+                for sender, locations in sample_data.items():
+                    for location, (item, item_receiver, flags) in locations.items():
+                        if item_receiver == receiver:
+                            expected.setdefault(sender, set()).add(location)
+                            self.assertIn((sender, location, item, receiver, flags),
+                                          list(self.store.find_item({receiver}, item)))
+                self.assertEqual(self.store.get_for_player(receiver), expected)
+
+        def test_get_for_player_is_a_copy(self) -> None:
+            """Ensure changing the result of get_for_player does not change later results."""
+            self.store.get_for_player(1)[2].add(99)
+            self.store.get_for_player(1).pop(1)
+            self.assertEqual(self.store.get_for_player(1), {1: {13}, 2: {22, 23}})
+
         def test_get_checked(self) -> None:
             self.assertEqual(self.store.get_checked(full_state, 0, 1), [11, 12, 13])
             self.assertEqual(self.store.get_checked(one_state, 0, 1), [12])
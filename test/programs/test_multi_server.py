@@ -1,5 +1,21 @@
+import asyncio
+import json
+import os
+import tempfile
+import typing
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+import unittest.mock
+import zlib
+
+from typing_extensions import override
+
+from MultiServer import (Client, Context, GameNames, ServerCommandProcessor, process_client_cmd, read_journal_file,
+                         replay_save_journal, send_items_to, send_new_items)
+from NetUtils import ClientStatus, Endpoint, Hint, NetworkItem, encode
+from Utils import restricted_loads
+
+if typing.TYPE_CHECKING:
+    from websockets import WebSocketServerProtocol
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +54,333 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class SaveContext(Context):
+    @override
+    def _load_game_data(self) -> None:
+        pass  # not needed for saving, and the game data can only be loaded once
+
+    def save_now(self, exit_save: bool = False) -> bool:
+        return self._save(exit_save)
+
+
+class TestGameNames(unittest.TestCase):
+    archipelago = {"item_name_to_id": {"Nothing": -1}, "location_name_to_id": {"Cheat Console": -1}}
+    game = {"item_name_to_id": {"Sword": 1}, "location_name_to_id": {"Chest": 2}}
+
+    def test_names(self) -> None:
+        """Ensure a game's names include Archipelago's ids and its groups."""
+        names = GameNames(self.game, self.archipelago, {"Weapons": {"Sword"}}, {})
+        self.assertEqual(names.item_names, {1: "Sword", -1: "Nothing"})
+        self.assertEqual(names.location_names, {2: "Chest", -1: "Cheat Console"})
+        self.assertEqual(names.all_item_and_group_names, {"Sword", "Weapons"})
+        self.assertEqual(names.all_location_and_group_names, {"Chest"})
+        self.assertEqual(GameNames(self.archipelago, None, {}, {}).item_names, {-1: "Nothing"})
+
+    def test_unknown_ids_are_not_stored(self) -> None:
+        """Ensure looking up unknown ids leaves the names unchanged, so they can be shared between contexts."""
+        names = GameNames(self.game, self.archipelago, {}, {})
+        self.assertEqual(names.item_names[3], "Unknown item (ID:3)")
+        self.assertEqual(names.location_names[3], "Unknown location (ID:3)")
+        self.assertNotIn(3, names.item_names)
+        self.assertNotIn(3, names.location_names)
+
+
+class TestSaveJournal(unittest.TestCase):
+    @override
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.save_filename = self.ctx.save_filename = os.path.join(self.directory.name, "test.apsave")
+        self.ctx.connect_names = {"Player1": (0, 1), "Player2": (0, 2)}
+
+    @override
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def load(self) -> typing.Dict[str, typing.Any]:
+        with open(self.save_filename, "rb") as f:
+            save: typing.Dict[str, typing.Any] = restricted_loads(zlib.decompress(f.read()))
+        save = replay_save_journal(save, read_journal_file(self.ctx.journal_filename))
+        del save["journal_generation"]
+        return save
+
+    def change(self) -> None:
+        ctx = self.ctx
+        send_items_to(ctx, 0, 2, NetworkItem(100, 1000, 1))
+        ctx.location_checks[0, 1] |= {1000}
+        ctx.save_journal.add("location_checks", (0, 1), {1000})
+        ctx.hints[0, 1].add(Hint(2, 1, 1001, 101, False))
+        ctx.save_journal.touch("hints", (0, 1))
+        ctx.stored_data["key"] = [len(ctx.stored_data)]
+        ctx.save_journal.touch("stored_data", "key")
+        ctx.data_storage_quota = 1000
+        ctx.charge_data_storage(0, 1, "key", ctx.stored_data["key"])
+        ctx.client_game_state[0, 2] = ClientStatus.CLIENT_PLAYING
+
+    def test_journal_replays_changes(self) -> None:
+        """Ensure a full save with its journal replayed matches the save of the context."""
+        self.assertTrue(self.ctx.save_now())
+        with open(self.save_filename, "rb") as f:
+            full_save = f.read()
+        for _ in range(3):
+            self.change()
+            self.assertTrue(self.ctx.save_now())
+            self.assertEqual(self.load(), self.ctx.get_save())
+        with open(self.save_filename, "rb") as f:
+            self.assertEqual(f.read(), full_save, "journaled saves should not rewrite the full save")
+        self.assertEqual(len(read_journal_file(self.ctx.journal_filename)), 3)
+
+    def test_full_save_empties_journal(self) -> None:
+        """Ensure a full save replaces the journal, and entries of an earlier full save are skipped."""
+        self.assertTrue(self.ctx.save_now())
+        self.change()
+        self.assertTrue(self.ctx.save_now())
+        with open(self.ctx.journal_filename, "rb") as f:
+            stale_journal = f.read()
+        self.assertTrue(self.ctx.save_now(exit_save=True))
+        self.assertEqual(read_journal_file(self.ctx.journal_filename), [])
+        with open(self.ctx.journal_filename, "wb") as f:
+            f.write(stale_journal)
+        self.ctx.hints.clear()
+        self.assertNotEqual(self.load(), self.ctx.get_save())
+
+    def test_change_while_saving_is_kept(self) -> None:
+        """Ensure a change made while a journaled save is being taken is journaled by the next save."""
+        self.assertTrue(self.ctx.save_now())
+        get_save = self.ctx.get_save
+
+        def change_while_saving() -> typing.Dict[str, typing.Any]:
+            save = get_save()
+            self.ctx.hints[0, 1] = {Hint(2, 1, 1002, 102, False)}
+            self.ctx.save_journal.touch("hints", (0, 1))
+            return save
+
+        with unittest.mock.patch.object(self.ctx, "get_save", change_while_saving):
+            self.assertTrue(self.ctx.save_now())
+        self.assertTrue(self.ctx.save_now())
+        self.assertEqual(self.load(), self.ctx.get_save())
+
+    def test_cut_off_entry_is_ignored(self) -> None:
+        """Ensure an entry cut short by an interrupted write does not keep the save from loading."""
+        self.assertTrue(self.ctx.save_now())
+        self.change()
+        self.assertTrue(self.ctx.save_now())
+        expected = self.ctx.get_save()
+        with open(self.ctx.journal_filename, "ab") as f:
+            f.write(b"\xff\xff\x00\x00partial")
+        self.assertEqual(self.load(), expected)
+
+
+class TestHintRecheck(unittest.TestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.first = Hint(2, 1, 1001, 101, False)
+        self.second = Hint(1, 1, 1002, 102, False)
+        self.ctx.hints[0, 1] = {self.first, self.second}
+        self.ctx.hints[0, 2] = {self.first}
+        self.ctx.index_hints()
+
+    def test_recheck_locations(self) -> None:
+        """Ensure rechecking locations only updates the hints for those locations, in every slot that has them."""
+        self.ctx.location_checks[0, 1] |= {1001, 1002}
+        changed: typing.Set[typing.Tuple[int, int]] = set()
+        self.ctx.recheck_hints(0, 1, changed, {1001})
+        found = self.ctx.get_hint(0, 1, 1001)
+        assert found is not None
+        self.assertTrue(found.found)
+        self.assertEqual(self.ctx.hints[0, 1], {found, self.second})
+        self.assertEqual(self.ctx.hints[0, 2], {found})
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+
+        changed.clear()
+        self.ctx.recheck_hints(0, 1, changed, {1001, 1003})
+        self.assertFalse(changed)
+        self.assertIs(self.ctx.get_hint(0, 1, 1002), self.second)
+        self.assertIsNone(self.ctx.get_hint(0, 2, 1001))
+
+
+class OpenSocket:
+    open = True
+
+
+def open_socket() -> "WebSocketServerProtocol":
+    return typing.cast("WebSocketServerProtocol", OpenSocket())
+
+
+class TestItemDelivery(unittest.TestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.sent: typing.List[typing.Tuple[typing.List[Client], typing.List[typing.Dict[str, typing.Any]]]] = []
+
+        def broadcast(endpoints: typing.Iterable[Client], msgs: typing.List[typing.Dict[str, typing.Any]]) -> None:
+            self.sent.append((list(endpoints), msgs))
+
+        self.ctx.broadcast = broadcast
+        self.clients = [Client(open_socket(), self.ctx) for _ in range(4)]
+        self.clients[2].remote_items = True
+        self.clients[3].no_items = True
+        self.ctx.clients = {0: {1: self.clients[:3], 2: self.clients[3:]}}
+
+    def test_only_queued_slots_are_sent(self) -> None:
+        """Ensure items are sent to the clients of the slots they were sent to, once per group of clients."""
+        send_items_to(self.ctx, 0, 1, NetworkItem(100, 1000, 2), NetworkItem(101, 1001, 1))
+        send_new_items(self.ctx)
+        self.assertEqual(len(self.sent), 2)
+        (local_clients, local_msgs), (remote_clients, remote_msgs) = \
+            sorted(self.sent, key=lambda sent: len(sent[0]), reverse=True)
+        self.assertEqual(local_clients, self.clients[:2])
+        self.assertEqual(local_msgs[0]["items"], [NetworkItem(100, 1000, 2)])
+        self.assertEqual(remote_clients, self.clients[2:3])
+        self.assertEqual(len(remote_msgs[0]["items"]), 2)
+        self.assertEqual([client.send_index for client in self.clients], [1, 1, 2, 0])
+
+        self.sent.clear()
+        send_new_items(self.ctx)
+        send_items_to(self.ctx, 0, 2, NetworkItem(100, 1000, 1))
+        send_new_items(self.ctx)
+        self.assertFalse(self.sent)
+
+
+class TestOutboundCoalescing(unittest.IsolatedAsyncioTestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.frames: typing.List[typing.Tuple[typing.List[WebSocketServerProtocol], typing.List[typing.Any]]] = []
+
+        def send_frame(endpoints: typing.List[Endpoint], parts: typing.List[str]) -> None:
+            self.frames.append(([endpoint.socket for endpoint in endpoints], json.loads(f"[{','.join(parts)}]")))
+
+        self.ctx.send_frame = send_frame
+        self.first, self.second = Client(open_socket(), self.ctx), Client(open_socket(), self.ctx)
+
+    async def test_messages_are_merged(self) -> None:
+        """Ensure messages queued for an endpoint in one event loop iteration are sent in as few frames as allowed."""
+        text = [{"cmd": "PrintJSON", "data": [{"text": str(i)}]} for i in range(self.ctx.max_messages_per_frame)]
+        self.ctx.broadcast([self.first, self.second], [{"cmd": "RoomUpdate"}])
+        self.ctx.broadcast([self.first], text)
+        self.ctx.broadcast([self.first, self.second], [{"cmd": "Bounced"}])
+        self.assertFalse(self.frames)
+        await asyncio.sleep(0)
+
+        first_frames = [msgs for sockets, msgs in self.frames if self.first.socket in sockets]
+        second_frames = [msgs for sockets, msgs in self.frames if self.second.socket in sockets]
+        self.assertEqual([len(msgs) for msgs in first_frames], [1, len(text), 1])
+        self.assertEqual(first_frames[1], text)
+        self.assertEqual(second_frames, [[{"cmd": "RoomUpdate"}, {"cmd": "Bounced"}]])
+        sent = self.ctx.metrics.get_data([])["sent"]
+        self.assertEqual((sent["queued"], sent["merged_frames"]), (5, 4))
+        self.assertFalse(self.ctx.outbound)
+
+
+class TestServerMetrics(unittest.TestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.client = Client(open_socket(), self.ctx)
+        self.client.auth = True
+        self.client.team, self.client.slot = 0, 1
+
+    def test_metrics_are_recorded(self) -> None:
+        """Ensure commands, sent frames and hint rechecks show up in the metrics data clients can read."""
+        metrics = self.ctx.metrics
+        metrics.record_command("Sync", 0.002)
+        metrics.record_command("Made Up", 0.5)
+        metrics.record_command(["Sync"], 5)
+        with unittest.mock.patch("websockets.broadcast"):
+            self.ctx.send_frame([self.client], ['{"cmd":"Bounced"}'])
+        self.ctx.recheck_hints()
+
+        data = json.loads(encode(metrics.get_data([self.client])))
+        self.assertEqual(data["commands"]["Sync"]["count"], 1)
+        self.assertEqual(data["commands"]["Sync"]["histogram"], [0, 0, 1, 0, 0, 0])
+        self.assertEqual(data["commands"]["Unknown"]["histogram"], [0, 0, 0, 0, 1, 1])
+        self.assertEqual(data["sent"]["clients"], [{"team": 0, "slot": 1, "frames": 1, "chars": 19}])
+        self.assertEqual(data["hint_rechecks"]["count"], 1)
+
+        output: typing.List[str] = []
+
+        def output_text(text: str) -> None:
+            output.append(text)
+
+        self.ctx.commandprocessor.output = output_text
+        self.assertTrue(self.ctx.commandprocessor("/metrics"))
+        self.assertIn("Sync: 1 times", output[0])
+
+
+class TestDataStorage(unittest.IsolatedAsyncioTestCase):
+    @override
+    def setUp(self) -> None:
+        self.ctx = SaveContext("", 0, "", "", 0, 0, False)
+        self.sent: typing.List[typing.Tuple[Client, str]] = []
+
+        def broadcast(endpoints: typing.Iterable[Client], msgs: typing.List[typing.Dict[str, typing.Any]]) -> None:
+            self.sent.extend((client, msg["key"]) for client in endpoints for msg in msgs)
+
+        self.ctx.broadcast = broadcast
+        self.invalid: typing.List[typing.Dict[str, typing.Any]] = []
+
+        async def send_msgs(endpoint: Endpoint, msgs: typing.Iterable[typing.Dict[str, typing.Any]]) -> bool:
+            self.invalid.extend(msgs)
+            return True
+
+        self.ctx.send_msgs = send_msgs
+        self.clients = [Client(open_socket(), self.ctx) for _ in range(3)]
+        for slot, client in enumerate(self.clients, 1):
+            client.auth = True
+            client.team, client.slot = 0, slot
+
+    async def set(self, client: Client, key: str, value: typing.Any) -> None:
+        await process_client_cmd(self.ctx, client, {"cmd": "Set", "key": key,
+                                                    "operations": [{"operation": "replace", "value": value}]})
+
+    async def test_prefix_subscriptions(self) -> None:
+        """Ensure clients are notified of keys they subscribed to exactly or through a prefix, once per change."""
+        first, second, third = self.clients
+        await process_client_cmd(self.ctx, first, {"cmd": "SetNotify", "keys": ["tracker_0_1"],
+                                                   "prefixes": ["tracker_"]})
+        await process_client_cmd(self.ctx, second, {"cmd": "SetNotify", "keys": ["tracker_*"],
+                                                    "prefixes": ["tracker_0"]})
+        await process_client_cmd(self.ctx, third, {"cmd": "SetNotify", "keys": [], "prefixes": [""]})
+        for key in ("tracker_0_1", "tracker_1_1", "other", "tracker", "tracker_*"):
+            await self.set(first, key, 1)
+        self.assertEqual(sorted(self.sent, key=lambda sent: (sent[0].slot, sent[1])), [
+            (first, "tracker_*"), (first, "tracker_0_1"), (first, "tracker_1_1"),
+            (second, "tracker_*"), (second, "tracker_0_1"),
+            (third, "other"), (third, "tracker"), (third, "tracker_*"), (third, "tracker_0_1"), (third, "tracker_1_1")])
+        self.assertFalse(self.invalid)
+
+    async def test_quota(self) -> None:
+        """Ensure a slot cannot store more than its quota, while setting a key another slot set frees up theirs."""
+        first, second, _ = self.clients
+        self.ctx.data_storage_quota = 100
+        await self.set(first, "list", [1, 2])
+        await self.set(first, "big", "x" * 100)
+        self.assertNotIn("big", self.ctx.stored_data)
+        self.assertEqual(self.invalid[0]["cmd"], "InvalidPacket")
+
+        await process_client_cmd(self.ctx, first, {"cmd": "Set", "key": "list", "operations": [
+            {"operation": "update", "value": list(range(100))}]})
+        self.assertEqual(self.ctx.stored_data["list"], [1, 2], "a rejected Set should not change the value")
+
+        await self.set(second, "list", "x" * 70)
+        await self.set(first, "big", "x" * 85)
+        self.assertEqual(self.ctx.stored_data["big"], "x" * 85)
+        self.assertEqual(len(self.invalid), 2)
+
+    async def test_quota_usage_is_saved(self) -> None:
+        """Ensure the data storage each slot is charged for is the same after loading a save."""
+        first, second, _ = self.clients
+        self.ctx.data_storage_quota = 100
+        await self.set(first, "list", [1, 2])
+        await self.set(second, "big", "x" * 70)
+        loaded = SaveContext("", 0, "", "", 0, 0, False)
+        loaded.set_save(self.ctx.get_save())
+        self.assertEqual(loaded.stored_data_usage, self.ctx.stored_data_usage)
+
+        loaded.data_storage_quota = 100
+        self.assertFalse(loaded.charge_data_storage(0, 2, "more", "x" * 20))
+        self.assertTrue(loaded.charge_data_storage(0, 1, "more", "x" * 20))
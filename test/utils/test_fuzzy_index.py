@@ -0,0 +1,34 @@
+import random
+import unittest
+
+from Utils import FuzzyIndex, get_fuzzy_results, get_intended_text
+
+
+class TestFuzzyIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(0)
+        self.words = {"Hookshot", "hookshot", "Hook", "Progressive Sword", "Progressive Shield", "Bow", "Silver Bow",
+                      "Bombos", "Bombs", "İce Rod", "", "Ether"}
+        for _ in range(200):
+            self.words.add("".join(rng.choice("abcdefg ") for _ in range(rng.randrange(1, 20))))
+        self.index = FuzzyIndex(self.words)
+        self.queries = ["Hookshot", "HOOKSHOT", "hook", "Progresive Sword", "Prog", "bow", "ice rod", "İce Rod",
+                        "bmobs", "", "xyz", "Silver Bow Silver Bow"]
+        self.queries += [rng.choice(list(self.words))[:rng.randrange(1, 10)] for _ in range(50)]
+
+    def test_same_results(self) -> None:
+        """Ensure the index gives the same results as comparing the input to every word."""
+        for query in self.queries:
+            with self.subTest(query=query):
+                self.assertEqual(self.index.get_fuzzy_results(query, 2), get_fuzzy_results(query, self.words, 2))
+                self.assertEqual(self.index.get_fuzzy_results(query, 5), get_fuzzy_results(query, self.words, 5))
+                self.assertEqual(get_intended_text(query, self.index), get_intended_text(query, self.words))
+
+    def test_single_word(self) -> None:
+        """Ensure a perfect match on the only word keeps its own response."""
+        self.assertEqual(get_intended_text("Bow", FuzzyIndex(["Bow"])), get_intended_text("Bow", ["Bow"]))
+
+    def test_length_changed_by_lowering(self) -> None:
+        """Ensure words that lowering makes longer are compared, even if the length difference rules them out."""
+        words = ["İce Rod", "abc", "de"]
+        self.assertEqual(FuzzyIndex(words).get_fuzzy_results("", 2), get_fuzzy_results("", words, 2))
@@ -0,0 +1,64 @@
+import io
+import logging
+import threading
+import unittest
+
+from Utils import LogWriter
+
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.logger = logging.getLogger("TestLogWriter")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+
+    def tearDown(self) -> None:
+        for handler in self.logger.handlers[:]:
+            self.logger.removeHandler(handler)
+
+    def test_records_are_written_in_order(self) -> None:
+        """Ensure queued records are written in order and with their arguments, once the writer stops."""
+        writer = LogWriter(1000)
+        self.logger.addHandler(writer.wrap(self.handler))
+        for i in range(600):
+            self.logger.info("record %d of %s", i, "600")
+        self.logger.debug("filtered")
+        writer.stop()
+        self.assertEqual(self.stream.getvalue().splitlines(), [f"INFO record {i} of 600" for i in range(600)])
+
+        self.logger.info("after stop")
+        self.assertEqual(self.stream.getvalue().splitlines()[-1], "INFO after stop")
+
+    def test_full_queue_drops_records(self) -> None:
+        """Ensure records that do not fit into the queue are dropped and counted, instead of holding up the logger."""
+        writer = LogWriter(1)
+        self.logger.addHandler(writer.wrap(self.handler))
+        with self.handler.lock:  # keep the writer from taking more records off the queue
+            self.logger.info("first")
+            for _ in range(20):
+                self.logger.info("second")
+        writer.stop()
+        self.assertGreater(writer.dropped, 0)
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(lines[0], "INFO first")
+        self.assertIn(f"WARNING {writer.dropped} log records were dropped, as the log queue was full.", lines)
+
+    def test_records_during_stop_are_written(self) -> None:
+        """Ensure records logged while the writer is stopping are written, even when they would wait for the queue."""
+        writer = LogWriter(1, block=True)
+        self.logger.addHandler(writer.wrap(self.handler))
+        with self.handler.lock:  # keep the writer from finishing the queued records
+            self.logger.info("queued")
+            stopping = threading.Thread(target=writer.stop)
+            stopping.start()
+            while not writer.stopping:
+                pass
+            for _ in range(3):
+                self.logger.info("during stop")
+        stopping.join(10)
+        self.assertFalse(stopping.is_alive())
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(sorted(lines), ["INFO during stop"] * 3 + ["INFO queued"])
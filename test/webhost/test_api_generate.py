@@ -1,5 +1,6 @@
 import io
 import json
+import threading
 import yaml
 
 from . import TestBase
@@ -43,3 +44,28 @@ class TestAPIGenerate(TestBase):
         json_data = response.get_json()
         self.assertTrue(json_data["text"].startswith("Generation of seed "))
         self.assertTrue(json_data["text"].endswith(" started successfully."))
+
+    def test_generation_status(self) -> None:
+        """Verify that the status of a generation shows whether it is queued and the progress it wrote."""
+        from uuid import UUID
+        from pony.orm import db_session
+        from WebHostLib.generate import ProgressWriter
+        from WebHostLib.models import Generation, STATE_STARTED
+
+        options = {"Tester1": {"game": "Archipelago", "name": "Tester", "Archipelago": {}}}
+        json_data = self.client.post("/api/generate", data=json.dumps({"weights": options}),
+                                     content_type="application/json").get_json()
+        generation_id = UUID(json_data["detail"])
+        self.assertEqual(self.client.get(json_data["wait_api_url"]).get_json()["text"], "Generation queued")
+
+        with db_session:
+            Generation.get(id=generation_id).state = STATE_STARTED
+        progress_writer = ProgressWriter(generation_id)
+        other_thread = threading.Thread(target=progress_writer, args=("Other", 1, 2))
+        other_thread.start()
+        other_thread.join()
+        self.assertEqual(self.client.get(json_data["wait_api_url"]).get_json()["text"], "Generation running",
+                         "progress of other generations should not be written")
+        progress_writer("Progression", 1000, 2000)
+        self.assertEqual(self.client.get(json_data["wait_api_url"]).get_json()["text"],
+                         "Generation running. Fill step Progression at 1000/2000 items placed.")
@@ -0,0 +1,68 @@
+import unittest
+from types import SimpleNamespace
+from uuid import uuid4
+
+from Utils import restricted_dumps
+
+
+def make_generation(players: int, games: int = 1) -> SimpleNamespace:
+    options = {f"Player{player}": {"game": f"Game{player % games}"} for player in range(players)}
+    return SimpleNamespace(id=uuid4(), options=restricted_dumps(options))
+
+
+class TestGenerationScheduler(unittest.TestCase):
+    def test_cost(self) -> None:
+        """Verify that the cost of a generation grows with its players and games."""
+        from WebHostLib.autolauncher import estimate_generation_cost
+
+        cost = estimate_generation_cost({"1": {"game": "A"}, "2": {"game": "A"}, "3": {"game": "B"}})
+        self.assertEqual((cost.players, cost.games), (3, 2))
+        bigger = estimate_generation_cost({str(player): {"game": str(player)} for player in range(10)})
+        self.assertGreater(bigger.work, cost.work)
+        self.assertGreater(bigger.memory, cost.memory)
+
+    def test_small_generations_first(self) -> None:
+        """Verify that small generations start before big ones and that the last generator is kept for them."""
+        from WebHostLib.autolauncher import GenerationScheduler
+
+        scheduler = GenerationScheduler(3, None)
+        big = [make_generation(50) for _ in range(3)]
+        small = make_generation(2)
+        self.assertEqual(scheduler.pick(big + [small]), [small, big[0]])
+        self.assertEqual(scheduler.pick(big), [big[0], big[1]])
+
+        scheduler.running = {generation.id: scheduler.get_cost(generation) for generation in (small, big[0])}
+        self.assertEqual(scheduler.pick(big[1:]), [])
+        scheduler.done(small.id)
+        self.assertEqual(scheduler.pick(big[1:]), [big[1]])
+
+    def test_memory_budget(self) -> None:
+        """Verify that generations wait until their predicted memory fits, unless nothing else is running."""
+        from WebHostLib.autolauncher import GenerationScheduler
+
+        first, second = make_generation(5), make_generation(5)
+        memory = GenerationScheduler(1, None).get_cost(first).memory
+        scheduler = GenerationScheduler(4, memory)
+        self.assertEqual(scheduler.pick([first, second]), [first])
+        self.assertEqual(GenerationScheduler(4, 1).pick([first, second]), [first])
+
+    def test_max_wait(self) -> None:
+        """Verify that a generation that waited for too long starts next, even if smaller ones keep coming."""
+        from WebHostLib.autolauncher import GenerationScheduler
+
+        scheduler = GenerationScheduler(2, None)
+        big, small = make_generation(50), make_generation(2)
+        running = make_generation(2)
+        scheduler.running = {running.id: scheduler.get_cost(running)}
+        self.assertEqual(scheduler.pick([big, small]), [small])
+        scheduler.queued_since[big.id] -= scheduler.max_wait
+        self.assertEqual(scheduler.pick([big, small]), [big])
+
+        memory = GenerationScheduler(1, None).get_cost(big).memory
+        scheduler = GenerationScheduler(4, memory)
+        scheduler.running = {running.id: scheduler.get_cost(running)}
+        self.assertEqual(scheduler.pick([big, small]), [small])
+        scheduler.queued_since[big.id] -= scheduler.max_wait
+        self.assertEqual(scheduler.pick([big, small]), [], "nothing should start before the overdue generation")
+        scheduler.done(running.id)
+        self.assertEqual(scheduler.pick([big, small]), [big])
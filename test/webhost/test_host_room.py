@@ -176,6 +176,23 @@ class TestHostFakeRoom(TestBase):
             commands = select(command for command in Command if command.room.id == self.room_id)  # type: ignore
             self.assertIn("/help", (command.commandtext for command in commands))
 
+    def test_host_room_wakes_up(self) -> None:
+        """Verify visiting an inactive room and sending commands to it asks autohost to wake it up."""
+        import datetime
+        from pony.orm import db_session, select
+        from WebHostLib.models import Room, RoomWakeUp
+
+        with db_session:
+            Room.get(id=self.room_id).last_activity = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        with self.app.app_context(), self.app.test_request_context():
+            self.client.get(url_for("host_room", room=self.room_id))
+            self.client.get(url_for("host_room", room=self.room_id))  # still active, so no new wake up
+            self.client.post(url_for("host_room", room=self.room_id), data={"cmd": "/help"})
+
+        with db_session:
+            wake_ups = select(wake_up for wake_up in RoomWakeUp if wake_up.room.id == self.room_id)  # type: ignore
+            self.assertEqual(wake_ups.count(), 2)
+
     def test_host_room_other_post(self) -> None:
         """Verify command from non-owner does not get queued for the server."""
         from pony.orm import db_session, select
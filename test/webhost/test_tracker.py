@@ -103,3 +103,78 @@ class TestTracker(TestBase):
                 self.assertEqual(response.status_code, 200)
             with self.client.open(url_for("api.tracker_slot_data", tracker=self.tracker_uuid)) as response:
                 self.assertEqual(response.status_code, 200)
+
+    def test_static_data_is_shared(self) -> None:
+        """Verify that tracker data for the same seed shares its decoded multidata and data package lookups."""
+        from pony.orm import db_session
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData
+
+        with db_session:
+            first = TrackerData(Room.get(id=self.room_id))
+            second = TrackerData(Room.get(id=self.room_id))
+            self.assertIs(first._multidata, second._multidata)
+            for game in first._multidata["datapackage"]:
+                self.assertIs(first.item_id_to_name[game], second.item_id_to_name[game])
+                self.assertIs(first.location_name_to_id[game], second.location_name_to_id[game])
+            self.assertEqual(first.get_player_name(1), second.get_player_name(1))
+            for game in first._multidata["datapackage"]:
+                self.assertEqual(first.item_id_to_name[game][-100], "Unknown Item (ID: -100)")
+                self.assertNotIn(-100, second.item_id_to_name[game], "unknown ids should not be stored")
+
+    def test_multidata_cache_is_bounded(self) -> None:
+        """Verify that decoded multidata is only kept while it fits into the configured number of bytes."""
+        from pony.orm import db_session
+        from WebHostLib.models import Room
+        from WebHostLib import tracker
+        from WebHostLib.tracker import get_seed_multidata
+
+        budget = self.app.config["TRACKER_MULTIDATA_CACHE_BYTES"]
+        try:
+            with db_session:
+                seed_id = Room.get(id=self.room_id).seed.id
+                self.assertIs(get_seed_multidata(seed_id), get_seed_multidata(seed_id))
+                self.app.config["TRACKER_MULTIDATA_CACHE_BYTES"] = 1
+                tracker._seed_multidata.clear()
+                self.assertIsNot(get_seed_multidata(seed_id), get_seed_multidata(seed_id))
+        finally:
+            self.app.config["TRACKER_MULTIDATA_CACHE_BYTES"] = budget
+
+    def test_published_slots(self) -> None:
+        """Verify that trackers show the slots published by the room and only load the slots changed since."""
+        from types import SimpleNamespace
+        from pony.orm import commit, db_session
+        from NetUtils import ClientStatus
+        from WebHostLib.customserver import WebHostContext
+        from WebHostLib.models import Room
+        from WebHostLib.tracker import TrackerData, get_seed_multidata
+
+        with db_session:
+            room = Room.get(id=self.room_id)
+            multidata = get_seed_multidata(room.seed.id)
+            locations = sorted(multidata["locations"][1])
+            ctx = SimpleNamespace(
+                player_names={(0, 1): "Player1"}, location_checks={(0, 1): set(locations[::2])},
+                received_items={}, hints={}, client_game_state={(0, 1): ClientStatus.CLIENT_PLAYING},
+                name_aliases={}, client_activity_timers={}, client_connection_timers={}, video={},
+                tracker_version=0, tracker_fingerprints={},
+                tracker_locations={slot: sorted(slot_locations)
+                                   for slot, slot_locations in multidata["locations"].items()},
+            )
+            ctx.tracker_fingerprints.update(WebHostContext.publish_tracker_slots(ctx, room))
+            commit()
+            self.assertFalse(WebHostContext.publish_tracker_slots(ctx, room))
+
+            first = TrackerData(room)
+            self.assertEqual(first.get_player_checked_locations(0, 1), set(locations[::2]))
+            self.assertEqual(first.get_player_client_status(0, 1), ClientStatus.CLIENT_PLAYING)
+
+            ctx.location_checks[0, 1] = set(locations)
+            ctx.client_game_state[0, 1] = ClientStatus.CLIENT_GOAL
+            ctx.tracker_fingerprints.update(WebHostContext.publish_tracker_slots(ctx, room))
+            commit()
+            second = TrackerData(room)
+            self.assertEqual(second.get_player_checked_locations(0, 1), set(locations))
+            self.assertEqual(second.get_player_client_status(0, 1), ClientStatus.CLIENT_GOAL)
+            self.assertIs(TrackerData(room)._multisave["location_checks"][0, 1],
+                          second._multisave["location_checks"][0, 1])
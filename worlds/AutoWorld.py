@@ -108,6 +108,8 @@ class AutoLogicRegister(type):
                 CollectionState.additional_copy_functions.append(function)
             elif item_name == "init_mixin":
                 CollectionState.additional_init_functions.append(function)
+            elif item_name == "lazy_copy_mixin":
+                CollectionState.additional_lazy_copy_attributes.update(function)
             elif not item_name.startswith("__"):
                 if hasattr(CollectionState, item_name):
                     raise Exception(f"Name conflict on Logic Mixin {name} trying to overwrite {item_name}")
@@ -314,6 +316,12 @@ class World(metaclass=AutoWorldRegister):
     If False, everything is rechecked at every step, which is slower computationally, 
     but may be desirable in complex/dynamic worlds."""
 
+    record_rule_dependencies: bool = False
+    """If True, access rules are evaluated against a stand-in for the CollectionState that records the item counts and
+    regions they look up. Without explicit indirect conditions, blocked entrances are then only rechecked once one of
+    those changed, and so are locations while finding spheres. Only for worlds whose rules use nothing but the methods
+    and data of the state, and don't check its type."""
+
     multiworld: "MultiWorld"
     """autoset on creation. The MultiWorld object for the currently generating multiworld."""
     player: int
@@ -3,6 +3,7 @@ import logging
 import typing
 
 from BaseClasses import LocationProgressType, MultiWorld, Location, Region, Entrance
+from rule_builder import And, Or, Rule, get_rule
 
 if typing.TYPE_CHECKING:
     import BaseClasses
@@ -96,15 +97,21 @@ def exclusion_rules(multiworld: MultiWorld, player: int, exclude_locations: typi
                 logging.warning(f"Unable to exclude location {loc_name} in player {player}'s world.")
 
 
-def set_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"], rule: CollectionRule):
-    spot.access_rule = rule
+def set_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+             rule: typing.Union[CollectionRule, Rule]):
+    spot.access_rule = rule.compile() if isinstance(rule, Rule) else rule
 
 
-def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"], rule: CollectionRule, combine="and"):
+def add_rule(spot: typing.Union["BaseClasses.Location", "BaseClasses.Entrance"],
+             rule: typing.Union[CollectionRule, Rule], combine="and"):
     old_rule = spot.access_rule
     # empty rule, replace instead of add
     if old_rule is Location.access_rule or old_rule is Entrance.access_rule:
-        spot.access_rule = rule if combine == "and" else old_rule
+        if combine == "and":
+            set_rule(spot, rule)
+    # both built from rules, combine them and compile again
+    elif isinstance(rule, Rule) and get_rule(old_rule):
+        spot.access_rule = (And if combine == "and" else Or)(rule, get_rule(old_rule)).compile()
     else:
         if combine == "and":
             spot.access_rule = lambda state: rule(state) and old_rule(state)
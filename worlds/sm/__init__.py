@@ -61,9 +61,7 @@ class SMCollectionState(metaclass=AutoLogicRegister):
         else:
             self.smbm = {}
 
-    def copy_mixin(self, ret) -> CollectionState:
-        ret.smbm = {player: copy.deepcopy(self.smbm[player]) for player in self.smbm}
-        return ret
+    lazy_copy_mixin = {"smbm": copy.deepcopy}
 
     def get_game_players(self, multiword: MultiWorld, game_name: str):
         return tuple(player for player in multiword.get_all_ids() if multiword.game[player] == game_name)
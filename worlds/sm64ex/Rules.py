@@ -1,6 +1,7 @@
-from typing import Callable, Union, Dict, Set
+from typing import Optional, Union, Dict, Set
 
 from BaseClasses import MultiWorld
+from rule_builder import And, CanReachLocation, CanReachRegion, Has, HasAll, HasAny, Or, Rule
 from ..generic.Rules import add_rule, set_rule
 from .Locations import location_table
 from .Options import SM64Options
@@ -287,7 +288,7 @@ class RuleFactory:
         if rule:
             set_rule(target, rule)
 
-    def build_rule(self, rule_expr: str, cannon_name: str = '') -> Callable:
+    def build_rule(self, rule_expr: str, cannon_name: str = '') -> Optional[Rule]:
         expressions = rule_expr.split(" | ")
         rules = []
         for expression in expressions:
@@ -300,15 +301,15 @@ class RuleFactory:
             if len(rules) == 1:
                 return rules[0]
             else:
-                return lambda state: any(rule(state) for rule in rules)
+                return Or(*rules)
         else:
             return None
 
-    def combine_and_clauses(self, rule_expr: str, cannon_name: str) -> Union[Callable, bool]:
+    def combine_and_clauses(self, rule_expr: str, cannon_name: str) -> Union[Rule, bool]:
         expressions = rule_expr.split(" & ")
         rules = []
         for expression in expressions:
-            and_clause = self.make_lambda(expression, cannon_name)
+            and_clause = self.make_rule(expression, cannon_name)
             if and_clause is False:
                 return False
             if and_clause is not True:
@@ -316,11 +317,11 @@ class RuleFactory:
         if rules:
             if len(rules) == 1:
                 return rules[0]
-            return lambda state: all(rule(state) for rule in rules)
+            return And(*rules)
         else:
             return True
 
-    def make_lambda(self, expression: str, cannon_name: str) -> Union[Callable, bool]:
+    def make_rule(self, expression: str, cannon_name: str) -> Union[Rule, bool]:
         if '+' in expression:
             tokens = expression.split('+')
             items = set()
@@ -332,7 +333,7 @@ class RuleFactory:
                     return False
                 items.add(item)
             if items:
-                return lambda state: state.has_all(items, self.player)
+                return HasAll(items, self.player)
             else:
                 return True
         if '/' in expression:
@@ -346,17 +347,17 @@ class RuleFactory:
                     continue
                 items.add(item)
             if items:
-                return lambda state: state.has_any(items, self.player)
+                return HasAny(items, self.player)
             else:
                 return False
         if '{{' in expression:
-            return lambda state: state.can_reach(expression[2:-2], "Location", self.player)
+            return CanReachLocation(expression[2:-2], self.player)
         if '{' in expression:
-            return lambda state: state.can_reach(expression[1:-1], "Region", self.player)
+            return CanReachRegion(expression[1:-1], self.player)
         item = self.parse_token(expression, cannon_name)
         if item in (True, False):
             return item
-        return lambda state: state.has(item, self.player)
+        return Has(item, self.player)
 
     def parse_token(self, token: str, cannon_name: str) -> Union[str, bool]:
         if token == "CANN":
@@ -45,9 +45,7 @@ class SMZ3CollectionState(metaclass=AutoLogicRegister):
         else:
             self.smz3state = {}
 
-    def copy_mixin(self, ret) -> CollectionState:
-        ret.smz3state = {player: copy.deepcopy(self.smz3state[player]) for player in self.smz3state}
-        return ret
+    lazy_copy_mixin = {"smz3state": copy.deepcopy}
 
 class SMZ3Web(WebWorld):
     tutorials = [Tutorial(